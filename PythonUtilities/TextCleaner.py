@@ -1,6 +1,23 @@
 import gc
-import pickle
-import pandas as pd
+import os
+import sys
+import io
+import re
+import csv
+import mmap
+import warnings
+import itertools
+import functools
+import copy
+import glob
+import time
+import json
+import math
+import codecs
+import hashlib
+import contextlib
+import collections
+import concurrent.futures
 import text_cleaning_functions as cf
 
 '''
@@ -8,9 +25,18 @@ import text_cleaning_functions as cf
   This class is used to clean csv data files from one formatting to another and output the results as fields of strings 
   It utilizes the following classes 
     gc -> garbage collector for python 
-    pickle -> object dumping if needed 
-    pandas -> numerical python library for data manipulation 
+    json, codecs -> checkpoints and incremental encoding for the buffered atomic output writer 
+    hashlib -> content and configuration fingerprints of the incremental cleaning index 
+    functools -> the least recently used field memo 
+    collections, concurrent.futures -> ordered process pool cleaning when workers are requested 
+    os, copy, glob, time -> batch cleaning of many files with one compiled configuration 
+    pandas -> numerical python library for data manipulation. Imported lazily, only by the dataframe engines 
+    pyarrow -> optional, imported lazily by the columnar output formats only 
+    csv, warnings -> stdlib reader for the csv engine, which never builds a dataframe 
+    io, re, mmap, itertools -> memory mapped input with quote aware record boundaries 
     cleaning_functions -> various cleaning functions set up as standalone functions 
+    sys, contextlib -> the stage timers and peak memory of the optional instrumentation 
+    math -> the approximate distinct counts of the optional input profile 
   It utilizes the following parameters 
     full_input_path_to_text_to_clean -> the path to the input text file to clean. You need access, and it should be local to the space doing the calling. 
     full_output_path_to_clean_text -> the path to write the output text file to. You need access, and it should be local to the space doing the calling.
@@ -28,7 +54,86 @@ import text_cleaning_functions as cf
     string_notation_char -> what each field should start and end with 
     Encoding types 
       Types are needed for input and output files. Defaults to UTF-8
+    chunk_size_in_rows -> if set, streams the input through pd.read_csv(chunksize=...) and appends each cleaned chunk 
+      to the output instead of loading the whole file. Memory stays bounded by the chunk size. 
+      pandas would infer column types chunk by chunk, so the column types of the whole file are found first with one 
+      chunked read and every chunk is read with them, formatting values as a whole file load does (5.0 in a column 
+      with a null further down, not 5) 
+    cleaning_engine -> how fields are cleaned 
+      row_loop -> (default) iterrows over each row, calling the text_cleaning_functions helpers one field at a time 
+      vectorized -> runs the same pipeline on whole columns with pandas .str operations. Produces the same output as row_loop 
+      csv -> streams records from self.input_file through the stdlib csv reader and cleans them with no dataframe or pandas import. 
+        Delimiter, quote, escape, header, index_col, na_values, keep_default_na and on_bad_lines are honoured as pandas would, 
+        but field text is kept as written rather than type inferred, so numbers keep their source formatting (50.00, not 50.0) 
+    input_reader -> how the input is read 
+      stream -> (default) a regular file read 
+      mmap -> memory maps the input. The csv engine finds quote aware record boundaries in the map and decodes one 
+        record aligned byte range at a time, so files larger than RAM can be cleaned; with workers, each process maps 
+        the file itself and is only sent byte offsets. The dataframe engines pass memory_map=True to pd.read_csv 
+    workers -> number of processes to clean with. Above 1, row chunks (chunk_size_in_rows, or an even split of the 
+      loaded dataframe) are cleaned in a ProcessPoolExecutor and written back in their original order 
+    Output writing -> rows are written as they are cleaned through a write buffer into <output>.partial, which replaces 
+      the output only once the whole file is written 
+      write_buffer_size_in_bytes -> size of that write buffer 
+      checkpoint_every_rows -> how often the partial output is synced and its last good row offset recorded in 
+        <output>.partial.checkpoint. A failed run keeps both and reports the offset (also in last_good_row_offset) 
+      resume_partial_output -> continue a failed run from its checkpoint instead of starting the output over 
+    Columnar output, so downstream readers can memory map the result rather than parse quoted text again 
+      output_format -> text (default, the quoted delimited text file), parquet, arrow (Arrow IPC file) or feather 
+        (feather v2, the same IPC file format). Written through pyarrow one record batch per cleaned input batch; without 
+        pyarrow, parquet falls back to collecting the rows and writing them with pandas DataFrame.to_parquet at the end. 
+        Fields are stored as cleaned, less the string_notation_char around them 
+      output_column_names -> names of the output columns (defaults to 0, 1, 2, ... as pandas numbers them without a header) 
+      output_column_types -> {column name or position : arrow type alias ('int64', 'float64', 'bool', 'date32', ...)}. 
+        Columns not listed stay strings; in typed columns empty and nan fields become nulls 
+      output_compression -> codec for parquet (snappy, zstd, gzip, brotli, lz4, none) or arrow / feather (zstd, lz4) 
+    Deduplication (both off by default), reported with hit rates by deduplication_report() 
+      field_memo_max_entries -> memo of up to this many raw field strings and their cleaned strings, least recently 
+        used evicted first, so a field value repeated across rows (report text, names, codes, units) is cleaned once and 
+        its cleaned string reused. Memory grows with the entries times the size of their strings. The vectorized engine 
+        instead cleans each distinct value of a column batch once. Each worker process keeps its own memo 
+      drop_duplicate_rows -> leave out output rows exactly equal to an earlier row of the same file. Rows are tracked by 
+        64 bit hash in two generations of max_tracked_row_hashes / 2 each, so memory stays bounded and a duplicate further 
+        back than that may be kept. Not available with resume_partial_output 
+    Incremental cleaning 
+      incremental_cleaning -> keep a sidecar index, <output>.clean_index.json, of the input's size, mtime and content 
+        hash, the byte and row offsets cleaned, the field count of its records and a hash of this configuration. On the next run an unchanged input is 
+        skipped, and an input that only grew (an appended log style csv) has just its new tail cleaned and appended 
+        to the output. Anything else (changed content, configuration or output, a tail not starting on a new line) 
+        cleans the whole file again. Columnar output cannot be appended to, nor can output with duplicate rows dropped 
+        (the earlier rows are not tracked), so a grown input is cleaned in full then. 
+        last_incremental_action reports what was done : skipped, appended or cleaned. The input must not change while 
+        it is being cleaned. Dataframe engines read the tail with the column types of the whole input, and clean the 
+        whole file again when the tail would change one 
+    Instrumentation (off by default, costing one check per batch when off) 
+      collect_stage_metrics -> time every pipeline stage and cleaning helper into a cleaning_stage_metrics, 
+        reported by stage_metrics_report() along with rows and bytes processed and peak memory. Worker processes 
+        time their own batches and send the timings back with the cleaned lines 
+      progress_callback -> called with a stage_metrics_report() (event 'progress') every progress_interval_seconds 
+        while writing, and once more (event 'finished') at the end. Turns on collect_stage_metrics 
+    Input profiling (off by default), so a file need not be read a second time just to see what is in it 
+      profile_input -> profile the input in the same pass that cleans it, reported by input_profile_report() : per column 
+        field counts, approximate distinct values, null token frequencies, empty fields, metatag counts, max and mean 
+        field lengths and a power of two length histogram, plus blank lines, fields per record, padded records and 
+        on_bad_lines events. Memory is fixed per column. The csv engine profiles raw fields as the csv reader reads them. 
+        The dataframe engines profile what pandas read, so null tokens are counted as nan and bad lines are not seen. 
+        profile_input_file() profiles with the csv reader whatever the engine, without cleaning or writing anything 
+      distinct_count_precision -> HyperLogLog precision of the distinct counts, 7 to 16. Each column keeps 
+        2 ** distinct_count_precision one byte registers (12 -> 4 KiB, about 1.6% error) 
 '''
+cleaning_engines = ('row_loop', 'vectorized', 'csv')
+input_readers = ('stream', 'mmap')
+output_formats = ('text', 'parquet', 'arrow', 'feather')
+# A record aligned slice of the memory mapped input, as handed to a worker process 
+input_byte_range = collections.namedtuple('input_byte_range', ['byte_start', 'byte_end', 'header_rows_to_skip', 'expected_field_count'])
+# Records per batch for the csv engine when no chunk_size_in_rows is given 
+default_record_batch_size_in_rows = 10000
+# With stage metrics on, one field in this many is cleaned step by step to time the helpers, the rest in one fused call 
+field_helper_timing_sample_every_n_fields = 16
+# The strings pandas reads as NaN when keep_default_na is True (pandas STR_NA_VALUES). NaN fields clean as 'nan' 
+default_na_strings = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', 
+                                '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+
 class text_cleaner:
   def __init__(self, full_input_path_to_text_to_clean, full_output_path_to_clean_text,
               input_file_delimiter=',', output_file_delimiter=',', header=None, 
@@ -39,7 +144,14 @@ class text_cleaner:
               remove_metatags=True, metatag_replacement='',
               spacing_between_items_in_fields=1, 
               string_notation_char = '"',
-              input_encoding_type='utf-8', output_encoding_type='utf-8') : 
+              input_encoding_type='utf-8', output_encoding_type='utf-8',
+              chunk_size_in_rows=None, cleaning_engine='row_loop', workers=1, 
+              input_reader='stream', write_buffer_size_in_bytes=1024*1024, 
+              checkpoint_every_rows=100000, resume_partial_output=False, 
+              collect_stage_metrics=False, progress_callback=None, progress_interval_seconds=5, 
+              output_format='text', output_column_names=None, output_column_types=None, output_compression=None, 
+              incremental_cleaning=False, field_memo_max_entries=0, drop_duplicate_rows=False, 
+              max_tracked_row_hashes=2000000, profile_input=False, distinct_count_precision=12) : 
     self.full_input_path_to_text_to_clean = full_input_path_to_text_to_clean
     self.full_output_path_to_clean_text = full_output_path_to_clean_text
     self.input_file_delimiter = input_file_delimiter
@@ -54,6 +166,8 @@ class text_cleaner:
     self.empty_string_map = empty_string_map
     self.not_null_map = not_null_map
     self.additional_field_map = additional_field_map
+    '''Both maps compiled once, in order, into single pass replacement stages reused for every field and file'''
+    self.compiled_field_replacements = cf.compile_sequential_replacements([*not_null_map.items(), *additional_field_map.items()])
     self.remove_metatags = remove_metatags
     self.metatag_replacement= metatag_replacement
     self.spacing_between_items_in_fields = spacing_between_items_in_fields
@@ -63,8 +177,62 @@ class text_cleaner:
     self.input_file_loaded_as_dataframe = False 
     self.input_file_as_dataframe = None 
     self.output_file_written = False 
+    self.output_rows_written = 0 
     self.input_file = None
     self.string_notation_char = string_notation_char
+    self.chunk_size_in_rows = chunk_size_in_rows
+    if cleaning_engine not in cleaning_engines : 
+      raise ValueError(f"Unknown cleaning engine {cleaning_engine}. Choose one of {cleaning_engines}")
+    self.cleaning_engine = cleaning_engine
+    self.workers = workers
+    if input_reader not in input_readers : 
+      raise ValueError(f"Unknown input reader {input_reader}. Choose one of {input_readers}")
+    self.input_reader = input_reader
+    self.write_buffer_size_in_bytes = write_buffer_size_in_bytes
+    self.checkpoint_every_rows = checkpoint_every_rows
+    self.resume_partial_output = resume_partial_output
+    self.last_good_row_offset = None 
+    self.progress_callback = progress_callback
+    self.progress_interval_seconds = progress_interval_seconds
+    self.stage_metrics = cleaning_stage_metrics() if collect_stage_metrics or progress_callback is not None else None 
+    if output_format not in output_formats : 
+      raise ValueError(f"Unknown output format {output_format}. Choose one of {output_formats}")
+    if output_format != 'text' and resume_partial_output : 
+      raise ValueError(f"resume_partial_output is only supported for text output, not {output_format}")
+    self.output_format = output_format
+    self.output_column_names = output_column_names
+    self.output_column_types = output_column_types
+    self.output_compression = output_compression
+    self.incremental_cleaning = incremental_cleaning
+    self.last_incremental_action = None 
+    self.input_column_dtypes = None 
+    if drop_duplicate_rows and resume_partial_output : 
+      raise ValueError("drop_duplicate_rows cannot be combined with resume_partial_output")
+    self.field_memo_max_entries = field_memo_max_entries
+    self.field_memo = None 
+    self.field_memo_counts = [0, 0] 
+    self.worker_field_memo_counts = [0, 0] 
+    self.drop_duplicate_rows = drop_duplicate_rows
+    self.max_tracked_row_hashes = max_tracked_row_hashes
+    self.row_hash_generations = None 
+    self.duplicate_row_counts = [0, 0] 
+    self.distinct_count_precision = distinct_count_precision
+    self.input_profile = self.build_input_profile() if profile_input else None 
+
+  '''
+    Worker processes get the cleaning settings only, never the open input file or the loaded dataframe 
+  '''
+  def __getstate__(self) : 
+    cleaner_state = self.__dict__.copy()
+    cleaner_state['input_file'] = None 
+    cleaner_state['input_file_as_dataframe'] = None 
+    cleaner_state['progress_callback'] = None 
+    '''Workers build their own memo, and never see the rows tracked for duplicates'''
+    cleaner_state['field_memo'] = None 
+    cleaner_state['row_hash_generations'] = None 
+    '''Nor the profile so far, each worker batch is profiled afresh and merged back'''
+    cleaner_state['input_profile'] = self.build_input_profile() if self.input_profile is not None else None 
+    return cleaner_state
 
   '''
     Attempt to load text file. 
@@ -72,7 +240,7 @@ class text_cleaner:
   '''
   def attempt_load_text(self):
     try : 
-      self.input_file = open(self.full_input_path_to_text_to_clean, 'r')
+      self.input_file = open(self.full_input_path_to_text_to_clean, 'r', encoding=self.input_encoding_type, newline='')
       self.input_file_loaded = True
     except : 
       raise Exception(f"Error opening file at {self.full_input_path_to_text_to_clean}. Address before reattempting loading")
@@ -83,7 +251,7 @@ class text_cleaner:
   def update_full_input_path_to_text_to_clean(self, new_full_input_path_to_text_to_clean) : 
     self.full_input_path_to_text_to_clean = new_full_input_path_to_text_to_clean 
     if self.input_file_loaded : 
-      self.input_file_loaded = False 
+      self.release_loaded_text()
 
   '''
     As above for output 
@@ -93,6 +261,15 @@ class text_cleaner:
     if self.output_file_written : 
       self.output_file_written = False
 
+  '''
+    Closes the text file opened by attempt_load_text 
+  '''
+  def release_loaded_text(self) : 
+    if self.input_file is not None : 
+      self.input_file.close()
+      self.input_file = None 
+    self.input_file_loaded = False 
+
   '''
     Releases loaded dataframe 
   '''
@@ -104,78 +281,1749 @@ class text_cleaner:
       gc.collect() 
     return 
 
+  '''
+    Times the block as one call of stage_name when collecting stage metrics, otherwise does nothing 
+  '''
+  def timed_stage(self, stage_name) : 
+    if self.stage_metrics is None : 
+      return contextlib.nullcontext()
+    return self.stage_metrics.timed_stage(stage_name)
+
+  '''
+    Stage metrics so far, with rows and bytes processed and peak memory, as a dict. None when not collecting 
+  '''
+  def stage_metrics_report(self, event='report') : 
+    if self.stage_metrics is None : 
+      return None 
+    return self.stage_metrics.as_dict(event, self.full_input_path_to_text_to_clean)
+
+  '''
+    Starts the stage metrics over 
+  '''
+  def reset_stage_metrics(self) : 
+    if self.stage_metrics is not None : 
+      self.stage_metrics = cleaning_stage_metrics()
+
+  '''
+    An empty input profile with this cleaner's null strings and distinct count precision 
+  '''
+  def build_input_profile(self) : 
+    return input_profile(self.build_na_strings(), self.distinct_count_precision)
+
+  '''
+    Input profile so far as a dict. None when not profiling 
+  '''
+  def input_profile_report(self) : 
+    if self.input_profile is None : 
+      return None 
+    return self.input_profile.as_dict(self.full_input_path_to_text_to_clean)
+
+  '''
+    Starts the input profile over 
+  '''
+  def reset_input_profile(self) : 
+    if self.input_profile is not None : 
+      self.input_profile = self.build_input_profile()
+
+  '''
+    Profiles the input in one read through the csv reader (mmap or stream, as input_reader says), whatever the cleaning 
+    engine, without cleaning or writing anything. Returns the report; any profile kept while cleaning is left as it was 
+  '''
+  def profile_input_file(self) : 
+    profile_kept_while_cleaning, self.input_profile = self.input_profile, self.build_input_profile()
+    try : 
+      for _record_batch in self.iterate_input_record_batches() : 
+        pass 
+      return self.input_profile_report()
+    finally : 
+      self.input_profile = profile_kept_while_cleaning
+
+  '''
+    Arguments shared by every pd.read_csv call (whole file and chunked)
+  '''
+  def build_read_csv_arguments(self) : 
+    return {'sep' : self.input_file_delimiter,
+            'header' : self.header,
+            'index_col' : self.index_col,
+            'na_values' : self.na_values,
+            'keep_default_na' : self.keep_default_na,
+            'quotechar' : self.quote_char,
+            'escapechar' : self.escape_char,
+            'on_bad_lines' : self.on_bad_lines,
+            'encoding' : self.input_encoding_type,
+            'memory_map' : self.input_reader == 'mmap'}
+
   '''
     Attempt to load text to dataframe (does a read processing using arguments provided)
   '''
   def attempt_load_text_to_dataframe(self) : 
+    import pandas as pd
     if self.input_file_as_dataframe is not None : 
       self.release_loaded_dataframe()
     try : 
-      self.input_file_as_dataframe = pd.read_csv(self.full_input_path_to_text_to_clean, 
-                                                 sep=self.input_file_delimiter,
-                                                 header=self.header,
-                                                 index_col=self.index_col,
-                                                 na_values=self.na_values,
-                                                 keep_default_na=self.keep_default_na,
-                                                 quotechar=self.quote_char,
-                                                 escapechar=self.escape_char,
-                                                 on_bad_lines=self.on_bad_lines)
+      with self.timed_stage('read_input') : 
+        self.input_file_as_dataframe = pd.read_csv(self.full_input_path_to_text_to_clean, **self.build_read_csv_arguments())
       self.input_file_loaded_as_dataframe = True 
     except : 
       raise Exception(f"Error loading {self.full_input_path_to_text_to_clean} as a dataframe")
+    self.input_column_dtypes = self.describe_column_dtypes(self.input_file_as_dataframe)
 
   '''
-    Cleans dataframe to a text file output (can be specified as csv, or other file extensions writable from character streams)
+    Column types of a dataframe read from the input as {position in the input : int64, uint64, float64, bool or object}, 
+    counting the index column in the positions as pd.read_csv dtype= does 
   '''
-  def clean_dataframe_to_text_file(self) : 
-    '''
-      If the input file is not loaded, attempt to load it and then proceed to process it 
-    '''
-    try : 
+  def describe_column_dtypes(self, dataframe) : 
+    index_position = self.index_col if isinstance(self.index_col, int) and not isinstance(self.index_col, bool) else None
+    column_positions = [position for position in range(len(dataframe.columns) + (index_position is not None)) if position != index_position]
+    column_dtypes = {} 
+    for position, dtype in zip(column_positions, dataframe.dtypes) : 
+      dtype_kind = getattr(dtype, 'kind', 'O')
+      column_dtypes[position] = str(dtype) if dtype_kind in 'iub' else 'float64' if dtype_kind == 'f' else 'object'
+    return column_dtypes
+
+  '''
+    The column types pandas infers for two parts of an input read together : numbers mixed with other numbers 
+    (or an all null part, read as float) become float64, anything else mixed becomes object 
+  '''
+  def widen_column_dtypes(self, column_dtypes, part_column_dtypes) : 
+    if column_dtypes is None : 
+      return dict(part_column_dtypes)
+    numeric_dtypes = ('int64', 'uint64', 'float64')
+    widened_column_dtypes = dict(column_dtypes)
+    for position, part_dtype in part_column_dtypes.items() : 
+      dtype = widened_column_dtypes.setdefault(position, part_dtype)
+      if dtype != part_dtype : 
+        widened_column_dtypes[position] = 'float64' if dtype in numeric_dtypes and part_dtype in numeric_dtypes else 'object'
+    return widened_column_dtypes
+
+  '''
+    Number of fields in the first record of the input (counting the index column), which sets the field count 
+  '''
+  def count_input_columns(self) : 
+    import pandas as pd
+    first_row = pd.read_csv(self.full_input_path_to_text_to_clean, nrows=1, **self.build_read_csv_arguments())
+    index_position = self.index_col if isinstance(self.index_col, int) and not isinstance(self.index_col, bool) else None
+    return len(first_row.columns) + (index_position is not None)
+
+  '''
+    read_csv_arguments for reading the records of text_lines in chunks. The columns are named up front, as pandas would 
+    otherwise take the field count of each chunk from its first row, and skip every longer row after a chunk starting on 
+    a short one. Named columns cut longer rows down instead, so those rows are found first and skipped as bad lines 
+  '''
+  def build_chunked_read_csv_arguments(self, read_csv_arguments, column_count, text_lines, header_rows_to_skip=0, line_name='line') : 
+    if read_csv_arguments['header'] is None or isinstance(read_csv_arguments['header'], int) : 
+      read_csv_arguments = dict(read_csv_arguments, names=list(range(column_count)))
+      overlong_rows = self.find_overlong_rows(text_lines, column_count, header_rows_to_skip, line_name)
+      if len(overlong_rows) : 
+        read_csv_arguments['skiprows'] = overlong_rows
+    return read_csv_arguments
+
+  '''
+    Row numbers (as skiprows= counts them, blank lines included) of the records in text_lines with more than column_count 
+    fields, after on_bad_lines 'error' has raised or 'warn' has warned on them. A callable on_bad_lines is left to 
+    pd.read_csv, which rejects it 
+  '''
+  def find_overlong_rows(self, text_lines, column_count, header_rows_to_skip=0, line_name='line') : 
+    overlong_rows = [] 
+    if callable(self.on_bad_lines) : 
+      return overlong_rows
+    record_reader = self.build_record_reader(text_lines)
+    for row_number, record in enumerate(record_reader) : 
+      if len(record) == 0 : 
+        continue 
+      if header_rows_to_skip > 0 : 
+        header_rows_to_skip -= 1 
+        continue 
+      if len(record) > column_count : 
+        if self.on_bad_lines == 'error' : 
+          raise Exception(f"Expected {column_count} fields in {line_name} {record_reader.line_num}, saw {len(record)}")
+        if self.on_bad_lines == 'warn' : 
+          warnings.warn(f"Skipping {line_name} {record_reader.line_num}: expected {column_count} fields, saw {len(record)}")
+        overlong_rows.append(row_number)
+    return overlong_rows
+
+  '''
+    Column types of the whole of input_source (the input path by default, or a text stream), read in chunks, widened 
+    from column_dtypes when given. Warnings about bad lines are left to the read that cleans 
+  '''
+  def infer_column_dtypes(self, input_source=None, column_dtypes=None, read_csv_arguments=None) : 
+    import pandas as pd
+    read_csv_arguments = read_csv_arguments or self.build_read_csv_arguments()
+    with warnings.catch_warnings() : 
+      warnings.simplefilter('ignore')
+      with pd.read_csv(input_source or self.full_input_path_to_text_to_clean, chunksize=self.chunk_size_in_rows or default_record_batch_size_in_rows, 
+                       **read_csv_arguments) as chunk_reader : 
+        for dataframe_chunk in chunk_reader : 
+          column_dtypes = self.widen_column_dtypes(column_dtypes, self.describe_column_dtypes(dataframe_chunk))
+    return column_dtypes or {} 
+
+  '''
+    Yields the input as dataframes to clean. 
+    Without a chunk size this is the single loaded dataframe, otherwise fixed size chunks read lazily from disk 
+  '''
+  def iterate_input_dataframes(self) : 
+    if self.chunk_size_in_rows is None : 
       if self.input_file_as_dataframe is None : 
         self.attempt_load_text_to_dataframe()
       if self.input_file_as_dataframe is not None : 
-        ''' By building output file strings '''
-        output_file_strings = [] 
-        rows, cols = self.input_file_as_dataframe.shape
-        '''By looping over rows iteratively'''
-        for _index, row in self.input_file_as_dataframe.iterrows() :
-          '''Picking out the columns'''
-          row_fields = [] 
-          for col in range(cols) : 
-            string_form = str(row[col])
-            '''Dealing with empty strings'''
-            if len(string_form) == 0 : 
-              row_fields.append(cf.replace_empty_string_with_target_string(string_form, self.empty_string_map.get(str(string_form), '""')))
-            else : 
-              '''Dealing with not null strings, additional fields, and metatags'''
-              for not_null_field, replacement in self.not_null_map.items() : 
-                string_form = cf.replace_source_string_with_target_string(string_form, not_null_field, replacement)
-              for additional_field, replacement in self.additional_field_map.items() :
-                string_form = cf.replace_source_string_with_target_string(string_form, additional_field, replacement)
-              if self.remove_metatags is True : 
-                string_form = cf.remove_metatags_from_string(string_form, self.metatag_replacement)
-              '''Mutation to achieve multiple lines as a single line and to get set spaces to be the amount desired'''
-              string_form = cf.mutate_multi_lines_and_spacings_to_single_line_set_spaces(string_form, self.spacing_between_items_in_fields)
-              '''Ensuring string formatting consistently'''
-              string_form = cf.prepend_string_if_missing(string_form, self.string_notation_char)
-              string_form = cf.append_string_if_missing(string_form, self.string_notation_char)
-              row_fields.append(string_form)
-          '''Join up into a single file line'''
-          output_file_strings.append(self.output_file_delimiter.join(row_fields))
-        try : 
-          '''Try to write to the appropriate spot. If it fails, we dump the file as a pickle so you can go find out what is wrong'''
-          output_file = open(self.full_output_path_to_clean_text, 'w', encoding=self.output_encoding_type)
-          output_file.write('\n'.join(output_file_strings))
-          output_file.close()
-          self.output_file_written = True
-        except : 
-          # pickle the results just in case 
-          dumpfile = open(str(self.full_output_path_to_clean_text) + '.pickle', 'wb')
-          pickle.dump(output_file_strings, dumpfile)
-          raise Exception(f"Unable to write to file {self.full_output_path_to_clean_text} while using arguments {self.full_output_path_to_clean_text, output_file_strings}")
+        yield self.input_file_as_dataframe
+      return 
+    import pandas as pd
+    try : 
+      with open(self.full_input_path_to_text_to_clean, 'r', encoding=self.input_encoding_type, newline='') as input_lines : 
+        read_csv_arguments = self.build_chunked_read_csv_arguments(self.build_read_csv_arguments(), self.count_input_columns(), 
+                                                                   input_lines, self.count_header_rows_to_skip())
+      with self.timed_stage('infer_column_dtypes') : 
+        self.input_column_dtypes = self.infer_column_dtypes(read_csv_arguments=read_csv_arguments)
+      chunk_reader = pd.read_csv(self.full_input_path_to_text_to_clean, chunksize=self.chunk_size_in_rows, 
+                                 dtype=self.input_column_dtypes, **read_csv_arguments)
+    except : 
+      raise Exception(f"Error loading {self.full_input_path_to_text_to_clean} as a chunked dataframe reader")
+    with chunk_reader : 
+      for dataframe_chunk in chunk_reader : 
+        yield dataframe_chunk
+
+  '''
+    The strings read as NaN by the csv engine, following na_values and keep_default_na like pd.read_csv 
+  '''
+  def build_na_strings(self) : 
+    na_strings = set(self.na_values) if self.na_values is not None else set()
+    if self.keep_default_na : 
+      na_strings |= default_na_strings
+    return na_strings
+
+  '''
+    csv reader with this cleaner's dialect over an iterable of text lines (an open file or a decoded byte range)
+  '''
+  def build_record_reader(self, text_lines) : 
+    csv.field_size_limit(max(csv.field_size_limit(), 2**31 - 1))
+    return csv.reader(text_lines, delimiter=self.input_file_delimiter, quotechar=self.quote_char, 
+                      escapechar=self.escape_char, doublequote=True, strict=False)
+
+  '''
+    Number of leading records pd.read_csv would consume as the header 
+  '''
+  def count_header_rows_to_skip(self) : 
+    if self.header is None : 
+      return 0 
+    return (max(self.header) if isinstance(self.header, (list, tuple)) else self.header) + 1
+
+  '''
+    Turns raw csv records into the records to clean, the way pd.read_csv would : blank lines and header rows are dropped, 
+    bad lines follow on_bad_lines, short records are padded and NaN strings become 'nan', and the index column is removed. 
+    The first record sets the expected field count unless one is given. describe_position names the current record in messages 
+  '''
+  def iterate_normalized_records(self, records, header_rows_to_skip=0, expected_field_count=None, describe_position=None) : 
+    index_column = self.index_col if isinstance(self.index_col, int) and not isinstance(self.index_col, bool) else None
+    na_strings = self.build_na_strings()
+    '''pandas pads with empty fields, which are NaN only when the empty string is a NaN string'''
+    padding_field = 'nan' if '' in na_strings else ''
+    profile = self.input_profile
+    for record_number, record in enumerate(records, 1) : 
+      '''Blank lines are skipped, as pandas does'''
+      if len(record) == 0 : 
+        if profile is not None : 
+          profile.blank_lines += 1 
+        continue 
+      if header_rows_to_skip > 0 : 
+        header_rows_to_skip -= 1 
+        continue 
+      if expected_field_count is None : 
+        expected_field_count = len(record)
+      if len(record) > expected_field_count : 
+        position = describe_position() if describe_position is not None else f"record {record_number}"
+        if callable(self.on_bad_lines) : 
+          if profile is not None : 
+            profile.bad_line_events['passed_to_callable'] += 1 
+          record = self.on_bad_lines(record)
+          if record is None : 
+            if profile is not None : 
+              profile.bad_line_events['dropped_by_callable'] += 1 
+            continue 
+        elif self.on_bad_lines == 'error' : 
+          if profile is not None : 
+            profile.bad_line_events['raised'] += 1 
+          raise Exception(f"Expected {expected_field_count} fields in {position}, saw {len(record)}")
+        else : 
+          if profile is not None : 
+            profile.bad_line_events['warned' if self.on_bad_lines == 'warn' else 'skipped'] += 1 
+          if self.on_bad_lines == 'warn' : 
+            warnings.warn(f"Skipping {position}: expected {expected_field_count} fields, saw {len(record)}")
+          continue 
+      if profile is not None : 
+        '''The raw fields, before null strings become nan and short records are padded'''
+        profile.record_record(record, expected_field_count)
+      '''Short records are padded with empty fields'''
+      record = ['nan' if field in na_strings else field for field in record] + [padding_field] * (expected_field_count - len(record))
+      if index_column is not None : 
+        del record[index_column]
+      yield record
+
+  '''
+    Groups records into lists of chunk_size_in_rows (or the default batch size) 
+  '''
+  def batch_records(self, records) : 
+    batch_size_in_rows = self.chunk_size_in_rows or default_record_batch_size_in_rows
+    record_batch = [] 
+    for record in records : 
+      record_batch.append(record)
+      if len(record_batch) >= batch_size_in_rows : 
+        yield record_batch
+        record_batch = [] 
+    if len(record_batch) : 
+      yield record_batch
+
+  '''
+    csv engine reader. Yields batches of records to clean, read from self.input_file or, with the mmap input reader, 
+    decoded one record aligned byte range at a time from the memory mapped input 
+  '''
+  def iterate_input_record_batches(self) : 
+    if self.input_reader == 'mmap' : 
+      yield from self.iterate_memory_mapped_record_batches()
+      return 
+    if not self.input_file_loaded or self.input_file is None : 
+      self.attempt_load_text()
+    self.input_file.seek(0)
+    record_reader = self.build_record_reader(self.input_file)
+    try : 
+      yield from self.batch_records(self.iterate_normalized_records(record_reader, self.count_header_rows_to_skip(), 
+                                                                    describe_position=lambda : f"line {record_reader.line_num}"))
+    finally : 
+      self.release_loaded_text()
+
+  '''
+    Memory maps the input read only, or returns None for an empty file. The boundary scan works on raw bytes, 
+    so the encoding must write newline, quote, delimiter and escape as the single ASCII bytes and never reuse those bytes 
+    inside multi byte characters (true of UTF-8 and the single byte code pages) 
+  '''
+  def open_input_memory_map(self) : 
+    dialect_characters = '\n' + self.input_file_delimiter + self.quote_char + (self.escape_char or '')
+    if dialect_characters.encode(self.input_encoding_type) != dialect_characters.encode('ascii') : 
+      raise ValueError(f"The mmap input reader needs an ASCII compatible encoding, not {self.input_encoding_type}")
+    try : 
+      with open(self.full_input_path_to_text_to_clean, 'rb') as input_file : 
+        if os.fstat(input_file.fileno()).st_size == 0 : 
+          return None 
+        return mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except : 
+      raise Exception(f"Error memory mapping file at {self.full_input_path_to_text_to_clean}. Address before reattempting loading")
+
+  '''
+    Yields the byte offset just past each record in the memory map, starting from byte_start. 
+    Quote aware : newlines inside quoted fields (the multi line reports of comparisonvalues.csv) do not end a record. 
+    Outside quotes \n, \r\n and a lone \r all end one, as they do for the csv reader over a file opened with newline=''. 
+    A quote opens a quoted field only at the start of a field, "" inside one is a literal quote, and the escape character 
+    protects the byte after it (except straight after a closing quote), matching the csv reader. Only delimiters, quotes, escapes and newlines are visited, via compiled byte regexes 
+  '''
+  def iterate_record_end_offsets(self, memory_map, byte_start=0) : 
+    quote_byte, delimiter_byte = ord(self.quote_char), ord(self.input_file_delimiter)
+    escape_byte = ord(self.escape_char) if self.escape_char else None 
+    newline_byte, carriage_return_byte = ord('\n'), ord('\r')
+    special_bytes_inside_quotes = bytes([quote_byte] + ([escape_byte] if escape_byte is not None else []))
+    special_bytes_outside_quotes = bytes([newline_byte, carriage_return_byte, delimiter_byte]) + special_bytes_inside_quotes
+    special_outside_quotes = re.compile(b'[' + b''.join(re.escape(bytes([special_byte])) for special_byte in special_bytes_outside_quotes) + b']')
+    special_inside_quotes = re.compile(b'[' + b''.join(re.escape(bytes([special_byte])) for special_byte in special_bytes_inside_quotes) + b']')
+    memory_map_size = len(memory_map)
+    record_start = field_start = position = byte_start
+    while (special_match := special_outside_quotes.search(memory_map, position)) is not None : 
+      position = special_match.start()
+      special_byte = memory_map[position]
+      if special_byte == escape_byte : 
+        position += 2 
+      elif special_byte == delimiter_byte : 
+        position += 1 
+        field_start = position
+      elif special_byte == newline_byte or special_byte == carriage_return_byte : 
+        position += 2 if special_byte == carriage_return_byte and position + 1 < memory_map_size and memory_map[position + 1] == newline_byte else 1 
+        yield position
+        record_start = field_start = position
+      elif position == field_start : 
+        '''Opening quote, so jump to its closing quote'''
+        position += 1 
+        while (special_match := special_inside_quotes.search(memory_map, position)) is not None : 
+          position = special_match.start()
+          if memory_map[position] == escape_byte : 
+            position += 2 
+          elif position + 1 < memory_map_size and memory_map[position + 1] == quote_byte : 
+            position += 2 
+          else : 
+            '''Closing quote. Like the csv reader, an escape character straight after it is kept as a literal'''
+            position += 2 if position + 1 < memory_map_size and memory_map[position + 1] == escape_byte else 1 
+            break 
+        else : 
+          position = memory_map_size
+      else : 
+        position += 1 
+    if record_start < memory_map_size : 
+      yield memory_map_size
+
+  '''
+    Splits the memory map into record aligned (byte_start, byte_end) ranges of chunk_size_in_rows records 
+    (or the default batch size) 
+  '''
+  def iterate_record_aligned_byte_ranges(self, memory_map) : 
+    batch_size_in_rows = self.chunk_size_in_rows or default_record_batch_size_in_rows
+    range_start = 0 
+    records_in_range = 0 
+    for record_end in self.iterate_record_end_offsets(memory_map) : 
+      records_in_range += 1 
+      if records_in_range >= batch_size_in_rows : 
+        yield (range_start, record_end)
+        range_start, records_in_range = record_end, 0 
+    if records_in_range : 
+      yield (range_start, len(memory_map))
+
+  '''
+    Decodes one byte range of the memory map through a zero copy memoryview slice 
+  '''
+  def decode_byte_range(self, memory_map, byte_start, byte_end) : 
+    with memoryview(memory_map) as memory_map_view : 
+      with memory_map_view[byte_start:byte_end] as byte_range_view : 
+        return str(byte_range_view, self.input_encoding_type)
+
+  '''
+    mmap input reader for the csv engine. Only one decoded byte range is alive at a time 
+  '''
+  def iterate_memory_mapped_record_batches(self) : 
+    memory_map = self.open_input_memory_map()
+    if memory_map is None : 
+      return 
+    with memory_map : 
+      raw_records = itertools.chain.from_iterable(self.build_record_reader(io.StringIO(self.decode_byte_range(memory_map, byte_start, byte_end), newline='')) 
+                                                  for byte_start, byte_end in self.iterate_record_aligned_byte_ranges(memory_map))
+      yield from self.batch_records(self.iterate_normalized_records(raw_records, self.count_header_rows_to_skip()))
+
+  '''
+    Byte ranges handed to worker processes by the mmap input reader. The parent only scans record boundaries, 
+    each worker maps the same file (sharing its pages) and decodes, parses and cleans its own range. 
+    The first range carries the header rows to skip, and every range the field count of the first record 
+  '''
+  def iterate_worker_byte_ranges(self) : 
+    memory_map = self.open_input_memory_map()
+    if memory_map is None : 
+      return 
+    with memory_map : 
+      header_rows_to_skip = self.count_header_rows_to_skip()
+      expected_field_count = None 
+      for byte_start, byte_end in self.iterate_record_aligned_byte_ranges(memory_map) : 
+        if expected_field_count is None : 
+          range_text = self.decode_byte_range(memory_map, byte_start, byte_end)
+          non_blank_records = [record for record in self.build_record_reader(io.StringIO(range_text, newline='')) if len(record)]
+          if len(non_blank_records) <= header_rows_to_skip : 
+            '''Header only range, nothing to clean'''
+            header_rows_to_skip -= len(non_blank_records)
+            continue 
+          expected_field_count = len(non_blank_records[header_rows_to_skip])
+          yield input_byte_range(byte_start, byte_end, header_rows_to_skip, expected_field_count)
+          continue 
+        yield input_byte_range(byte_start, byte_end, 0, expected_field_count)
+
+  '''
+    Cleans one byte range of the memory mapped input into output file lines 
+  '''
+  def clean_byte_range_to_output_lines(self, byte_range) : 
+    memory_map = self.open_input_memory_map()
+    if memory_map is None : 
+      return [] 
+    with self.timed_stage('read_input') : 
+      with memory_map : 
+        range_text = self.decode_byte_range(memory_map, byte_range.byte_start, byte_range.byte_end)
+      range_records = list(self.iterate_normalized_records(self.build_record_reader(io.StringIO(range_text, newline='')), 
+                                                           byte_range.header_rows_to_skip, byte_range.expected_field_count, 
+                                                           describe_position=lambda : f"a record in bytes {byte_range.byte_start} to {byte_range.byte_end}"))
+    return self.clean_records_to_output_lines(range_records)
+
+  '''
+    Cleans a single field that has already been converted to its string form 
+  '''
+  def clean_field_string(self, string_form) : 
+    '''Empty strings, not null strings, additional fields, metatags, single lining with set spaces and string notation in one call'''
+    return cf.clean_field(string_form, self.compiled_field_replacements, self.remove_metatags, self.metatag_replacement, 
+                          self.spacing_between_items_in_fields, self.string_notation_char, self.empty_string_map.get('', '""'))
+
+  '''
+    clean_field_string with each text_cleaning_functions step run and timed separately, for the stage metrics. 
+    Gives the same result as the fused cf.clean_field. Times and calls count sample_weight times, the number of 
+    fields this one stands in for 
+  '''
+  def clean_field_string_with_stage_metrics(self, string_form, sample_weight=1) : 
+    if len(string_form) == 0 : 
+      return self.empty_string_map.get('', '""')
+    stage_nanoseconds, stage_calls = self.stage_metrics.stage_nanoseconds, self.stage_metrics.stage_calls
+    perf_counter_ns = time.perf_counter_ns
+    start_ns = perf_counter_ns()
+    string_form = cf.apply_compiled_replacements(string_form, self.compiled_field_replacements)
+    end_ns = perf_counter_ns()
+    stage_nanoseconds['field_replacements'] += (end_ns - start_ns) * sample_weight
+    if self.remove_metatags is True : 
+      start_ns = end_ns
+      string_form = cf.remove_metatags_from_string_single_pass(string_form, self.metatag_replacement)
+      end_ns = perf_counter_ns()
+      stage_nanoseconds['metatag_removal'] += (end_ns - start_ns) * sample_weight
+      stage_calls['metatag_removal'] += sample_weight
+    start_ns = end_ns
+    string_form = cf.collapse_whitespace_to_single_line(string_form, self.spacing_between_items_in_fields)
+    end_ns = perf_counter_ns()
+    stage_nanoseconds['whitespace_collapse'] += (end_ns - start_ns) * sample_weight
+    start_ns = end_ns
+    string_form = cf.append_string_if_missing(cf.prepend_string_if_missing(string_form, self.string_notation_char), self.string_notation_char)
+    stage_nanoseconds['string_notation'] += (perf_counter_ns() - start_ns) * sample_weight
+    stage_calls['field_replacements'] += sample_weight
+    stage_calls['whitespace_collapse'] += sample_weight
+    stage_calls['string_notation'] += sample_weight
+    return string_form
+
+  '''
+    The field cleaning function to use. When collecting stage metrics, one field in every 
+    field_helper_timing_sample_every_n_fields is cleaned step by step and timed, standing in for the fields around it, 
+    so the helper timings cost little more than the cleaning itself 
+  '''
+  def select_field_cleaner(self) : 
+    if self.field_memo_max_entries : 
+      return self.build_field_memo()
+    if self.stage_metrics is None : 
+      return self.clean_field_string
+    clean_field_string, clean_field_string_with_stage_metrics = self.clean_field_string, self.clean_field_string_with_stage_metrics
+    sample_every_n_fields = field_helper_timing_sample_every_n_fields
+    field_counter = itertools.count()
+    def clean_field_string_sampled(string_form) : 
+      if next(field_counter) % sample_every_n_fields : 
+        return clean_field_string(string_form)
+      return clean_field_string_with_stage_metrics(string_form, sample_every_n_fields)
+    return clean_field_string_sampled
+
+  '''
+    The least recently used memo over clean_field_string, built once per process. With the memo on, the field 
+    helper stages are not timed, its hit rate says more about where cleaning time goes 
+  '''
+  def build_field_memo(self) : 
+    if self.field_memo is None : 
+      self.field_memo = functools.lru_cache(maxsize=self.field_memo_max_entries)(self.clean_field_string)
+    return self.field_memo
+
+  '''
+    Field memo hits and misses in this process so far, from the memo and from vectorized distinct value cleaning 
+  '''
+  def count_field_memo_hits_and_misses(self) : 
+    memo_statistics = self.field_memo.cache_info() if self.field_memo is not None else None 
+    return (self.field_memo_counts[0] + (memo_statistics.hits if memo_statistics else 0), 
+            self.field_memo_counts[1] + (memo_statistics.misses if memo_statistics else 0))
+
+  '''
+    Leaves out rows already written to this file, tracking rows by hash in two bounded generations 
+  '''
+  def drop_duplicate_output_rows(self, output_lines) : 
+    if self.row_hash_generations is None : 
+      self.row_hash_generations = [set(), set()]
+    current_generation, previous_generation = self.row_hash_generations
+    generation_size = max(1, self.max_tracked_row_hashes // 2)
+    kept_lines = [] 
+    for output_line in output_lines : 
+      row_hash = hash(output_line) if isinstance(output_line, str) else hash(tuple(output_line))
+      if row_hash in current_generation or row_hash in previous_generation : 
+        continue 
+      current_generation.add(row_hash)
+      kept_lines.append(output_line)
+      if len(current_generation) >= generation_size : 
+        previous_generation, current_generation = current_generation, set()
+        self.row_hash_generations = [current_generation, previous_generation]
+    self.duplicate_row_counts[0] += len(output_lines)
+    self.duplicate_row_counts[1] += len(output_lines) - len(kept_lines)
+    return kept_lines
+
+  '''
+    Field memo and duplicate row statistics, None for whichever is off. Hits and misses include worker processes, 
+    entries only counts this process's memo 
+  '''
+  def deduplication_report(self) : 
+    field_memo_report = None 
+    if self.field_memo_max_entries : 
+      memo_hits, memo_misses = self.count_field_memo_hits_and_misses()
+      memo_hits, memo_misses = memo_hits + self.worker_field_memo_counts[0], memo_misses + self.worker_field_memo_counts[1]
+      field_memo_report = {'hits' : memo_hits, 'misses' : memo_misses, 
+                           'hit_rate' : memo_hits / (memo_hits + memo_misses) if memo_hits + memo_misses else None, 
+                           'entries' : self.field_memo.cache_info().currsize if self.field_memo is not None else 0, 
+                           'max_entries' : self.field_memo_max_entries}
+    duplicate_rows_report = None 
+    if self.drop_duplicate_rows : 
+      rows_checked, duplicates_dropped = self.duplicate_row_counts
+      duplicate_rows_report = {'rows_checked' : rows_checked, 'duplicates_dropped' : duplicates_dropped, 
+                               'drop_rate' : duplicates_dropped / rows_checked if rows_checked else None, 
+                               'tracked_row_hashes' : sum(len(generation) for generation in self.row_hash_generations or []), 
+                               'max_tracked_row_hashes' : self.max_tracked_row_hashes}
+    return {'field_memo' : field_memo_report, 'duplicate_rows' : duplicate_rows_report}
+
+  '''
+    Cleans every row of a dataframe, returning a list of cleaned field lists (one per row) using the chosen engine
+  '''
+  def clean_dataframe_rows(self, dataframe) : 
+    if self.cleaning_engine == 'vectorized' : 
+      return self.clean_dataframe_rows_vectorized(dataframe)
+    return self.clean_dataframe_rows_with_row_loop(dataframe)
+
+  '''
+    Row loop engine. Cleans one field at a time 
+  '''
+  def clean_dataframe_rows_with_row_loop(self, dataframe) : 
+    cleaned_rows = [] 
+    rows, cols = dataframe.shape
+    clean_field_string = self.select_field_cleaner()
+    '''By looping over rows iteratively'''
+    for _index, row in dataframe.iterrows() :
+      '''Picking out the columns'''
+      cleaned_rows.append([clean_field_string(str(row[col])) for col in range(cols)])
+    return cleaned_rows
+
+  '''
+    Vectorized engine. Runs the clean_field_string pipeline on whole columns with pandas .str operations 
+    Values are taken from dataframe.values, exactly as iterrows sees them, so numbers stringify the same way (50.0, 26012024)
+    Columns are kept as object dtype so the .str operations use python str / re semantics 
+  '''
+  def clean_dataframe_rows_vectorized(self, dataframe) : 
+    import pandas as pd
+    rows, cols = dataframe.shape
+    if rows == 0 : 
+      return [] 
+    dataframe_values = dataframe.values
+    cleaned_columns = [] 
+    for col in range(cols) : 
+      column_strings = pd.Series([str(value) for value in dataframe_values[:, col]], dtype=object)
+      if self.field_memo_max_entries : 
+        '''Each distinct value cleaned once, then spread back over the rows holding it'''
+        value_codes, distinct_strings = pd.factorize(column_strings)
+        cleaned_distinct_strings = self.clean_string_column(pd.Series(distinct_strings, dtype=object)).to_numpy(dtype=object)
+        self.field_memo_counts[0] += len(value_codes) - len(distinct_strings)
+        self.field_memo_counts[1] += len(distinct_strings)
+        cleaned_columns.append(cleaned_distinct_strings[value_codes].tolist())
+        continue 
+      cleaned_columns.append(self.clean_string_column(column_strings).tolist())
+    return [list(row_fields) for row_fields in zip(*cleaned_columns)]
+
+  '''
+    Cleans an object dtype series of field strings the same way clean_field_string cleans each one 
+  '''
+  def clean_string_column(self, column_strings) : 
+    empty_fields = column_strings.str.len() == 0
+    '''Not null strings and additional fields, one compiled stage at a time. A field emptied by one replacement takes the next replacement value'''
+    may_have_empty_fields = empty_fields.any()
+    with self.timed_stage('field_replacements') : 
+      column_strings, may_have_empty_fields = self.apply_replacements_to_string_column(column_strings, may_have_empty_fields)
+    if self.remove_metatags is True : 
+      with self.timed_stage('metatag_removal') : 
+        column_strings = self.remove_metatags_from_string_column(column_strings)
+    '''Whitespace collapse. Stripping then replacing runs of whitespace matches split() and join()'''
+    space_joiner = ' ' * self.spacing_between_items_in_fields if self.spacing_between_items_in_fields != 0 else ''
+    with self.timed_stage('whitespace_collapse') : 
+      column_strings = column_strings.str.strip().str.replace(cf.whitespace_run, space_joiner, regex=True)
+    if ((column_strings.str.len() == 0) & ~empty_fields).any() : 
+      '''The row loop fails prepending to an emptied field, so fail the same way'''
+      raise IndexError(f"Field cleaned down to an empty string in {self.full_input_path_to_text_to_clean}")
+    '''Ensuring string formatting consistently'''
+    with self.timed_stage('string_notation') : 
+      column_strings = column_strings.mask(column_strings.str[:1] != self.string_notation_char, self.string_notation_char + column_strings)
+      column_strings = column_strings.mask(column_strings.str[-1:] != self.string_notation_char, column_strings + self.string_notation_char)
+    '''Dealing with empty strings'''
+    if empty_fields.any() : 
+      column_strings = column_strings.mask(empty_fields, cf.replace_empty_string_with_target_string('', self.empty_string_map.get('', '""')))
+    return column_strings
+
+  '''
+    The compiled replacement stages applied to a column. Returns the column and whether it may now hold empty fields 
+  '''
+  def apply_replacements_to_string_column(self, column_strings, may_have_empty_fields) : 
+    for stage_pairs, stage_pattern, stage_lookup in self.compiled_field_replacements : 
+      if stage_pattern is None : 
+        source_string, replacement = stage_pairs[0]
+        emptied_fields = column_strings.str.len() == 0 if may_have_empty_fields else None
+        column_strings = column_strings.str.replace(source_string, replacement, regex=False)
+        if emptied_fields is not None and emptied_fields.any() : 
+          column_strings = column_strings.mask(emptied_fields, replacement)
+      else : 
+        stage_input_strings = column_strings
+        column_strings = column_strings.str.replace(stage_pattern, lambda match : stage_lookup[match.group(0)], regex=True)
+        if may_have_empty_fields or any(len(replacement) == 0 for _source, replacement in stage_pairs) : 
+          replayed_fields = (stage_input_strings.str.len() == 0) | (column_strings.str.len() == 0)
+          if replayed_fields.any() : 
+            column_strings[replayed_fields] = stage_input_strings[replayed_fields].map(lambda string_form : cf.apply_sequential_replacements(string_form, stage_pairs))
+      may_have_empty_fields = may_have_empty_fields or any(len(replacement) == 0 for _source, replacement in stage_pairs)
+    return column_strings, may_have_empty_fields
+
+  '''
+    Single pass regex tag removal on a column. Fields where the one pass could differ from 
+    the sequential tag by tag replacement (tags nested inside tags) fall back to cf.remove_metatags_from_string
+  '''
+  def remove_metatags_from_string_column(self, column_strings) : 
+    if '<' in self.metatag_replacement or '>' in self.metatag_replacement : 
+      return column_strings.map(lambda string_form : cf.remove_metatags_from_string(string_form, self.metatag_replacement))
+    nested_metatag_fields = column_strings.str.contains(cf.contains_nested_metatag, regex=True)
+    stripped_strings = column_strings.str.replace(cf.contains_metatag, self.metatag_replacement.replace('\\', '\\\\'), regex=True)
+    if nested_metatag_fields.any() : 
+      stripped_strings[nested_metatag_fields] = column_strings[nested_metatag_fields].map(lambda string_form : cf.remove_metatags_from_string(string_form, self.metatag_replacement))
+    column_strings = stripped_strings
+    return column_strings
+
+  '''
+    Cleans a dataframe (or chunk) into its output file lines 
+  '''
+  def clean_dataframe_to_output_lines(self, dataframe) : 
+    if self.output_format != 'text' : 
+      return self.clean_dataframe_rows(dataframe)
+    return [self.output_file_delimiter.join(row_fields) for row_fields in self.clean_dataframe_rows(dataframe)]
+
+  '''
+    Cleans a batch of raw csv engine records into output file lines (lists of cleaned fields for columnar output) 
+  '''
+  def clean_records_to_output_lines(self, record_batch) : 
+    clean_field_string = self.select_field_cleaner()
+    if self.output_format != 'text' : 
+      return [[clean_field_string(field) for field in record] for record in record_batch]
+    return [self.output_file_delimiter.join([clean_field_string(field) for field in record]) for record in record_batch]
+
+  '''
+    One unit of input for the chosen engine (a record batch or mmap byte range for csv, a dataframe otherwise) into output file lines 
+  '''
+  def clean_input_batch_to_output_lines(self, input_batch) : 
+    if self.input_profile is not None and self.cleaning_engine != 'csv' : 
+      '''csv engine records are profiled as they are read, dataframes here'''
+      with self.timed_stage('profile_input') : 
+        self.input_profile.record_dataframe(input_batch)
+    if self.stage_metrics is not None : 
+      with self.stage_metrics.timed_stage('clean_batch') : 
+        output_lines = self.clean_input_batch_to_output_lines_untimed(input_batch)
+      self.stage_metrics.rows_cleaned += len(output_lines)
+      return output_lines 
+    return self.clean_input_batch_to_output_lines_untimed(input_batch)
+
+  '''
+    As above, with no stage timing, dispatching on the kind of input batch 
+  '''
+  def clean_input_batch_to_output_lines_untimed(self, input_batch) : 
+    if isinstance(input_batch, input_byte_range) : 
+      return self.clean_byte_range_to_output_lines(input_batch)
+    if self.cleaning_engine == 'csv' : 
+      return self.clean_records_to_output_lines(input_batch)
+    return self.clean_dataframe_to_output_lines(input_batch)
+
+  '''
+    Yields the units of input for the chosen engine 
+  '''
+  def iterate_input_batches(self) : 
+    if self.cleaning_engine == 'csv' : 
+      return self.iterate_input_record_batches()
+    return self.iterate_input_dataframes()
+
+  '''
+    Yields the units of input handed to worker processes. mmap byte ranges, record batches and chunked reads are used as is, 
+    a loaded dataframe is split into a few slices per worker 
+  '''
+  def iterate_worker_batches(self) : 
+    if self.cleaning_engine == 'csv' and self.input_reader == 'mmap' : 
+      yield from self.iterate_worker_byte_ranges()
+      return 
+    if self.cleaning_engine == 'csv' or self.chunk_size_in_rows is not None : 
+      yield from self.iterate_input_batches()
+      return 
+    for dataframe in self.iterate_input_dataframes() : 
+      rows_per_slice = max(1, -(-len(dataframe) // (self.workers * 4)))
+      for slice_start in range(0, len(dataframe), rows_per_slice) : 
+        yield dataframe.iloc[slice_start:slice_start + rows_per_slice]
+
+  '''
+    Pairs each input batch with how many of its output lines were already written by a resumed run. 
+    Batches written in full are dropped before cleaning. Byte ranges do not know their row count, so they get None 
+    and are trimmed after cleaning instead 
+  '''
+  def plan_written_row_skips(self, input_batches, rows_to_skip) : 
+    for input_batch in input_batches : 
+      if rows_to_skip == 0 : 
+        yield input_batch, 0 
+      elif isinstance(input_batch, input_byte_range) : 
+        yield input_batch, None 
+      elif len(input_batch) <= rows_to_skip : 
+        rows_to_skip -= len(input_batch)
+      else : 
+        yield input_batch, rows_to_skip
+        rows_to_skip = 0 
+
+  '''
+    Yields the output file lines of each input batch (dataframe, chunk or record batch) in input order, 
+    leaving out the first rows_to_skip rows (already written by a run being resumed). 
+    With more than one worker, batches are cleaned in a process pool while at most two per worker are in flight 
+  '''
+  def iterate_cleaned_output_lines(self, rows_to_skip=0) : 
+    rows_left_to_skip = rows_to_skip
+    def drop_written_lines(output_lines, lines_to_drop) : 
+      nonlocal rows_left_to_skip
+      if lines_to_drop is None : 
+        lines_to_drop = min(rows_left_to_skip, len(output_lines))
+        rows_left_to_skip -= lines_to_drop
+      return output_lines[lines_to_drop:] if lines_to_drop else output_lines
+    if self.workers is None or self.workers <= 1 : 
+      input_batches = self.iterate_input_batches()
+      if self.stage_metrics is not None : 
+        input_batches = self.stage_metrics.timed_iteration('read_input', input_batches)
+      for input_batch, lines_to_drop in self.plan_written_row_skips(input_batches, rows_to_skip) : 
+        yield drop_written_lines(self.clean_input_batch_to_output_lines(input_batch), lines_to_drop)
+      return 
+    worker_batches = self.iterate_worker_batches()
+    clean_in_worker = clean_input_batch_to_output_lines_in_worker
+    if self.stage_metrics is not None : 
+      worker_batches = self.stage_metrics.timed_iteration('read_input', worker_batches)
+    if self.stage_metrics is not None or self.field_memo_max_entries or self.input_profile is not None : 
+      clean_in_worker = clean_input_batch_with_reports_in_worker
+    def worker_output_lines(pending_cleaning) : 
+      if clean_in_worker is clean_input_batch_to_output_lines_in_worker : 
+        return pending_cleaning.result()
+      output_lines, worker_report = pending_cleaning.result()
+      if worker_report['stage_metrics'] is not None : 
+        self.stage_metrics.merge(worker_report['stage_metrics'])
+      self.worker_field_memo_counts[0] += worker_report['field_memo_hits']
+      self.worker_field_memo_counts[1] += worker_report['field_memo_misses']
+      if worker_report['input_profile'] is not None : 
+        self.input_profile.merge(worker_report['input_profile'])
+      return output_lines 
+    with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=install_worker_text_cleaner, initargs=(self,)) as executor : 
+      pending_cleanings = collections.deque()
+      for input_batch, lines_to_drop in self.plan_written_row_skips(worker_batches, rows_to_skip) : 
+        pending_cleanings.append((executor.submit(clean_in_worker, input_batch), lines_to_drop))
+        if len(pending_cleanings) >= self.workers * 2 : 
+          pending_cleaning, lines_to_drop = pending_cleanings.popleft()
+          yield drop_written_lines(worker_output_lines(pending_cleaning), lines_to_drop)
+      while pending_cleanings : 
+        pending_cleaning, lines_to_drop = pending_cleanings.popleft()
+        yield drop_written_lines(worker_output_lines(pending_cleaning), lines_to_drop)
+
+  '''
+    Cleans dataframe to a text file output (can be specified as csv, or other file extensions writable from character streams)
+    Rows are written as each input batch is cleaned, so only one batch of output is held at a time. 
+    If anything fails, the partial output and its checkpoint are kept and the last good row offset is reported 
+  '''
+  def clean_dataframe_to_text_file(self) : 
+    if self.incremental_cleaning : 
+      return self.clean_incrementally()
+    self.write_cleaned_output(self.build_output_writer())
+
+  '''
+    The writer for the chosen output format 
+  '''
+  def build_output_writer(self) : 
+    if self.output_format == 'text' : 
+      return atomic_text_output_writer(self.full_output_path_to_clean_text, self.output_encoding_type, 
+                                       self.write_buffer_size_in_bytes, self.checkpoint_every_rows, self.resume_partial_output)
+    return columnar_output_writer(self.full_output_path_to_clean_text, self.output_format, self.string_notation_char, 
+                                  self.output_column_names, self.output_column_types, self.output_compression)
+
+  '''
+    Writes cleaned output lines through output_writer, committing at the end or aborting on any failure. 
+    iterate_output_lines (iterate_cleaned_output_lines by default) is given the rows already written. 
+    The writer is only opened once the first batch is cleaned, so an input that cannot be read leaves no files behind 
+  '''
+  def write_cleaned_output(self, output_writer, iterate_output_lines=None) : 
+    iterate_output_lines = iterate_output_lines or self.iterate_cleaned_output_lines
+    self.row_hash_generations = None 
+    self.last_good_row_offset = None 
+    if self.stage_metrics is not None : 
+      self.stage_metrics.start_file(self.full_input_path_to_text_to_clean)
+    rows_already_written = output_writer.count_rows_already_written()
+    output_batches = iter(iterate_output_lines(rows_already_written))
+    first_output_batch = next(output_batches, None)
+    try : 
+      output_writer.open()
+    except : 
+      raise Exception(f"Unable to open {output_writer.partial_output_path} for writing")
+    self.output_rows_written = rows_already_written
+    next_progress_time = time.perf_counter() + self.progress_interval_seconds
+    try : 
+      for output_file_strings in itertools.chain([first_output_batch] if first_output_batch is not None else [], output_batches) : 
+        if self.drop_duplicate_rows : 
+          output_file_strings = self.drop_duplicate_output_rows(output_file_strings)
+        with self.timed_stage('write_output') : 
+          output_writer.write_lines(output_file_strings)
+        self.output_rows_written = output_writer.rows_written
+        if self.stage_metrics is not None : 
+          self.stage_metrics.record_output(len(output_file_strings), output_writer.bytes_written)
+          if self.progress_callback is not None and time.perf_counter() >= next_progress_time : 
+            self.progress_callback(self.stage_metrics_report('progress'))
+            next_progress_time = time.perf_counter() + self.progress_interval_seconds
+      with self.timed_stage('write_output') : 
+        output_writer.commit()
     except :
-      raise Exception(f'Error loading dataframe for cleaning at {self.full_input_path_to_text_to_clean}')
+      self.last_good_row_offset = output_writer.abort()
+      if self.last_good_row_offset is None : 
+        '''Nothing kept to resume from'''
+        raise 
+      raise Exception(f'Error cleaning {self.full_input_path_to_text_to_clean} to {self.full_output_path_to_clean_text}. '
+                      f'The first {self.last_good_row_offset} rows are kept in {output_writer.partial_output_path}, '
+                      f'rerun with resume_partial_output=True to continue from there')
+    self.output_file_written = True
+    if self.progress_callback is not None : 
+      self.progress_callback(self.stage_metrics_report('finished'))
+
+  '''
+    Path of the sidecar index kept by incremental cleaning 
+  '''
+  def build_clean_index_path(self) : 
+    return f"{self.full_output_path_to_clean_text}.clean_index.json"
+
+  '''
+    Fingerprint of every setting that shapes the output, so output made with other settings is never reused 
+  '''
+  def build_configuration_hash(self) : 
+    output_settings = (self.input_file_delimiter, self.output_file_delimiter, self.header, self.index_col, self.na_values, 
+                       self.keep_default_na, self.quote_char, self.escape_char, 
+                       self.on_bad_lines if not callable(self.on_bad_lines) else getattr(self.on_bad_lines, '__qualname__', 'callable'), 
+                       sorted(self.empty_string_map.items()), list(self.not_null_map.items()), list(self.additional_field_map.items()), 
+                       self.remove_metatags, self.metatag_replacement, self.spacing_between_items_in_fields, self.string_notation_char, 
+                       self.input_encoding_type, self.output_encoding_type, self.cleaning_engine, self.chunk_size_in_rows, 
+                       self.output_format, self.output_column_names, 
+                       sorted((str(column), type_alias) for column, type_alias in (self.output_column_types or {}).items()), 
+                       self.output_compression, self.drop_duplicate_rows, self.max_tracked_row_hashes if self.drop_duplicate_rows else None)
+    return hashlib.blake2b(repr(output_settings).encode('utf-8'), digest_size=16).hexdigest()
+
+  '''
+    blake2b hash of the first byte_count bytes of the input 
+  '''
+  def hash_input_bytes(self, byte_count) : 
+    content_hash = hashlib.blake2b(digest_size=16)
+    bytes_left = byte_count
+    with open(self.full_input_path_to_text_to_clean, 'rb') as input_file : 
+      while bytes_left > 0 and len(input_block := input_file.read(min(bytes_left, 1024*1024))) : 
+        content_hash.update(input_block)
+        bytes_left -= len(input_block)
+    return content_hash.hexdigest()
+
+  '''
+    The sidecar index of the last incremental clean, or None when it is missing or unreadable 
+  '''
+  def read_clean_index(self) : 
+    try : 
+      with open(self.build_clean_index_path(), 'r', encoding='utf-8') as index_file : 
+        return json.load(index_file)
+    except (OSError, ValueError) : 
+      return None 
+
+  '''
+    Writes the sidecar index through a temporary file, so a reader never sees half of it 
+  '''
+  def write_clean_index(self, clean_index) : 
+    index_path = self.build_clean_index_path()
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as index_file : 
+      json.dump(clean_index, index_file, indent=2)
+    os.replace(index_path + '.tmp', index_path)
+
+  '''
+    True when the input byte just before byte_offset ends a line, so cleaning can pick up there 
+  '''
+  def input_line_ends_at(self, byte_offset) : 
+    if byte_offset == 0 : 
+      return True 
+    with open(self.full_input_path_to_text_to_clean, 'rb') as input_file : 
+      input_file.seek(byte_offset - 1)
+      return input_file.read(1) in (b'\n', b'\r')
+
+  '''
+    Decides what incremental cleaning must do, as (action, input size, input mtime, content hash of the input) 
+    with action one of skip, append or clean. A hash is only taken when size and mtime cannot settle it 
+  '''
+  def plan_incremental_cleaning(self, clean_index) : 
+    input_status = os.stat(self.full_input_path_to_text_to_clean)
+    input_size, input_mtime_ns = input_status.st_size, input_status.st_mtime_ns
+    if (clean_index is None or clean_index.get('configuration_hash') != self.build_configuration_hash() or 
+        not os.path.exists(self.full_output_path_to_clean_text) or 
+        os.path.getsize(self.full_output_path_to_clean_text) != clean_index.get('output_bytes')) : 
+      return 'clean', input_size, input_mtime_ns, None 
+    cleaned_bytes = clean_index['input_bytes_cleaned']
+    if input_size == cleaned_bytes and input_mtime_ns == clean_index['input_mtime_ns'] : 
+      return 'skip', input_size, input_mtime_ns, clean_index['input_content_hash']
+    if input_size < cleaned_bytes : 
+      return 'clean', input_size, input_mtime_ns, None 
+    if self.hash_input_bytes(cleaned_bytes) != clean_index['input_content_hash'] : 
+      return 'clean', input_size, input_mtime_ns, None 
+    if input_size == cleaned_bytes : 
+      '''Touched but not changed'''
+      return 'skip', input_size, input_mtime_ns, clean_index['input_content_hash']
+    if self.output_format != 'text' or self.drop_duplicate_rows or not self.input_line_ends_at(cleaned_bytes) : 
+      return 'clean', input_size, input_mtime_ns, None 
+    if self.cleaning_engine == 'csv' and clean_index.get('input_field_count') is None : 
+      '''The tail's records are padded or skipped against the field count of the whole input'''
+      return 'clean', input_size, input_mtime_ns, None 
+    if self.cleaning_engine != 'csv' : 
+      '''A tail that changes a column's type changes how the rows already written would format'''
+      cleaned_column_dtypes = {int(position) : dtype for position, dtype in clean_index.get('column_dtypes') or []}
+      if len(cleaned_column_dtypes) == 0 : 
+        return 'clean', input_size, input_mtime_ns, None 
+      tail_text = self.read_input_tail_text(cleaned_bytes, input_size)
+      '''Bad lines are warned about by the read that cleans'''
+      with warnings.catch_warnings() : 
+        warnings.simplefilter('ignore')
+        tail_read_csv_arguments = self.build_tail_read_csv_arguments(cleaned_column_dtypes, tail_text)
+      if self.infer_column_dtypes(io.StringIO(tail_text, newline=''), cleaned_column_dtypes, tail_read_csv_arguments) != cleaned_column_dtypes : 
+        return 'clean', input_size, input_mtime_ns, None 
+      self.input_column_dtypes = cleaned_column_dtypes
+    return 'append', input_size, input_mtime_ns, None 
+
+  '''
+    The input bytes from byte_offset to byte_end, decoded 
+  '''
+  def read_input_tail_text(self, byte_offset, byte_end) : 
+    with open(self.full_input_path_to_text_to_clean, 'rb') as input_file : 
+      input_file.seek(byte_offset)
+      return input_file.read(byte_end - byte_offset).decode(self.input_encoding_type)
+
+  '''
+    pd.read_csv arguments for an input tail of tail_text with the columns of column_dtypes. It has no header rows and is 
+    not a file to memory map 
+  '''
+  def build_tail_read_csv_arguments(self, column_dtypes, tail_text) : 
+    read_csv_arguments = self.build_read_csv_arguments()
+    read_csv_arguments.update({'header' : None, 'memory_map' : False})
+    return self.build_chunked_read_csv_arguments(read_csv_arguments, max(column_dtypes) + 1, io.StringIO(tail_text, newline=''), 
+                                                 line_name='appended line')
+
+  '''
+    Yields input batches for the chosen engine from the input bytes from byte_offset to byte_end, 
+    as if they were a file of their own with no header rows. Dataframes are read with the column types of the whole input 
+    and csv records are checked against input_field_count, the field count of the whole input 
+  '''
+  def iterate_tail_input_batches(self, byte_offset, byte_end, input_field_count=None) : 
+    tail_text = self.read_input_tail_text(byte_offset, byte_end)
+    if self.cleaning_engine == 'csv' : 
+      tail_records = self.build_record_reader(io.StringIO(tail_text, newline=''))
+      yield from self.batch_records(self.iterate_normalized_records(tail_records, expected_field_count=input_field_count, 
+                                                                    describe_position=lambda : f"appended line {tail_records.line_num}"))
+      return 
+    import pandas as pd
+    with pd.read_csv(io.StringIO(tail_text, newline=''), chunksize=self.chunk_size_in_rows or default_record_batch_size_in_rows, 
+                     dtype=self.input_column_dtypes, **self.build_tail_read_csv_arguments(self.input_column_dtypes, tail_text)) as chunk_reader : 
+      yield from chunk_reader
+
+  '''
+    Incremental cleaning (see incremental_cleaning) : skips an unchanged input, appends the cleaned tail of a grown one, 
+    or cleans it in full, then records what was cleaned in the sidecar index 
+  '''
+  def clean_incrementally(self) : 
+    clean_index = self.read_clean_index()
+    action, input_size, input_mtime_ns, input_content_hash = self.plan_incremental_cleaning(clean_index)
+    self.last_incremental_action = {'skip' : 'skipped', 'append' : 'appended', 'clean' : 'cleaned'}[action]
+    if action == 'skip' : 
+      self.output_rows_written = clean_index['output_rows']
+      self.input_column_dtypes = {int(position) : dtype for position, dtype in clean_index.get('column_dtypes') or []}
+      self.output_file_written = True 
+    elif action == 'append' : 
+      output_writer = atomic_text_output_writer(self.full_output_path_to_clean_text, self.output_encoding_type, 
+                                                self.write_buffer_size_in_bytes, append_after_rows=clean_index['output_rows'])
+      self.write_cleaned_output(output_writer, lambda rows_already_written : (self.clean_input_batch_to_output_lines(input_batch) 
+                                for input_batch in self.iterate_tail_input_batches(clean_index['input_bytes_cleaned'], input_size, 
+                                                                                   clean_index.get('input_field_count'))))
+    else : 
+      self.write_cleaned_output(self.build_output_writer())
+    self.write_clean_index({'input_path' : os.path.abspath(self.full_input_path_to_text_to_clean), 
+                            'input_bytes_cleaned' : input_size, 'input_mtime_ns' : input_mtime_ns, 
+                            'input_content_hash' : input_content_hash or self.hash_input_bytes(input_size), 
+                            'output_rows' : self.output_rows_written, 
+                            'output_bytes' : os.path.getsize(self.full_output_path_to_clean_text), 
+                            'configuration_hash' : self.build_configuration_hash(), 
+                            'column_dtypes' : sorted(self.input_column_dtypes.items()) if self.cleaning_engine != 'csv' and self.input_column_dtypes else None, 
+                            'input_field_count' : (clean_index.get('input_field_count') if action != 'clean' else self.count_input_record_fields()) 
+                                                  if self.cleaning_engine == 'csv' else None})
+
+  '''
+    Number of fields in the first record after the header rows, which sets the field count for the csv engine 
+    (None for an input with no records) 
+  '''
+  def count_input_record_fields(self) : 
+    with open(self.full_input_path_to_text_to_clean, 'r', encoding=self.input_encoding_type, newline='') as input_lines : 
+      header_rows_to_skip = self.count_header_rows_to_skip()
+      for record in self.build_record_reader(input_lines) : 
+        if len(record) == 0 : 
+          continue 
+        if header_rows_to_skip > 0 : 
+          header_rows_to_skip -= 1 
+          continue 
+        return len(record)
+    return None
+
+  '''
+    A cleaner with these settings (sharing the compiled replacements) and none of this one's state : no open input, 
+    and fresh stage metrics, field memo, duplicate row tracking and input profile 
+  '''
+  def copy_settings(self) : 
+    cleaner_copy = copy.copy(self)
+    cleaner_copy.input_file = None 
+    cleaner_copy.input_file_loaded = False 
+    cleaner_copy.input_file_as_dataframe = None 
+    cleaner_copy.input_file_loaded_as_dataframe = False 
+    cleaner_copy.output_file_written = False 
+    cleaner_copy.output_rows_written = 0 
+    cleaner_copy.last_good_row_offset = None 
+    cleaner_copy.last_incremental_action = None 
+    cleaner_copy.input_column_dtypes = None 
+    cleaner_copy.reset_stage_metrics()
+    cleaner_copy.field_memo = None 
+    cleaner_copy.field_memo_counts = [0, 0] 
+    cleaner_copy.worker_field_memo_counts = [0, 0] 
+    cleaner_copy.row_hash_generations = None 
+    cleaner_copy.duplicate_row_counts = [0, 0] 
+    cleaner_copy.reset_input_profile()
+    return cleaner_copy
+
+  '''
+    Cleans one input file to one output file with these settings, leaving this cleaner untouched. 
+    Returns the per file result used by clean_files_in_batch : rows, bytes, duration, any error and, when profiling, 
+    the file's input profile 
+  '''
+  def clean_file_with_same_settings(self, full_input_path_to_text_to_clean, full_output_path_to_clean_text) : 
+    file_cleaner = self.copy_settings()
+    file_cleaner.workers = 1 
+    file_cleaner.update_full_input_path_to_text_to_clean(full_input_path_to_text_to_clean)
+    file_cleaner.update_full_output_path_to_clean_text(full_output_path_to_clean_text)
+    file_result = {'input_path' : full_input_path_to_text_to_clean, 'output_path' : full_output_path_to_clean_text, 
+                   'rows' : 0, 'bytes' : 0, 'duration_seconds' : 0.0, 'error' : None}
+    start_timestamp = time.perf_counter()
+    try : 
+      file_cleaner.clean_dataframe_to_text_file()
+      file_result['rows'] = file_cleaner.output_rows_written
+      file_result['bytes'] = os.path.getsize(full_output_path_to_clean_text)
+    except Exception as error : 
+      file_result['error'] = f"{error} ({error.__context__})" if error.__context__ is not None else str(error)
+    file_result['duration_seconds'] = time.perf_counter() - start_timestamp
+    if file_cleaner.input_profile is not None : 
+      file_result['input_profile'] = file_cleaner.input_profile_report()
+    return file_result
+
+  '''
+    Cleans many files with this one configuration (maps are compiled once, at construction). 
+    Takes either input_output_pairs, a list of (input path, output path), or input_glob with an output_directory 
+    that receives files of the same name. Files are cleaned concurrently by a pool of max_concurrent_files processes 
+    (defaults to the cpu count, 1 runs inline) that each receive the configuration once. A failing file does not stop the batch. 
+    Returns one result per file in input order 
+  '''
+  def clean_files_in_batch(self, input_output_pairs=None, input_glob=None, output_directory=None, max_concurrent_files=None) : 
+    if input_output_pairs is None : 
+      if input_glob is None or output_directory is None : 
+        raise ValueError("Provide input_output_pairs, or input_glob together with output_directory")
+      input_output_pairs = [(input_path, os.path.join(output_directory, os.path.basename(input_path))) for input_path in sorted(glob.glob(input_glob))]
+    input_output_pairs = list(input_output_pairs)
+    if max_concurrent_files is None : 
+      max_concurrent_files = os.cpu_count() or 1 
+    if max_concurrent_files <= 1 or len(input_output_pairs) <= 1 : 
+      return [self.clean_file_with_same_settings(input_path, output_path) for input_path, output_path in input_output_pairs]
+    '''Several files per task keeps the per file process overhead small for batches of many small files'''
+    files_per_task = max(1, len(input_output_pairs) // (max_concurrent_files * 8))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_concurrent_files, initializer=install_worker_text_cleaner, initargs=(self,)) as executor : 
+      return list(executor.map(clean_file_in_worker, input_output_pairs, chunksize=files_per_task))
+
+'''
+  Buffered atomic output writer used by text_cleaner. 
+  Lines are encoded incrementally and written through a buffer of buffer_size_in_bytes into <output>.partial, 
+  joined by newlines (translated to os.linesep, as text mode writing did). commit() syncs and renames the partial file 
+  over the output, so the output path only ever holds a complete file. Every checkpoint_every_rows rows the partial file 
+  is synced and its row and byte offsets saved to <output>.partial.checkpoint. abort() keeps both; opening again with 
+  resume_partial_output truncates the partial file back to the checkpoint and carries on from that row 
+  append_after_rows instead appends to the existing output, which already holds that many rows. There is no partial 
+  file or checkpoint then; commit() syncs the output and abort() truncates it back to its old end 
+'''
+class atomic_text_output_writer : 
+  def __init__(self, full_output_path, encoding_type='utf-8', buffer_size_in_bytes=1024*1024, 
+               checkpoint_every_rows=100000, resume_partial_output=False, append_after_rows=None) : 
+    self.full_output_path = full_output_path
+    self.append_after_rows = append_after_rows
+    self.append_start_bytes = None 
+    self.partial_output_path = f"{full_output_path}.partial"
+    self.checkpoint_path = f"{self.partial_output_path}.checkpoint"
+    self.encoding_type = encoding_type
+    self.buffer_size_in_bytes = buffer_size_in_bytes
+    self.checkpoint_every_rows = checkpoint_every_rows
+    self.resume_partial_output = resume_partial_output
+    self.output_file = None 
+    self.encoder = None 
+    self.rows_written = 0 
+    self.bytes_written = 0 
+    self.checkpointed_rows = 0 
+    self.checkpointed_bytes = 0 
+
+  '''
+    Reads the checkpoint of an earlier run, if there is one 
+  '''
+  def read_checkpoint(self) : 
+    try : 
+      with open(self.checkpoint_path, 'r', encoding='utf-8') as checkpoint_file : 
+        checkpoint = json.load(checkpoint_file)
+      return int(checkpoint['rows']), int(checkpoint['bytes'])
+    except (OSError, ValueError, KeyError, TypeError) : 
+      return None 
+
+  '''
+    The checkpoint to resume from as (rows, bytes), when asked to resume and the partial output still holds it 
+  '''
+  def find_resume_checkpoint(self) : 
+    checkpoint = self.read_checkpoint() if self.resume_partial_output and os.path.exists(self.partial_output_path) else None 
+    if checkpoint is not None and checkpoint[1] <= os.path.getsize(self.partial_output_path) : 
+      return checkpoint
+    return None 
+
+  '''
+    Rows open() will report as already written, found without opening anything 
+  '''
+  def count_rows_already_written(self) : 
+    if self.append_after_rows is not None : 
+      return self.append_after_rows
+    checkpoint = self.find_resume_checkpoint()
+    return checkpoint[0] if checkpoint is not None else 0 
+
+  '''
+    Opens the partial output, resuming from the checkpoint when asked to and one exists. Returns the rows already written 
+  '''
+  def open(self) : 
+    self.encoder = codecs.getincrementalencoder(self.encoding_type)()
+    if self.append_after_rows is not None : 
+      self.partial_output_path = self.full_output_path
+      self.checkpoint_every_rows = 0 
+      self.output_file = open(self.full_output_path, 'r+b', buffering=self.buffer_size_in_bytes)
+      self.append_start_bytes = self.output_file.seek(0, os.SEEK_END)
+      self.rows_written, self.bytes_written = self.append_after_rows, self.append_start_bytes
+      if self.bytes_written : 
+        self.encoder.setstate(0)
+      return self.rows_written
+    checkpoint = self.find_resume_checkpoint()
+    if checkpoint is not None : 
+      self.output_file = open(self.partial_output_path, 'r+b', buffering=self.buffer_size_in_bytes)
+      self.output_file.truncate(checkpoint[1])
+      self.output_file.seek(checkpoint[1])
+      self.rows_written, self.bytes_written = self.checkpointed_rows, self.checkpointed_bytes = checkpoint
+      if self.bytes_written : 
+        '''No second byte order mark part way through the file'''
+        self.encoder.setstate(0)
+    else : 
+      self.output_file = open(self.partial_output_path, 'wb', buffering=self.buffer_size_in_bytes)
+      if os.path.exists(self.checkpoint_path) : 
+        os.remove(self.checkpoint_path)
+    return self.rows_written
+
+  '''
+    Writes output lines after those already written 
+  '''
+  def write_lines(self, output_lines) : 
+    if len(output_lines) == 0 : 
+      return 
+    output_text = ('\n' if self.rows_written else '') + '\n'.join(output_lines)
+    if os.linesep != '\n' : 
+      output_text = output_text.replace('\n', os.linesep)
+    encoded_output = self.encoder.encode(output_text)
+    self.output_file.write(encoded_output)
+    self.rows_written += len(output_lines)
+    self.bytes_written += len(encoded_output)
+    if self.checkpoint_every_rows and self.rows_written - self.checkpointed_rows >= self.checkpoint_every_rows : 
+      self.checkpoint()
+
+  '''
+    Syncs the partial output and records the rows and bytes now safely on disk 
+  '''
+  def checkpoint(self) : 
+    self.output_file.flush()
+    os.fsync(self.output_file.fileno())
+    with open(self.checkpoint_path + '.tmp', 'w', encoding='utf-8') as checkpoint_file : 
+      json.dump({'rows' : self.rows_written, 'bytes' : self.bytes_written}, checkpoint_file)
+    os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+    self.checkpointed_rows, self.checkpointed_bytes = self.rows_written, self.bytes_written
+
+  '''
+    Syncs the partial output and moves it over the output 
+  '''
+  def commit(self) : 
+    self.output_file.write(self.encoder.encode('', final=True))
+    self.output_file.flush()
+    os.fsync(self.output_file.fileno())
+    self.output_file.close()
+    if self.append_after_rows is not None : 
+      return 
+    os.replace(self.partial_output_path, self.full_output_path)
+    if os.path.exists(self.checkpoint_path) : 
+      os.remove(self.checkpoint_path)
+
+  '''
+    Keeps the partial output after a failure, checkpointing whatever still flushes. Returns the last good row offset, 
+    or None (removing the partial output and checkpoint) when not one row was kept 
+  '''
+  def abort(self) : 
+    if self.append_after_rows is not None : 
+      '''Put the output back as it was before appending'''
+      self.output_file.flush()
+      self.output_file.truncate(self.append_start_bytes)
+      self.output_file.close()
+      return None 
+    try : 
+      self.checkpoint()
+    except Exception : 
+      pass 
+    try : 
+      self.output_file.close()
+    except Exception : 
+      pass 
+    if self.checkpointed_rows == 0 : 
+      for leftover_path in (self.partial_output_path, self.checkpoint_path) : 
+        if os.path.exists(leftover_path) : 
+          os.remove(leftover_path)
+      return None 
+    return self.checkpointed_rows
+
+'''
+  Columnar output writer used by text_cleaner for the parquet, arrow and feather output formats, with the same 
+  open / write_lines / commit / abort interface as atomic_text_output_writer. Each written batch of cleaned rows is 
+  turned into columns, unquoted and typed, and written as one record batch (a parquet row group) into 
+  <output>.partial, moved over the output by commit(). A failed file cannot be resumed, abort() removes it 
+  Without pyarrow, parquet output collects every batch and writes once with pandas (needing fastparquet instead) 
+'''
+class columnar_output_writer : 
+  null_field_strings = frozenset(['', 'nan'])
+
+  def __init__(self, full_output_path, output_format='parquet', string_notation_char='"', column_names=None, 
+               column_types=None, compression=None) : 
+    self.full_output_path = full_output_path
+    self.partial_output_path = f"{full_output_path}.partial"
+    self.output_format = output_format
+    self.string_notation_char = string_notation_char
+    self.column_names = list(column_names) if column_names is not None else None 
+    self.column_types = dict(column_types or {})
+    self.compression = compression
+    self.rows_written = 0 
+    self.bytes_written = 0 
+    self.arrow_schema = None 
+    self.batch_writer = None 
+    self.collected_columns = None 
+    try : 
+      import pyarrow
+      self.pyarrow = pyarrow
+    except ImportError : 
+      if output_format != 'parquet' : 
+        raise Exception(f"The {output_format} output format needs pyarrow installed")
+      self.pyarrow = None 
+
+  def count_rows_already_written(self) : 
+    return 0 
+
+  def open(self) : 
+    if os.path.exists(self.partial_output_path) : 
+      os.remove(self.partial_output_path)
+    return 0 
+
+  '''
+    Strips one string_notation_char from each end of a cleaned field, giving back the value a csv reader would see 
+  '''
+  def unquote_field(self, cleaned_field) : 
+    notation_length = len(self.string_notation_char)
+    if (notation_length and len(cleaned_field) >= 2 * notation_length and 
+        cleaned_field.startswith(self.string_notation_char) and cleaned_field.endswith(self.string_notation_char)) : 
+      return cleaned_field[notation_length:-notation_length]
+    return cleaned_field
+
+  '''
+    The arrow type alias asked for a column, by name or position, or None to keep it a string 
+  '''
+  def column_type_alias(self, column_position) : 
+    if self.column_names[column_position] in self.column_types : 
+      return self.column_types[self.column_names[column_position]]
+    return self.column_types.get(column_position)
+
+  '''
+    Column wise unquoted fields of a batch of cleaned rows, fixing the column names on the first batch 
+  '''
+  def build_columns(self, output_rows) : 
+    unquote_field = self.unquote_field
+    columns = [[unquote_field(cleaned_field) for cleaned_field in column_fields] for column_fields in zip(*output_rows)]
+    if self.column_names is None : 
+      self.column_names = [str(column_position) for column_position in range(len(columns))]
+    if len(columns) != len(self.column_names) : 
+      raise Exception(f"Expected {len(self.column_names)} output columns, cleaned {len(columns)}")
+    return columns 
+
+  '''
+    One arrow record batch of the columns, typed columns cast from their text with empty and nan fields as nulls 
+  '''
+  def build_record_batch(self, columns) : 
+    pa = self.pyarrow
+    arrays = [] 
+    for column_position, column_fields in enumerate(columns) : 
+      type_alias = self.column_type_alias(column_position)
+      if type_alias is None : 
+        arrays.append(pa.array(column_fields, type=pa.string()))
+        continue 
+      null_field_strings = self.null_field_strings
+      text_array = pa.array([None if column_field in null_field_strings else column_field for column_field in column_fields], type=pa.string())
+      arrays.append(text_array.cast(pa.type_for_alias(type_alias)))
+    if self.arrow_schema is None : 
+      self.arrow_schema = pa.schema([pa.field(column_name, array.type) for column_name, array in zip(self.column_names, arrays)])
+    return pa.RecordBatch.from_arrays(arrays, schema=self.arrow_schema)
+
+  def open_batch_writer(self) : 
+    if self.output_format == 'parquet' : 
+      import pyarrow.parquet
+      return pyarrow.parquet.ParquetWriter(self.partial_output_path, self.arrow_schema, compression=self.compression or 'snappy')
+    import pyarrow.ipc
+    return pyarrow.ipc.new_file(self.partial_output_path, self.arrow_schema, 
+                                options=pyarrow.ipc.IpcWriteOptions(compression=self.compression))
+
+  def write_lines(self, output_rows) : 
+    if len(output_rows) == 0 : 
+      return 
+    columns = self.build_columns(output_rows)
+    if self.pyarrow is None : 
+      if self.collected_columns is None : 
+        self.collected_columns = [[] for _column in columns]
+      for collected_column, column_fields in zip(self.collected_columns, columns) : 
+        collected_column.extend(column_fields)
+    else : 
+      record_batch = self.build_record_batch(columns)
+      if self.batch_writer is None : 
+        self.batch_writer = self.open_batch_writer()
+      if self.output_format == 'parquet' : 
+        self.batch_writer.write_batch(record_batch)
+      else : 
+        self.batch_writer.write(record_batch)
+      self.bytes_written += record_batch.nbytes
+    self.rows_written += len(output_rows)
+
+  '''
+    The pandas fallback for parquet without pyarrow, written in one go 
+  '''
+  def write_collected_columns_with_pandas(self) : 
+    import pandas as pd
+    output_dataframe = pd.DataFrame({column_name : column_fields for column_name, column_fields in zip(self.column_names or [], self.collected_columns or [])})
+    for column_position, column_name in enumerate(output_dataframe.columns) : 
+      if (type_alias := self.column_type_alias(column_position)) is not None : 
+        output_dataframe[column_name] = output_dataframe[column_name].mask(output_dataframe[column_name].isin(self.null_field_strings)).astype(type_alias)
+    output_dataframe.to_parquet(self.partial_output_path, compression=self.compression or 'snappy', index=False)
+
+  def commit(self) : 
+    if self.pyarrow is None : 
+      self.write_collected_columns_with_pandas()
+    else : 
+      if self.batch_writer is None : 
+        '''Nothing cleaned, so write an empty file with whatever columns are known'''
+        pa = self.pyarrow
+        self.arrow_schema = pa.schema([pa.field(column_name, pa.string()) for column_name in self.column_names or []])
+        self.batch_writer = self.open_batch_writer()
+      self.batch_writer.close()
+    os.replace(self.partial_output_path, self.full_output_path)
+
+  '''
+    Removes the partial output, which cannot be resumed. Returns None as there is no good row offset to report 
+  '''
+  def abort(self) : 
+    try : 
+      if self.batch_writer is not None : 
+        self.batch_writer.close()
+    except Exception : 
+      pass 
+    if os.path.exists(self.partial_output_path) : 
+      os.remove(self.partial_output_path)
+    return None 
+
+'''
+  Stage metrics collected by text_cleaner when collect_stage_metrics is on 
+    stage_nanoseconds, stage_calls -> cumulative time and call count per stage. The field helper stages of the csv and 
+      row_loop engines are estimated from a sample of fields (see field_helper_timing_sample_every_n_fields). Stages nest : clean_batch includes the 
+      field helper stages (field_replacements, metatag_removal, whitespace_collapse, string_notation) and, for mmap byte 
+      ranges cleaned by workers, their read_input. read_input is otherwise the time spent pulling the next input batch 
+      (pd.read_csv, a chunk, or a batch of csv records) and write_output the time spent writing and committing output 
+    rows_cleaned, rows_written, output_bytes_written, input_bytes -> volume processed 
+    Peak memory comes from resource.getrusage (None where resource is missing, e.g. Windows), for this process and 
+    separately for the largest finished worker process 
+'''
+class cleaning_stage_metrics : 
+  def __init__(self) : 
+    self.stage_nanoseconds = collections.Counter()
+    self.stage_calls = collections.Counter()
+    self.rows_cleaned = 0 
+    self.rows_written = 0 
+    self.output_bytes_written = 0 
+    self.input_bytes = 0 
+    self.files_started = 0 
+    self.started_timestamp = time.perf_counter()
+
+  @contextlib.contextmanager
+  def timed_stage(self, stage_name) : 
+    start_ns = time.perf_counter_ns()
+    try : 
+      yield 
+    finally : 
+      self.stage_nanoseconds[stage_name] += time.perf_counter_ns() - start_ns
+      self.stage_calls[stage_name] += 1 
+
+  '''
+    Yields from items, timing each step of the iteration as one call of stage_name 
+  '''
+  def timed_iteration(self, stage_name, items) : 
+    items = iter(items)
+    while True : 
+      start_ns = time.perf_counter_ns()
+      try : 
+        item = next(items)
+      except StopIteration : 
+        return 
+      finally : 
+        self.stage_nanoseconds[stage_name] += time.perf_counter_ns() - start_ns
+        self.stage_calls[stage_name] += 1 
+      yield item 
+
+  def start_file(self, full_input_path) : 
+    self.files_started += 1 
+    try : 
+      self.input_bytes += os.path.getsize(full_input_path)
+    except OSError : 
+      pass 
+
+  def record_output(self, rows_written, output_bytes_written) : 
+    self.rows_written += rows_written
+    self.output_bytes_written = output_bytes_written
+
+  '''
+    Stage timings and rows cleaned as plain dicts, to send back from a worker process 
+  '''
+  def portable_state(self) : 
+    return {'stage_nanoseconds' : dict(self.stage_nanoseconds), 'stage_calls' : dict(self.stage_calls), 'rows_cleaned' : self.rows_cleaned}
+
+  def merge(self, portable_state) : 
+    self.stage_nanoseconds.update(portable_state['stage_nanoseconds'])
+    self.stage_calls.update(portable_state['stage_calls'])
+    self.rows_cleaned += portable_state['rows_cleaned']
+
+  '''
+    Peak resident memory in bytes of this process and of the largest finished child process 
+  '''
+  @staticmethod
+  def peak_memory_bytes() : 
+    try : 
+      import resource
+    except ImportError : 
+      return None, None 
+    kilobytes_or_bytes = 1 if sys.platform == 'darwin' else 1024 
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * kilobytes_or_bytes, 
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * kilobytes_or_bytes)
+
+  def as_dict(self, event='report', full_input_path=None) : 
+    elapsed_seconds = time.perf_counter() - self.started_timestamp
+    peak_memory_bytes, peak_worker_memory_bytes = self.peak_memory_bytes()
+    return {'event' : event, 'input_path' : full_input_path, 'elapsed_seconds' : elapsed_seconds, 
+            'stages' : {stage_name : {'seconds' : stage_nanoseconds / 1e9, 'calls' : self.stage_calls[stage_name]} 
+                        for stage_name, stage_nanoseconds in sorted(self.stage_nanoseconds.items(), key=lambda stage : -stage[1])}, 
+            'rows_cleaned' : self.rows_cleaned, 'rows_written' : self.rows_written, 'input_bytes' : self.input_bytes, 
+            'output_bytes_written' : self.output_bytes_written, 
+            'rows_per_second' : self.rows_written / elapsed_seconds if elapsed_seconds > 0 else None, 
+            'peak_memory_bytes' : peak_memory_bytes, 'peak_worker_memory_bytes' : peak_worker_memory_bytes}
+
+'''
+  HyperLogLog estimate of the number of distinct strings added, in 2 ** precision one byte registers whatever the count. 
+  Strings are hashed with 64 bit blake2b rather than hash(), so counters filled in other processes can be merged 
+'''
+class approximate_distinct_counter : 
+  def __init__(self, precision=12, registers=None) : 
+    if not 7 <= precision <= 16 : 
+      raise ValueError(f"precision must be between 7 and 16, got {precision}")
+    self.precision = precision
+    self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+  def add_all(self, strings) : 
+    registers = self.registers
+    rank_bits = 64 - self.precision
+    rank_mask = (1 << rank_bits) - 1 
+    for string_form in strings : 
+      string_hash = int.from_bytes(hashlib.blake2b(string_form.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+      register_index = string_hash >> rank_bits
+      '''Position of the first set bit after the register index'''
+      rank = rank_bits - (string_hash & rank_mask).bit_length() + 1 
+      if rank > registers[register_index] : 
+        registers[register_index] = rank
+
+  def merge(self, registers) : 
+    self.registers = bytearray(map(max, self.registers, registers))
+
+  def estimate(self) : 
+    register_count = len(self.registers)
+    raw_estimate = 0.7213 / (1 + 1.079 / register_count) * register_count ** 2 / sum(2.0 ** -register for register in self.registers)
+    empty_registers = self.registers.count(0)
+    if raw_estimate <= 2.5 * register_count and empty_registers : 
+      '''Small counts, where linear counting of the empty registers is more accurate'''
+      return round(register_count * math.log(register_count / empty_registers))
+    return round(raw_estimate)
+
+'''
+  Statistics of one input column, all of fixed size : counts, max and total length, a histogram of field lengths by 
+  power of two (bucket n holds lengths from 2 ** (n - 1) to 2 ** n - 1, bucket 0 empty fields), null token counts 
+  (bounded by the null strings) and an approximate_distinct_counter 
+'''
+class column_profile : 
+  def __init__(self, distinct_count_precision=12) : 
+    self.fields = 0 
+    self.empty_fields = 0 
+    self.total_length = 0 
+    self.max_field_length = 0 
+    self.length_histogram = collections.Counter()
+    self.null_token_counts = collections.Counter()
+    self.fields_with_metatags = 0 
+    self.metatags = 0 
+    self.distinct_values = approximate_distinct_counter(distinct_count_precision)
+
+  def record_fields(self, fields, na_strings=()) : 
+    field_lengths = [len(field) for field in fields]
+    self.fields += len(fields)
+    self.empty_fields += field_lengths.count(0)
+    self.total_length += sum(field_lengths)
+    self.max_field_length = max(self.max_field_length, max(field_lengths, default=0))
+    self.length_histogram.update(map(int.bit_length, field_lengths))
+    if na_strings : 
+      self.null_token_counts.update(field for field in fields if field in na_strings)
+    for field in fields : 
+      if '<' in field and len(metatags_contained := cf.contains_metatag.findall(field)) : 
+        self.fields_with_metatags += 1 
+        self.metatags += len(metatags_contained)
+    '''Each distinct string of the batch hashed once'''
+    self.distinct_values.add_all(set(fields))
+
+  def portable_state(self) : 
+    return {'fields' : self.fields, 'empty_fields' : self.empty_fields, 'total_length' : self.total_length, 
+            'max_field_length' : self.max_field_length, 'length_histogram' : dict(self.length_histogram), 
+            'null_token_counts' : dict(self.null_token_counts), 'fields_with_metatags' : self.fields_with_metatags, 
+            'metatags' : self.metatags, 'distinct_registers' : bytes(self.distinct_values.registers)}
+
+  def merge(self, portable_state) : 
+    self.fields += portable_state['fields']
+    self.empty_fields += portable_state['empty_fields']
+    self.total_length += portable_state['total_length']
+    self.max_field_length = max(self.max_field_length, portable_state['max_field_length'])
+    self.length_histogram.update(portable_state['length_histogram'])
+    self.null_token_counts.update(portable_state['null_token_counts'])
+    self.fields_with_metatags += portable_state['fields_with_metatags']
+    self.metatags += portable_state['metatags']
+    self.distinct_values.merge(portable_state['distinct_registers'])
+
+  def as_dict(self, column_number) : 
+    def describe_length_bucket(bucket) : 
+      return str(bucket) if bucket <= 1 else f"{1 << (bucket - 1)}-{(1 << bucket) - 1}"
+    return {'column' : column_number, 'fields' : self.fields, 'approximate_distinct_values' : self.distinct_values.estimate(), 
+            'null_token_counts' : dict(self.null_token_counts.most_common()), 'empty_fields' : self.empty_fields, 
+            'fields_with_metatags' : self.fields_with_metatags, 'metatags' : self.metatags, 
+            'max_field_length' : self.max_field_length, 
+            'mean_field_length' : self.total_length / self.fields if self.fields else None, 
+            'length_histogram' : {describe_length_bucket(bucket) : self.length_histogram[bucket] for bucket in sorted(self.length_histogram)}}
+
+'''
+  Streaming profile of an input file, filled by text_cleaner as it reads. csv engine records come in one at a time 
+  through record_record and are profiled column by column a batch at a time; dataframes come in through record_dataframe. 
+  Columns are numbered as in the input, index column included 
+'''
+class input_profile : 
+  def __init__(self, na_strings=frozenset(), distinct_count_precision=12) : 
+    self.na_strings = frozenset(na_strings)
+    self.distinct_count_precision = distinct_count_precision
+    self.column_profiles = [] 
+    self.records = 0 
+    self.blank_lines = 0 
+    self.padded_records = 0 
+    self.field_count_counts = collections.Counter()
+    self.bad_line_events = collections.Counter()
+    self.input_parsers = set()
+    self.pending_records = [] 
+
+  def record_record(self, record, expected_field_count) : 
+    self.records += 1 
+    self.field_count_counts[len(record)] += 1 
+    if len(record) < expected_field_count : 
+      self.padded_records += 1 
+    self.pending_records.append(record)
+    if len(self.pending_records) >= default_record_batch_size_in_rows : 
+      self.profile_pending_records()
+
+  def profile_pending_records(self) : 
+    if len(self.pending_records) == 0 : 
+      return 
+    self.input_parsers.add('csv_reader')
+    if len(set(map(len, self.pending_records))) == 1 : 
+      record_columns = zip(*self.pending_records)
+    else : 
+      record_columns = ([field for field in column_fields if field is not None] 
+                        for column_fields in itertools.zip_longest(*self.pending_records))
+    self.record_columns(record_columns, self.na_strings)
+    self.pending_records = [] 
+
+  def record_dataframe(self, dataframe) : 
+    rows, cols = dataframe.shape
+    self.input_parsers.add('pandas')
+    self.records += rows 
+    self.field_count_counts[cols] += rows 
+    dataframe_values = dataframe.values
+    '''Fields stringified as the dataframe engines clean them. pandas has already turned null strings into NaN'''
+    self.record_columns([[str(value) for value in dataframe_values[:, col]] for col in range(cols)])
+    for col, null_count in enumerate(dataframe.isna().sum().tolist()) : 
+      if null_count : 
+        self.column_profiles[col].null_token_counts['nan'] += null_count
+
+  def record_columns(self, columns, na_strings=()) : 
+    for col, column_fields in enumerate(columns) : 
+      if col == len(self.column_profiles) : 
+        self.column_profiles.append(column_profile(self.distinct_count_precision))
+      self.column_profiles[col].record_fields(list(column_fields), na_strings)
+
+  '''
+    The profile as plain dicts and bytes, to send back from a worker process 
+  '''
+  def portable_state(self) : 
+    self.profile_pending_records()
+    return {'records' : self.records, 'blank_lines' : self.blank_lines, 'padded_records' : self.padded_records, 
+            'field_count_counts' : dict(self.field_count_counts), 'bad_line_events' : dict(self.bad_line_events), 
+            'input_parsers' : sorted(self.input_parsers), 
+            'column_profiles' : [profile.portable_state() for profile in self.column_profiles]}
+
+  def merge(self, portable_state) : 
+    self.records += portable_state['records']
+    self.blank_lines += portable_state['blank_lines']
+    self.padded_records += portable_state['padded_records']
+    self.field_count_counts.update(portable_state['field_count_counts'])
+    self.bad_line_events.update(portable_state['bad_line_events'])
+    self.input_parsers.update(portable_state['input_parsers'])
+    for col, column_state in enumerate(portable_state['column_profiles']) : 
+      if col == len(self.column_profiles) : 
+        self.column_profiles.append(column_profile(self.distinct_count_precision))
+      self.column_profiles[col].merge(column_state)
+
+  def as_dict(self, full_input_path=None) : 
+    self.profile_pending_records()
+    return {'input_path' : full_input_path, 'input_parsers' : sorted(self.input_parsers), 'records' : self.records, 
+            'blank_lines' : self.blank_lines, 'padded_records' : self.padded_records, 
+            'field_count_counts' : dict(sorted(self.field_count_counts.items())), 
+            'bad_line_events' : dict(self.bad_line_events), 'bad_lines' : sum(self.bad_line_events[event] for event in ('warned', 'skipped', 'raised', 'passed_to_callable')), 
+            'columns' : [profile.as_dict(col) for col, profile in enumerate(self.column_profiles)]}
+
+'''
+  Process pool helpers. Each worker process receives the cleaner settings once through the pool initializer 
+  and then only the input batches it is asked to clean 
+'''
+worker_text_cleaner = None 
+
+def install_worker_text_cleaner(cleaner) : 
+  global worker_text_cleaner
+  worker_text_cleaner = cleaner
+
+def clean_input_batch_to_output_lines_in_worker(input_batch) : 
+  return worker_text_cleaner.clean_input_batch_to_output_lines(input_batch)
+
+'''
+  As above, sending back with the lines what the parent merges into its reports : the batch's stage metrics and input 
+  profile (each started afresh) and the field memo hits and misses it added 
+'''
+def clean_input_batch_with_reports_in_worker(input_batch) : 
+  if worker_text_cleaner.stage_metrics is not None : 
+    worker_text_cleaner.stage_metrics = cleaning_stage_metrics()
+  worker_text_cleaner.reset_input_profile()
+  memo_hits_before, memo_misses_before = worker_text_cleaner.count_field_memo_hits_and_misses()
+  output_lines = worker_text_cleaner.clean_input_batch_to_output_lines(input_batch)
+  memo_hits_after, memo_misses_after = worker_text_cleaner.count_field_memo_hits_and_misses()
+  return output_lines, {'stage_metrics' : worker_text_cleaner.stage_metrics.portable_state() if worker_text_cleaner.stage_metrics is not None else None, 
+                        'field_memo_hits' : memo_hits_after - memo_hits_before, 'field_memo_misses' : memo_misses_after - memo_misses_before, 
+                        'input_profile' : worker_text_cleaner.input_profile.portable_state() if worker_text_cleaner.input_profile is not None else None}
+
+def clean_file_in_worker(input_output_pair) : 
+  return worker_text_cleaner.clean_file_with_same_settings(*input_output_pair)
 
 # DEMO TIME! 
 if __name__ == "__main__" : 
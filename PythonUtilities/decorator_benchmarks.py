@@ -0,0 +1,94 @@
+'''
+  Benchmarks for decorator_designs
+  Compares the documented connect per call database pattern against sqlite_connection_pool in queries per second,
+  run against a temporary WAL mode database from one and several threads
+  Measures the per call overhead of profile_hot_path_decorator_function, which should stay below a microsecond
+'''
+import os
+import time
+import timeit
+import sqlite3
+import tempfile
+import concurrent.futures
+import decorator_designs as dd
+
+'''
+  Creates a small users table to query
+'''
+def create_benchmark_database(database_path, number_of_users=1000) :
+  connection = sqlite3.connect(database_path)
+  connection.execute("pragma journal_mode=WAL")
+  connection.execute("create table if not exists users (user_id integer primary key, name text)")
+  connection.executemany("insert into users (name) values (?)", [(f"user {user_number}",) for user_number in range(number_of_users)])
+  connection.commit()
+  connection.close()
+  return database_path
+
+'''
+  The original example, opening and closing a connection for every query
+'''
+def query_with_new_connection(database_path, sql_to_execute, parameters=()) :
+  connection = sqlite3.connect(database_path)
+  db_cursor = connection.cursor()
+  db_cursor.execute(sql_to_execute, parameters)
+  query_result = db_cursor.fetchall()
+  db_cursor.close()
+  connection.close()
+  return query_result
+
+'''
+  Runs number_of_queries point lookups through query_function over number_of_threads threads, returning queries per second
+'''
+def measure_queries_per_second(query_function, number_of_queries=20000, number_of_threads=1) :
+  def run_queries(thread_number) :
+    for query_number in range(thread_number, number_of_queries, number_of_threads) :
+      query_function("select name from users where user_id = ?", (query_number % 1000 + 1,))
+  start_timestamp = time.perf_counter()
+  with concurrent.futures.ThreadPoolExecutor(max_workers=number_of_threads) as executor :
+    list(executor.map(run_queries, range(number_of_threads)))
+  return number_of_queries / (time.perf_counter() - start_timestamp)
+
+'''
+  Queries per second connecting per query versus through a pool, at each thread count
+'''
+def benchmark_sqlite_connection_pool(number_of_queries=20000, thread_counts=(1, 4), max_connections=4) :
+  results = []
+  with tempfile.TemporaryDirectory() as database_directory :
+    database_path = create_benchmark_database(os.path.join(database_directory, 'benchmark.db'))
+    @dd.pooled_sqlite_connection_decorator(database_path, max_connections=max_connections)
+    def query_with_pooled_connection(connection, sql_to_execute, parameters=()) :
+      return connection.execute(sql_to_execute, parameters).fetchall()
+    for number_of_threads in thread_counts :
+      new_connection_rate = measure_queries_per_second(lambda sql_to_execute, parameters : query_with_new_connection(database_path, sql_to_execute, parameters),
+                                                       number_of_queries, number_of_threads)
+      pooled_rate = measure_queries_per_second(query_with_pooled_connection, number_of_queries, number_of_threads)
+      results.append({'threads' : number_of_threads, 'new_connection_queries_per_second' : new_connection_rate,
+                      'pooled_queries_per_second' : pooled_rate, 'speedup' : pooled_rate / new_connection_rate})
+    query_with_pooled_connection.connection_pool.close()
+  return results
+
+'''
+  Nanoseconds added to each call by the profiling decorator, fully sampled and sampling one call in sample_every_n_calls
+'''
+def benchmark_profiling_overhead(number_of_calls=1000000, sample_every_n_calls=10, repeats=5) :
+  def add_numbers(x, y) :
+    return x + y
+  registry = dd.profiling_registry()
+  profiled_add_numbers = dd.profile_hot_path_decorator_function(add_numbers, registry=registry)
+  sampled_add_numbers = dd.profile_hot_path_decorator_function(add_numbers, registry=registry, name='sampled', sample_every_n_calls=sample_every_n_calls)
+  def seconds_for(function_to_time) :
+    return min(timeit.repeat(lambda : function_to_time(1, 2), number=number_of_calls, repeat=repeats))
+  undecorated_seconds = seconds_for(add_numbers)
+  return {'undecorated_ns_per_call' : undecorated_seconds / number_of_calls * 1e9,
+          'profiled_overhead_ns_per_call' : (seconds_for(profiled_add_numbers) - undecorated_seconds) / number_of_calls * 1e9,
+          'sampled_overhead_ns_per_call' : (seconds_for(sampled_add_numbers) - undecorated_seconds) / number_of_calls * 1e9,
+          'sample_every_n_calls' : sample_every_n_calls}
+
+if __name__ == "__main__" :
+  profiling_overhead = benchmark_profiling_overhead()
+  print(f"profiling overhead : {profiling_overhead['profiled_overhead_ns_per_call']:.0f} ns per call, "
+        f"{profiling_overhead['sampled_overhead_ns_per_call']:.0f} ns sampling 1 in {profiling_overhead['sample_every_n_calls']} "
+        f"(undecorated call {profiling_overhead['undecorated_ns_per_call']:.0f} ns)")
+  for result in benchmark_sqlite_connection_pool() :
+    print(f"threads {result['threads']:>2} : new connection {result['new_connection_queries_per_second']:>9.0f} queries/s, "
+          f"pooled {result['pooled_queries_per_second']:>9.0f} queries/s, speedup {result['speedup']:.2f}x")
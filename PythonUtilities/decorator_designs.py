@@ -2,12 +2,56 @@
   By Brian Laich, Data Engineer and AI/ML Engineer
   Showcases basic decorators in python for use in other functions
   These can then be utilized in other areas via recoding to your purposes
+  Every decorator works on both regular and coroutine (async def) functions. Coroutine functions get an async wrapper 
+  that awaits them and sleeps with asyncio.sleep, so the event loop is never blocked. Shared state (caches, call counts) 
+  is guarded by locks, so decorated functions can be called from many threads at once 
 '''
 import builtins
 import time 
+import sys
+import os
+import json
+import zlib
+import pickle
+import random
+import hashlib
+import queue
+import reprlib
+import logging
+import logging.handlers
 import sqlite3
+import asyncio
+import inspect
+import threading
+import functools
+import contextlib
+import collections
 default_print_line = builtins.print
 
+'''
+  Bounded repr of call arguments for log and error messages. Long strings, big containers and large objects such as 
+  dataframes are cut down to about max_argument_length characters each, so describing a call costs about the same 
+  whatever it was passed 
+'''
+def summarize_call_arguments(args, kwargs, max_argument_length=200) : 
+  argument_repr = reprlib.Repr()
+  argument_repr.maxstring = argument_repr.maxother = max_argument_length
+  argument_repr.maxlist = argument_repr.maxtuple = argument_repr.maxdict = argument_repr.maxset = argument_repr.maxfrozenset = 10 
+  return ', '.join([*(argument_repr.repr(argument) for argument in args), 
+                    *(f"{keyword}={argument_repr.repr(argument)}" for keyword, argument in kwargs.items())])
+
+'''
+  Call arguments summarized only when turned into a string, i.e. only when a log record is actually emitted 
+'''
+class lazy_call_summary : 
+  __slots__ = ('args', 'kwargs', 'max_argument_length')
+
+  def __init__(self, args, kwargs, max_argument_length=200) : 
+    self.args, self.kwargs, self.max_argument_length = args, kwargs, max_argument_length
+
+  def __str__(self) : 
+    return summarize_call_arguments(self.args, self.kwargs, self.max_argument_length)
+
 '''
   Allows set up of logging via passed function 
   Utilizes function to decorate as the function to decorate on 
@@ -15,14 +59,26 @@ default_print_line = builtins.print
   Aliases default_print_line from builtins print if not assigned 
 '''
 def log_decorator_function(function_to_decorate, function_to_log_with=default_print_line) : 
-  def wrapper(*args, **kwargs): 
-    arugment_string_form = f' function to decorate with arguments : {args}'
-    keyword_arguments_string_form = f' and keyword arguments : {kwargs} \n'
+  def build_combined_string(args, kwargs) : 
+    argument_string_form = f' function to decorate with arguments : {reprlib.repr(args)}'
+    keyword_arguments_string_form = f' and keyword arguments : {reprlib.repr(kwargs)} \n'
     start_string = f' the function {function_to_decorate.__name__}'
-    combined_string = start_string + argument_string_form + keyword_arguments_string_form
-    function_to_log_with.print(f"Before {combined_string}")
+    return start_string + argument_string_form + keyword_arguments_string_form
+  if inspect.iscoroutinefunction(function_to_decorate) : 
+    @functools.wraps(function_to_decorate)
+    async def async_wrapper(*args, **kwargs) : 
+      combined_string = build_combined_string(args, kwargs)
+      function_to_log_with(f"Before {combined_string}")
+      result = await function_to_decorate(*args, **kwargs)
+      function_to_log_with(f"Result of {combined_string} returned {result}")
+      return result 
+    return async_wrapper
+  @functools.wraps(function_to_decorate)
+  def wrapper(*args, **kwargs): 
+    combined_string = build_combined_string(args, kwargs)
+    function_to_log_with(f"Before {combined_string}")
     result = function_to_decorate(*args, **kwargs)
-    function_to_log_with.print(f"Result of {combined_string} returned {result}")
+    function_to_log_with(f"Result of {combined_string} returned {result}")
     return result 
   return wrapper 
 
@@ -36,20 +92,154 @@ result = calculate_product(10, 20)
 print(f"Resulting value is {result}")
 '''
 
+'''
+  Moves a logger's handlers (or the handlers given) behind a QueueHandler, so records are only put on a queue by the 
+  logging call and a QueueListener thread does the slow writing. Returns the started listener; stop it at shutdown with 
+  stop_queue_logging to flush the queue. Calling it again for the same logger returns the listener already running 
+  Without handlers given, the listener gets every handler a record of the logger would reach : its own and, while it 
+  propagates, those of its ancestors (a stderr StreamHandler if there are none). The logger then stops propagating, 
+  so no ancestor handler runs on the logging thread 
+'''
+queue_logging_listeners = {} 
+queue_logging_saved_states = {} 
+queue_logging_lock = threading.Lock()
+def start_queue_logging(logger, handlers=None, queue_size=-1) : 
+  with queue_logging_lock : 
+    if logger.name in queue_logging_listeners : 
+      return queue_logging_listeners[logger.name]
+    queue_logging_saved_states[logger.name] = (list(logger.handlers), logger.propagate)
+    if handlers is not None : 
+      handlers = list(handlers)
+    else : 
+      handlers = [] 
+      reached_logger = logger
+      while reached_logger is not None : 
+        handlers.extend(reached_logger.handlers)
+        if not reached_logger.propagate : 
+          break 
+        reached_logger = reached_logger.parent
+      if len(handlers) == 0 : 
+        handlers = [logging.StreamHandler()]
+      logger.propagate = False 
+    for handler in list(logger.handlers) : 
+      logger.removeHandler(handler)
+    record_queue = queue.Queue(queue_size)
+    logger.addHandler(logging.handlers.QueueHandler(record_queue))
+    queue_logging_listeners[logger.name] = logging.handlers.QueueListener(record_queue, *handlers, respect_handler_level=True)
+    queue_logging_listeners[logger.name].start()
+    return queue_logging_listeners[logger.name]
+
+'''
+  Stops the listener start_queue_logging started for logger, once it has handled every queued record, and gives the 
+  logger back its handlers and propagate setting 
+'''
+def stop_queue_logging(logger) : 
+  with queue_logging_lock : 
+    if logger.name not in queue_logging_listeners : 
+      return 
+    queue_logging_listeners.pop(logger.name).stop()
+    saved_handlers, saved_propagate = queue_logging_saved_states.pop(logger.name)
+    for handler in list(logger.handlers) : 
+      logger.removeHandler(handler)
+    for handler in saved_handlers : 
+      logger.addHandler(handler)
+    logger.propagate = saved_propagate
+
+'''
+  Structured logging decorator built on the logging module 
+  Each call logs one record at level (errors at error_level, with the traceback) carrying function_name, outcome 
+  (returned or raised), duration_seconds and call_arguments as record attributes for structured formatters and handlers 
+  Nothing is formatted unless the logger is enabled for the level: the check comes first, the message uses lazy % 
+  arguments and call_arguments is a lazy_call_summary, cut down to max_argument_length characters per argument 
+    logger -> defaults to the logger named after the function's module 
+    log_arguments -> set False to leave arguments out of records entirely 
+    use_queue_handler -> hand records to a QueueHandler (see start_queue_logging) so slow sinks never block the call 
+'''
+def structured_log_decorator_function(function_to_decorate=None, logger=None, level=logging.INFO, error_level=logging.ERROR, 
+                                      max_argument_length=200, log_arguments=True, use_queue_handler=False) : 
+  def decorate_logged_function(function_to_decorate) : 
+    function_logger = logger if logger is not None else logging.getLogger(function_to_decorate.__module__)
+    if use_queue_handler : 
+      start_queue_logging(function_logger)
+    function_name = function_to_decorate.__qualname__
+    def log_call(log_level, outcome, start_timestamp, args, kwargs, exc_info=None) : 
+      duration_seconds = time.perf_counter() - start_timestamp
+      call_arguments = lazy_call_summary(args, kwargs, max_argument_length) if log_arguments else ''
+      function_logger.log(log_level, "%s(%s) %s in %.6f seconds", function_name, call_arguments, outcome, duration_seconds, 
+                          exc_info=exc_info, extra={'function_name' : function_name, 'outcome' : outcome, 
+                                                    'duration_seconds' : duration_seconds, 'call_arguments' : call_arguments})
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_logged_wrapper(*args, **kwargs) : 
+        if not function_logger.isEnabledFor(max(level, error_level)) : 
+          return await function_to_decorate(*args, **kwargs)
+        start_timestamp = time.perf_counter()
+        try : 
+          result = await function_to_decorate(*args, **kwargs)
+        except Exception as error : 
+          if function_logger.isEnabledFor(error_level) : 
+            log_call(error_level, 'raised', start_timestamp, args, kwargs, exc_info=error)
+          raise 
+        if function_logger.isEnabledFor(level) : 
+          log_call(level, 'returned', start_timestamp, args, kwargs)
+        return result 
+      return async_logged_wrapper
+    @functools.wraps(function_to_decorate)
+    def logged_wrapper(*args, **kwargs) : 
+      if not function_logger.isEnabledFor(max(level, error_level)) : 
+        return function_to_decorate(*args, **kwargs)
+      start_timestamp = time.perf_counter()
+      try : 
+        result = function_to_decorate(*args, **kwargs)
+      except Exception as error : 
+        if function_logger.isEnabledFor(error_level) : 
+          log_call(error_level, 'raised', start_timestamp, args, kwargs, exc_info=error)
+        raise 
+      if function_logger.isEnabledFor(level) : 
+        log_call(level, 'returned', start_timestamp, args, kwargs)
+      return result 
+    return logged_wrapper
+  if function_to_decorate is None : 
+    return decorate_logged_function
+  return decorate_logged_function(function_to_decorate)
+
+# Example setup below 
+'''
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(function_name)s %(outcome)s %(duration_seconds).6f %(message)s")
+
+@structured_log_decorator_function(use_queue_handler=True)
+def sum_numbers(numbers) : 
+  return sum(numbers)
+
+sum_numbers(list(range(1000000)))
+logging.getLogger(__name__).setLevel(logging.WARNING)
+sum_numbers(list(range(1000000)))
+stop_queue_logging(logging.getLogger(__name__))
+'''
+
 '''
   Measures execution time of the function to decorate using the function to log with 
 '''
 def measure_execution_time_decorator_function(function_to_decorate, function_to_log_with=default_print_line) : 
-  def time_of_execution(*args, **kwargs) : 
-    start_timestamp = time.time()
-    result = function_to_decorate(*args, **kwargs)
-    end_timestamp = time.time()
-    execution_duration = end_timestamp - start_timestamp 
-    arugment_string_form = f' function to decorate with arguments : {args}'
-    keyword_arguments_string_form = f' and keyword arguments : {kwargs} \n'
+  def log_execution_duration(execution_duration, args, kwargs) : 
+    argument_string_form = f' function to decorate with arguments : {reprlib.repr(args)}'
+    keyword_arguments_string_form = f' and keyword arguments : {reprlib.repr(kwargs)} \n'
     start_string = f' the function {function_to_decorate.__name__}'
     combined_string = start_string + argument_string_form + keyword_arguments_string_form
-    function_to_log_with.print(f"Run time of {combined_string} is {execution_duration:.2f} seconds.")
+    function_to_log_with(f"Run time of {combined_string} is {execution_duration:.2f} seconds.")
+  if inspect.iscoroutinefunction(function_to_decorate) : 
+    @functools.wraps(function_to_decorate)
+    async def async_time_of_execution(*args, **kwargs) : 
+      start_timestamp = time.perf_counter()
+      result = await function_to_decorate(*args, **kwargs)
+      log_execution_duration(time.perf_counter() - start_timestamp, args, kwargs)
+      return result
+    return async_time_of_execution
+  @functools.wraps(function_to_decorate)
+  def time_of_execution(*args, **kwargs) : 
+    start_timestamp = time.perf_counter()
+    result = function_to_decorate(*args, **kwargs)
+    log_execution_duration(time.perf_counter() - start_timestamp, args, kwargs)
     return result
   return time_of_execution
 
@@ -66,16 +256,225 @@ result = multiply_numbers([i for i in range(1, 10)])
 print(f"Result is {result}")
 '''
 
+'''
+  Latency histogram for the profiling decorator. Durations in nanoseconds go into 256 preallocated log linear buckets 
+  (four per power of two, so each bucket spans at most a quarter of its lower bound) along with count, total, min 
+  and max. Recording is a few integer operations with nothing allocated or formatted; the count and percentiles are 
+  worked out from the buckets only when statistics() is asked for. Recording takes no lock, so under heavy thread 
+  contention a rare sample can be lost, which keeps the hot path cheap. The profiling decorator inlines record() 
+  against bucket_counts and running_totals ([total, min, max] in nanoseconds), so reset() clears both in place 
+'''
+class latency_histogram : 
+  bucket_count = 256 
+
+  def __init__(self, name, sample_every_n_calls=1) : 
+    self.name = name 
+    self.sample_every_n_calls = sample_every_n_calls
+    self.reset()
+
+  def reset(self) : 
+    if not hasattr(self, 'bucket_counts') : 
+      self.bucket_counts = [0] * self.bucket_count
+      self.running_totals = [0, sys.maxsize, 0]
+    self.bucket_counts[:] = [0] * self.bucket_count
+    self.running_totals[:] = [0, sys.maxsize, 0]
+
+  def record(self, duration_ns) : 
+    duration_bits = duration_ns.bit_length()
+    self.bucket_counts[(duration_bits - 2) * 4 + ((duration_ns >> (duration_bits - 3)) & 3) if duration_bits > 2 else duration_ns] += 1 
+    running_totals = self.running_totals
+    running_totals[0] += duration_ns
+    if duration_ns < running_totals[1] : 
+      running_totals[1] = duration_ns
+    if duration_ns > running_totals[2] : 
+      running_totals[2] = duration_ns
+
+  '''
+    Lowest and one past the highest duration in nanoseconds that land in a bucket 
+  '''
+  @staticmethod
+  def bucket_bounds(bucket_index) : 
+    if bucket_index < 4 : 
+      return bucket_index, bucket_index + 1 
+    bucket_shift = bucket_index // 4 - 1 
+    lower_bound = (4 + bucket_index % 4) << bucket_shift
+    return lower_bound, lower_bound + (1 << bucket_shift)
+
+  '''
+    Estimated duration at a fraction of the recorded calls (0.5 for the median), the middle of its bucket kept within min and max 
+  '''
+  def percentile_ns(self, fraction, bucket_counts=None, running_totals=None) : 
+    bucket_counts = self.bucket_counts if bucket_counts is None else bucket_counts
+    _total_ns, min_ns, max_ns = self.running_totals if running_totals is None else running_totals
+    count = sum(bucket_counts)
+    if count == 0 : 
+      return None 
+    target_rank = max(1, int(fraction * count + 0.5))
+    running_count = 0 
+    for bucket_index, bucket_count in enumerate(bucket_counts) : 
+      running_count += bucket_count
+      if running_count >= target_rank : 
+        lower_bound, upper_bound = self.bucket_bounds(bucket_index)
+        return min(max((lower_bound + upper_bound - 1) / 2, min_ns), max_ns)
+    return max_ns
+
+  def statistics(self) : 
+    bucket_counts, running_totals = list(self.bucket_counts), list(self.running_totals)
+    count, (total_ns, min_ns, max_ns) = sum(bucket_counts), running_totals
+    return {'name' : self.name, 'count' : count, 'estimated_calls' : count * self.sample_every_n_calls, 
+            'sample_every_n_calls' : self.sample_every_n_calls, 'total_ns' : total_ns, 
+            'mean_ns' : total_ns / count if count else None, 'min_ns' : min_ns if count else None, 
+            'max_ns' : max_ns if count else None, 'p50_ns' : self.percentile_ns(0.50, bucket_counts, running_totals), 
+            'p95_ns' : self.percentile_ns(0.95, bucket_counts, running_totals), 
+            'p99_ns' : self.percentile_ns(0.99, bucket_counts, running_totals)}
+
+'''
+  Registry of latency histograms by name, to dump or export every profiled function's statistics at once 
+'''
+class profiling_registry : 
+  def __init__(self) : 
+    self.registry_lock = threading.Lock()
+    self.histograms = {} 
+
+  '''
+    The histogram registered under name, created on first use 
+  '''
+  def histogram(self, name, sample_every_n_calls=1) : 
+    with self.registry_lock : 
+      if name not in self.histograms : 
+        self.histograms[name] = latency_histogram(name, sample_every_n_calls)
+      return self.histograms[name]
+
+  def snapshot(self) : 
+    with self.registry_lock : 
+      histograms = list(self.histograms.values())
+    return [histogram.statistics() for histogram in histograms]
+
+  def reset(self) : 
+    with self.registry_lock : 
+      for histogram in self.histograms.values() : 
+        histogram.reset()
+
+  '''
+    Logs one line per profiled function, slowest total time first 
+  '''
+  def dump(self, function_to_log_with=default_print_line) : 
+    for statistics in sorted(self.snapshot(), key=lambda statistics : statistics['total_ns'], reverse=True) : 
+      if statistics['count'] == 0 : 
+        continue 
+      function_to_log_with(f"{statistics['name']} : {statistics['estimated_calls']} calls, total {statistics['total_ns'] / 1e6:.3f} ms, " 
+                           f"mean {statistics['mean_ns'] / 1e3:.2f} us, min {statistics['min_ns'] / 1e3:.2f} us, " 
+                           f"p50 {statistics['p50_ns'] / 1e3:.2f} us, p95 {statistics['p95_ns'] / 1e3:.2f} us, " 
+                           f"p99 {statistics['p99_ns'] / 1e3:.2f} us, max {statistics['max_ns'] / 1e3:.2f} us")
+
+  '''
+    Writes every histogram's statistics to a JSON file 
+  '''
+  def export_json(self, full_output_path) : 
+    with open(full_output_path, 'w', encoding='utf-8') as output_file : 
+      json.dump(self.snapshot(), output_file, indent=2)
+
+default_profiling_registry = profiling_registry()
+
+'''
+  Profiles the function to decorate on its hot path. Each call is timed with perf_counter_ns into a latency_histogram 
+  in the registry (default_profiling_registry unless given), named after the function's module and qualified name 
+  unless named. Nothing is formatted per call, the registry dumps or exports it all when wanted 
+  sample_every_n_calls times only one call in every n to cut the overhead further; statistics scale calls back up 
+  Usable bare (@profile_hot_path_decorator_function) or with options (@profile_hot_path_decorator_function(sample_every_n_calls=10)) 
+'''
+def profile_hot_path_decorator_function(function_to_decorate=None, registry=None, name=None, sample_every_n_calls=1) : 
+  def decorate_profiled_function(function_to_decorate) : 
+    histogram = (registry or default_profiling_registry).histogram(
+      name or f"{function_to_decorate.__module__}.{function_to_decorate.__qualname__}", sample_every_n_calls)
+    '''The recording below is latency_histogram.record inlined, saving a method call per profiled call'''
+    bucket_counts, running_totals = histogram.bucket_counts, histogram.running_totals
+    perf_counter_ns = time.perf_counter_ns
+    calls_until_sample = 1 
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_profiled_wrapper(*args, **kwargs) : 
+        nonlocal calls_until_sample
+        calls_until_sample -= 1 
+        if calls_until_sample : 
+          return await function_to_decorate(*args, **kwargs)
+        calls_until_sample = sample_every_n_calls
+        start_ns = perf_counter_ns()
+        try : 
+          return await function_to_decorate(*args, **kwargs)
+        finally : 
+          duration_ns = perf_counter_ns() - start_ns
+          duration_bits = duration_ns.bit_length()
+          bucket_counts[(duration_bits - 2) * 4 + ((duration_ns >> (duration_bits - 3)) & 3) if duration_bits > 2 else duration_ns] += 1 
+          running_totals[0] += duration_ns
+          if duration_ns < running_totals[1] : 
+            running_totals[1] = duration_ns
+          if duration_ns > running_totals[2] : 
+            running_totals[2] = duration_ns
+      async_profiled_wrapper.latency_histogram = histogram
+      return async_profiled_wrapper
+    @functools.wraps(function_to_decorate)
+    def profiled_wrapper(*args, **kwargs) : 
+      nonlocal calls_until_sample
+      calls_until_sample -= 1 
+      if calls_until_sample : 
+        return function_to_decorate(*args, **kwargs)
+      calls_until_sample = sample_every_n_calls
+      start_ns = perf_counter_ns()
+      try : 
+        return function_to_decorate(*args, **kwargs)
+      finally : 
+        duration_ns = perf_counter_ns() - start_ns
+        duration_bits = duration_ns.bit_length()
+        bucket_counts[(duration_bits - 2) * 4 + ((duration_ns >> (duration_bits - 3)) & 3) if duration_bits > 2 else duration_ns] += 1 
+        running_totals[0] += duration_ns
+        if duration_ns < running_totals[1] : 
+          running_totals[1] = duration_ns
+        if duration_ns > running_totals[2] : 
+          running_totals[2] = duration_ns
+    profiled_wrapper.latency_histogram = histogram
+    return profiled_wrapper
+  if function_to_decorate is None : 
+    return decorate_profiled_function
+  return decorate_profiled_function(function_to_decorate)
+
+# Example below 
+'''
+@profile_hot_path_decorator_function
+def multiply_numbers(numbers) : 
+  product = 1
+  for num in numbers : 
+    product *= num 
+  return product 
+
+@profile_hot_path_decorator_function(sample_every_n_calls=100)
+def add_numbers(x, y) : 
+  return x + y 
+
+for i in range(100000) : 
+  multiply_numbers([i, 2, 3])
+  add_numbers(i, i)
+default_profiling_registry.dump()
+default_profiling_registry.export_json("profile.json")
+'''
+
 '''
   Converts data type to required component parts 
 '''
 def convert_to_data_type_decorator_function(target_type) : 
   def type_conversion_decorator(function_to_decorate) : 
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_wrapper(*args, **kwargs) : 
+        result = await function_to_decorate(*args, **kwargs)
+        return target_type(result)
+      return async_wrapper
+    @functools.wraps(function_to_decorate)
     def wrapper(*args, **kwargs) : 
       result = function_to_decorate(*args, **kwargs)
       return target_type(result)
     return wrapper 
-  return convert_to_data_type_decorator_function
+  return type_conversion_decorator
 
 # Example setup below
 '''
@@ -95,23 +494,550 @@ print(f"Result is {string_result} with typing of {type(string_result)}")
 '''
 
 '''
-  Cached results decorator function caches results for later usage 
+  Hit, miss and eviction counts plus current and maximum sizes, as returned by bounded_results_cache.cache_info() 
+'''
+cache_statistics = collections.namedtuple('cache_statistics', ['hits', 'misses', 'evictions', 'expirations', 'current_entries', 
+                                                                'max_entries', 'current_size', 'max_total_size', 'time_to_live_seconds', 
+                                                                'stale_hits'])
+
+'''
+  Bounded results cache backing the cached results decorators 
+    max_entries -> least recently used entries are evicted past this many (None for no entry limit) 
+    max_total_size -> least recently used entries are evicted past this total size, as measured by size_of_value 
+      (sys.getsizeof by default, None for no size limit). A value bigger than the whole limit is not cached 
+    time_to_live_seconds -> entries expire this long after being stored (None to never expire). Expired entries are 
+      dropped when looked up, and every sweep_interval_seconds (defaults to time_to_live_seconds) a sweep drops the rest 
+    stale_grace_seconds -> how long past its time to live an entry is kept as stale. lookup_entry still returns it 
+      (flagged stale, counted as a stale hit) so it can be served while a fresh value is computed, lookup treats it as a miss 
+  Entries are kept in an OrderedDict in least to most recently used order, and their expiry times in a second 
+  OrderedDict in storing order, so lookups, stores, evictions and each expired entry swept are all O(1) 
+  Every public method holds cache_lock, so one cache can be shared by many threads (and by coroutines, which never 
+  await while holding it) 
+'''
+class bounded_results_cache : 
+  def __init__(self, max_entries=1024, max_total_size=None, time_to_live_seconds=None, sweep_interval_seconds=None, 
+               size_of_value=sys.getsizeof, clock=time.monotonic, stale_grace_seconds=0) : 
+    if max_entries is not None and max_entries < 1 : 
+      raise ValueError(f"max_entries must be at least 1 or None, got {max_entries}")
+    if time_to_live_seconds is not None and time_to_live_seconds <= 0 : 
+      raise ValueError(f"time_to_live_seconds must be positive or None, got {time_to_live_seconds}")
+    self.max_entries = max_entries
+    self.max_total_size = max_total_size
+    self.time_to_live_seconds = time_to_live_seconds
+    self.stale_grace_seconds = stale_grace_seconds if time_to_live_seconds is not None else 0 
+    self.sweep_interval_seconds = sweep_interval_seconds if sweep_interval_seconds is not None else time_to_live_seconds
+    self.size_of_value = size_of_value
+    self.clock = clock
+    self.cache_lock = threading.RLock()
+    self.cache_clear()
+
+  '''
+    Drops every entry and resets the statistics 
+  '''
+  def cache_clear(self) : 
+    with self.cache_lock : 
+      self.reset_entries()
+
+  def reset_entries(self) : 
+    self.entries = collections.OrderedDict()
+    self.expiry_times = collections.OrderedDict()
+    self.current_size = 0 
+    self.hits = self.misses = self.evictions = self.expirations = self.stale_hits = 0 
+    self.next_sweep_time = self.clock() + self.sweep_interval_seconds if self.sweep_interval_seconds is not None else None 
+
+  '''
+    Current statistics of the cache 
+  '''
+  def cache_info(self) : 
+    with self.cache_lock : 
+      return cache_statistics(self.hits, self.misses, self.evictions, self.expirations, len(self.entries), 
+                              self.max_entries, self.current_size, self.max_total_size, self.time_to_live_seconds, 
+                              self.stale_hits)
+
+  def __len__(self) : 
+    return len(self.entries)
+
+  '''
+    Removes one entry, returning its value 
+  '''
+  def remove_entry(self, cache_key) : 
+    cached_value, cached_size, _stale_time = self.entries.pop(cache_key)
+    self.expiry_times.pop(cache_key, None)
+    self.current_size -= cached_size
+    return cached_value
+
+  '''
+    Drops entries whose time to live has passed. Expiry times are in storing order, so the sweep stops at the first live one 
+  '''
+  def sweep_expired_entries(self, current_time=None) : 
+    with self.cache_lock : 
+      current_time = self.clock() if current_time is None else current_time
+      while len(self.expiry_times) and next(iter(self.expiry_times.values())) <= current_time : 
+        self.remove_entry(next(iter(self.expiry_times)))
+        self.expirations += 1 
+      if self.sweep_interval_seconds is not None : 
+        self.next_sweep_time = current_time + self.sweep_interval_seconds
+
+  '''
+    Runs the periodic sweep when it is due 
+  '''
+  def sweep_if_due(self, current_time) : 
+    if self.next_sweep_time is not None and current_time >= self.next_sweep_time : 
+      self.sweep_expired_entries(current_time)
+
+  '''
+    The key an entry for cache_key is kept under : cache_key itself 
+  '''
+  def build_stored_key(self, cache_key) : 
+    return cache_key
+
+  '''
+    Returns (True, value, is_stale) for a kept entry, marking it most recently used, or (False, None, False) on a miss. 
+    count_statistics=False looks without counting, for callers checking again what they just missed 
+  '''
+  def lookup_entry(self, cache_key, count_statistics=True) : 
+    with self.cache_lock : 
+      current_time = self.clock()
+      self.sweep_if_due(current_time)
+      if cache_key in self.entries : 
+        if cache_key in self.expiry_times and self.expiry_times[cache_key] <= current_time : 
+          self.remove_entry(cache_key)
+          self.expirations += 1 
+        else : 
+          self.entries.move_to_end(cache_key)
+          cached_value, _cached_size, stale_time = self.entries[cache_key]
+          is_stale = stale_time is not None and stale_time <= current_time
+          if count_statistics : 
+            if is_stale : 
+              self.stale_hits += 1 
+            else : 
+              self.hits += 1 
+          return True, cached_value, is_stale
+      if count_statistics : 
+        self.misses += 1 
+      return False, None, False 
+
+  '''
+    Returns (True, value) for a live entry, marking it most recently used, or (False, None) on a miss 
+  '''
+  def lookup(self, cache_key) : 
+    found_in_cache, cached_value, is_stale = self.lookup_entry(cache_key)
+    if not found_in_cache or is_stale : 
+      return False, None 
+    return True, cached_value
+
+  '''
+    Stores a value as the most recently used entry, then evicts least recently used entries until within limits 
+  '''
+  def store(self, cache_key, cached_value) : 
+    cached_size = self.size_of_value(cached_value) if self.max_total_size is not None else 0 
+    with self.cache_lock : 
+      current_time = self.clock()
+      self.sweep_if_due(current_time)
+      if cache_key in self.entries : 
+        self.remove_entry(cache_key)
+      if self.max_total_size is not None and cached_size > self.max_total_size : 
+        return cached_value
+      stale_time = current_time + self.time_to_live_seconds if self.time_to_live_seconds is not None else None 
+      self.entries[cache_key] = (cached_value, cached_size, stale_time)
+      self.current_size += cached_size
+      if stale_time is not None : 
+        self.expiry_times[cache_key] = stale_time + self.stale_grace_seconds
+      while ((self.max_entries is not None and len(self.entries) > self.max_entries) or 
+             (self.max_total_size is not None and self.current_size > self.max_total_size)) : 
+        self.remove_entry(next(iter(self.entries)))
+        self.evictions += 1 
+      return cached_value
+
 '''
-def cached_results_decorator_function(function_to_decorate) : 
-  result_cache = {} 
-  def wrapper(*args, **kwargs) : 
-    if (cache_keys := (*args, *kwargs.items())) in result_cache : 
-      # comment following line to improve performance
-      print("Result was in cache")
-      return result_cache.get(cache_keys)
+  Persistent results cache in a local SQLite table, a drop in for bounded_results_cache that survives restarts and 
+  is shared by every process on the host using the same database file, so a cache warmed by one worker serves the rest 
+    namespace -> keeps the entries of different functions apart in the one table (the decorators use module.qualname) 
+    Keys are hashed to 16 bytes with blake2b over their pickle, which is the same in every process for the usual 
+      arguments (numbers, strings, bytes, tuples, lists, dicts). Sets of strings pickle in hash order and so do not 
+      give stable keys across processes. Calls with arguments that cannot be pickled (locks, lambdas) run uncached 
+    Values are pickled with the highest protocol and zlib compressed when bigger than compress_above_bytes. Values 
+      that cannot be pickled are returned uncached 
+    time_to_live_seconds and stale_grace_seconds work as in bounded_results_cache, with the times stored on each row 
+      against the wall clock, as every process has to agree on them 
+    max_entries -> the oldest stored entries of the namespace past this many are deleted on store (None for no limit) 
+  Connections come from the shared sqlite_connection_pool for the path, in WAL mode so readers never wait on a writer. 
+  A database error on lookup is a miss and on store skips caching, so a busy or broken cache file never fails the call. 
+  Statistics count this process's calls only 
+'''
+class sqlite_results_cache : 
+  value_is_pickled, value_is_compressed = 0, 1 
+
+  def __init__(self, database_path, namespace='', max_entries=None, time_to_live_seconds=None, sweep_interval_seconds=None, 
+               stale_grace_seconds=0, compress_above_bytes=4096, table_name='results_cache', clock=time.time, **pool_arguments) : 
+    if max_entries is not None and max_entries < 1 : 
+      raise ValueError(f"max_entries must be at least 1 or None, got {max_entries}")
+    if time_to_live_seconds is not None and time_to_live_seconds <= 0 : 
+      raise ValueError(f"time_to_live_seconds must be positive or None, got {time_to_live_seconds}")
+    if not table_name.isidentifier() : 
+      raise ValueError(f"table_name must be a plain identifier, got {table_name!r}")
+    self.database_path = os.fspath(database_path)
+    self.namespace = namespace
+    self.max_entries = max_entries
+    self.time_to_live_seconds = time_to_live_seconds
+    self.stale_grace_seconds = stale_grace_seconds if time_to_live_seconds is not None else 0 
+    self.sweep_interval_seconds = sweep_interval_seconds if sweep_interval_seconds is not None else time_to_live_seconds
+    self.compress_above_bytes = compress_above_bytes
+    self.table_name = table_name
+    self.clock = clock
+    self.connection_pool = get_sqlite_connection_pool(self.database_path, **pool_arguments)
+    self.cache_lock = threading.Lock()
+    self.hits = self.misses = self.evictions = self.expirations = self.stale_hits = 0 
+    self.next_sweep_time = self.clock() + self.sweep_interval_seconds if self.sweep_interval_seconds is not None else None 
+    with self.connection_pool.connection() as connection : 
+      connection.execute(f"create table if not exists {table_name} (namespace text not null, key_hash blob not null, "
+                         f"stored_time real not null, stale_time real, expiry_time real, value_encoding integer not null, "
+                         f"cached_value blob not null, primary key (namespace, key_hash)) without rowid")
+      connection.execute(f"create index if not exists {table_name}_stored_time on {table_name} (namespace, stored_time)")
+      connection.execute(f"create index if not exists {table_name}_expiry_time on {table_name} (expiry_time)")
+
+  '''
+    16 byte key hash, the same in every process for the same arguments 
+  '''
+  @staticmethod
+  def hash_cache_key(cache_key) : 
+    return hashlib.blake2b(pickle.dumps(cache_key, protocol=4), digest_size=16).digest()
+
+  '''
+    The key an entry for cache_key is kept under : its hash. Raises pickle.PicklingError, TypeError or AttributeError 
+    for a key that cannot be pickled. lookup_entry, lookup and store take these key hashes 
+  '''
+  def build_stored_key(self, cache_key) : 
+    return self.hash_cache_key(cache_key)
+
+  def encode_value(self, cached_value) : 
+    pickled_value = pickle.dumps(cached_value, protocol=pickle.HIGHEST_PROTOCOL)
+    if self.compress_above_bytes is not None and len(pickled_value) > self.compress_above_bytes : 
+      return self.value_is_compressed, zlib.compress(pickled_value, 1)
+    return self.value_is_pickled, pickled_value
+
+  def decode_value(self, value_encoding, encoded_value) : 
+    if value_encoding == self.value_is_compressed : 
+      encoded_value = zlib.decompress(encoded_value)
+    return pickle.loads(encoded_value)
+
+  '''
+    Drops this namespace's entries and resets the statistics 
+  '''
+  def cache_clear(self) : 
+    with self.connection_pool.connection() as connection : 
+      connection.execute(f"delete from {self.table_name} where namespace = ?", (self.namespace,))
+    with self.cache_lock : 
+      self.hits = self.misses = self.evictions = self.expirations = self.stale_hits = 0 
+
+  '''
+    Current statistics, with the entry count and the stored size in bytes of the namespace 
+  '''
+  def cache_info(self) : 
+    with self.connection_pool.connection() as connection : 
+      current_entries, current_size = connection.execute(f"select count(*), coalesce(sum(length(cached_value)), 0) "
+                                                         f"from {self.table_name} where namespace = ?", (self.namespace,)).fetchone()
+    with self.cache_lock : 
+      return cache_statistics(self.hits, self.misses, self.evictions, self.expirations, current_entries, 
+                              self.max_entries, current_size, None, self.time_to_live_seconds, self.stale_hits)
+
+  def __len__(self) : 
+    return self.cache_info().current_entries
+
+  def count_statistic(self, statistic_name, count=1) : 
+    with self.cache_lock : 
+      setattr(self, statistic_name, getattr(self, statistic_name) + count)
+
+  '''
+    Deletes every expired entry in the table, whichever namespace stored it 
+  '''
+  def sweep_expired_entries(self, current_time=None) : 
+    current_time = self.clock() if current_time is None else current_time
+    with self.connection_pool.connection() as connection : 
+      expired_count = connection.execute(f"delete from {self.table_name} where expiry_time <= ?", (current_time,)).rowcount
+    self.count_statistic('expirations', expired_count)
+    if self.sweep_interval_seconds is not None : 
+      self.next_sweep_time = current_time + self.sweep_interval_seconds
+
+  '''
+    Returns (True, value, is_stale) for a kept entry or (False, None, False) on a miss, as bounded_results_cache does 
+  '''
+  def lookup_entry(self, key_hash, count_statistics=True) : 
+    current_time = self.clock()
+    try : 
+      with self.connection_pool.connection() as connection : 
+        cached_row = connection.execute(f"select stale_time, expiry_time, value_encoding, cached_value from {self.table_name} "
+                                        f"where namespace = ? and key_hash = ?", (self.namespace, key_hash)).fetchone()
+      if cached_row is not None : 
+        stale_time, expiry_time, value_encoding, encoded_value = cached_row
+        if expiry_time is not None and expiry_time <= current_time : 
+          self.count_statistic('expirations')
+        else : 
+          is_stale = stale_time is not None and stale_time <= current_time
+          cached_value = self.decode_value(value_encoding, encoded_value)
+          if count_statistics : 
+            self.count_statistic('stale_hits' if is_stale else 'hits')
+          return True, cached_value, is_stale
+    except (sqlite3.Error, pickle.UnpicklingError, zlib.error) : 
+      pass 
+    if count_statistics : 
+      self.count_statistic('misses')
+    return False, None, False 
+
+  def lookup(self, key_hash) : 
+    found_in_cache, cached_value, is_stale = self.lookup_entry(key_hash)
+    if not found_in_cache or is_stale : 
+      return False, None 
+    return True, cached_value
+
+  '''
+    Stores a value for every process to find, then trims the namespace to max_entries and sweeps when due 
+  '''
+  def store(self, key_hash, cached_value) : 
+    try : 
+      value_encoding, encoded_value = self.encode_value(cached_value)
+    except (pickle.PicklingError, TypeError, AttributeError) : 
+      return cached_value
+    current_time = self.clock()
+    stale_time = current_time + self.time_to_live_seconds if self.time_to_live_seconds is not None else None 
+    expiry_time = stale_time + self.stale_grace_seconds if stale_time is not None else None 
+    try : 
+      with self.connection_pool.connection() as connection : 
+        connection.execute(f"insert or replace into {self.table_name} values (?, ?, ?, ?, ?, ?, ?)", 
+                           (self.namespace, key_hash, current_time, stale_time, expiry_time, 
+                            value_encoding, encoded_value))
+        if self.max_entries is not None : 
+          evicted_count = connection.execute(f"delete from {self.table_name} where namespace = ? and key_hash in "
+                                             f"(select key_hash from {self.table_name} where namespace = ? "
+                                             f"order by stored_time desc limit -1 offset ?)", 
+                                             (self.namespace, self.namespace, self.max_entries)).rowcount
+          self.count_statistic('evictions', evicted_count)
+      if self.next_sweep_time is not None and current_time >= self.next_sweep_time : 
+        self.sweep_expired_entries(current_time)
+    except sqlite3.Error : 
+      pass 
+    return cached_value
+
+'''
+  Results cache for a decorated function. backend picks where results are kept 
+    None -> in process, in a bounded_results_cache 
+    a database path -> persisted in an sqlite_results_cache shared across processes, namespaced by the function 
+    a cache object -> used as is, anything with lookup_entry, store, cache_info and cache_clear (and build_stored_key 
+      to key entries other than by the call's cache key) 
+'''
+def build_results_cache(function_to_decorate, backend=None, max_entries=1024, max_total_size=None, time_to_live_seconds=None, 
+                        sweep_interval_seconds=None, stale_grace_seconds=0) : 
+  if backend is None : 
+    return bounded_results_cache(max_entries, max_total_size, time_to_live_seconds, sweep_interval_seconds, 
+                                 stale_grace_seconds=stale_grace_seconds)
+  if isinstance(backend, (str, os.PathLike)) : 
+    if max_total_size is not None : 
+      raise ValueError("max_total_size is not supported with a database backend, limit it with max_entries")
+    return sqlite_results_cache(backend, f"{function_to_decorate.__module__}.{function_to_decorate.__qualname__}", 
+                                max_entries, time_to_live_seconds, sweep_interval_seconds, stale_grace_seconds)
+  return backend
+
+'''
+  Single flight call coordination. Of all callers running the same key at once, only the first (the leader) computes; 
+  the rest wait for and share its result, or its exception. Threads wait on an Event, coroutines on a Future. 
+  Once the leader is done the key is free again, so the next call computes afresh 
+'''
+class single_flight_group : 
+  def __init__(self) : 
+    self.flight_lock = threading.Lock()
+    self.calls_in_flight = {} 
+    self.async_calls_in_flight = {} 
+    self.background_refreshes = set() 
+
+  '''
+    Registers a call for the key, returning (flight, True) when this caller leads it or (flight, False) when one is running 
+  '''
+  def join_or_lead(self, cache_key) : 
+    with self.flight_lock : 
+      if cache_key in self.calls_in_flight : 
+        return self.calls_in_flight[cache_key], False 
+      flight = self.calls_in_flight[cache_key] = {'done' : threading.Event(), 'result' : None, 'error' : None}
+      return flight, True 
+
+  '''
+    Computes as the leader of a registered flight, publishing the outcome to the waiting callers 
+  '''
+  def lead(self, cache_key, flight, compute_result) : 
+    try : 
+      flight['result'] = compute_result()
+      return flight['result']
+    except BaseException as error : 
+      flight['error'] = error 
+      raise 
+    finally : 
+      with self.flight_lock : 
+        del self.calls_in_flight[cache_key]
+      flight['done'].set()
+
+  '''
+    Runs compute_result once for every concurrent caller of the key 
+  '''
+  def run(self, cache_key, compute_result) : 
+    flight, is_leader = self.join_or_lead(cache_key)
+    if is_leader : 
+      return self.lead(cache_key, flight, compute_result)
+    flight['done'].wait()
+    if flight['error'] is not None : 
+      raise flight['error']
+    return flight['result']
+
+  '''
+    Starts compute_result in a daemon thread unless a call for the key is already running. Errors are dropped, 
+    the stale value simply keeps being served until a refresh succeeds 
+  '''
+  def run_in_background(self, cache_key, compute_result) : 
+    flight, is_leader = self.join_or_lead(cache_key)
+    if not is_leader : 
+      return 
+    def refresh() : 
+      try : 
+        self.lead(cache_key, flight, compute_result)
+      except Exception : 
+        pass 
+    threading.Thread(target=refresh, daemon=True).start()
+
+  '''
+    Async run. compute_result is a coroutine function, awaited by the leader only 
+  '''
+  async def run_async(self, cache_key, compute_result) : 
+    with self.flight_lock : 
+      flight = self.async_calls_in_flight.get(cache_key)
+      is_leader = flight is None 
+      if is_leader : 
+        flight = self.async_calls_in_flight[cache_key] = asyncio.get_running_loop().create_future()
+    if not is_leader : 
+      return await asyncio.shield(flight)
+    try : 
+      result = await compute_result()
+    except asyncio.CancelledError : 
+      flight.cancel()
+      raise 
+    except BaseException as error : 
+      flight.set_exception(error)
+      '''Marks the exception retrieved, so a flight nobody waited on logs no warning'''
+      flight.exception()
+      raise 
     else : 
-      # comment following line to improve performance 
-      print("Result was not in cache")
-      result = function_to_decorate(*args, **kwargs)
-      result_cache[cache_key] = result 
-      return result_cache.get(cache_key) 
+      flight.set_result(result)
+      return result 
+    finally : 
+      with self.flight_lock : 
+        del self.async_calls_in_flight[cache_key]
+
+  '''
+    Async run_in_background, as a task on the running loop 
+  '''
+  def run_async_in_background(self, cache_key, compute_result) : 
+    with self.flight_lock : 
+      if cache_key in self.async_calls_in_flight : 
+        return 
+    refresh_task = asyncio.get_running_loop().create_task(self.run_async(cache_key, compute_result))
+    self.background_refreshes.add(refresh_task)
+    refresh_task.add_done_callback(self.finish_background_refresh)
+
+  def finish_background_refresh(self, refresh_task) : 
+    self.background_refreshes.discard(refresh_task)
+    if not refresh_task.cancelled() : 
+      refresh_task.exception()
+
+'''
+  Cache key for a call, as the cached results decorators have always built it 
+'''
+def build_cache_key(args, kwargs) : 
+  return (*args, *kwargs.items())
+
+'''
+  Wraps function_to_decorate so its results are looked up in and stored to results_cache. 
+    single_flight -> concurrent misses on one key run the function once, through a single_flight_group. The leader checks 
+      the cache again first, so a caller that missed just before a result was stored does not compute it a second time 
+    Stale entries (a cache with stale_grace_seconds) are served as is while one background call refreshes them 
+  The stored key is built once per call. Calls whose arguments the cache cannot key on (an sqlite_results_cache given 
+  a lock or a lambda) run uncached. The wrapper exposes cache_info(), cache_clear() and the results_cache itself 
+'''
+def wrap_with_results_cache(function_to_decorate, results_cache, function_to_log_with=None, single_flight=False) : 
+  call_group = single_flight_group()
+  build_stored_key = getattr(results_cache, 'build_stored_key', None)
+  def build_call_key(args, kwargs) : 
+    cache_key = build_cache_key(args, kwargs)
+    return build_stored_key(cache_key) if build_stored_key is not None else cache_key
+  def lookup_logged(cache_key) : 
+    found_in_cache, cached_result, is_stale = results_cache.lookup_entry(cache_key)
+    if function_to_log_with is not None : 
+      function_to_log_with("Result was stale in cache" if is_stale else "Result was in cache" if found_in_cache else "Result was not in cache")
+    return found_in_cache, cached_result, is_stale
+  def cached_result_if_fresh(cache_key) : 
+    found_in_cache, cached_result, is_stale = results_cache.lookup_entry(cache_key, count_statistics=False)
+    return found_in_cache and not is_stale, cached_result
+  if inspect.iscoroutinefunction(function_to_decorate) : 
+    async def async_compute_and_store(cache_key, args, kwargs) : 
+      return results_cache.store(cache_key, await function_to_decorate(*args, **kwargs))
+    async def async_compute_and_store_once(cache_key, args, kwargs) : 
+      found_in_cache, cached_result = cached_result_if_fresh(cache_key)
+      if found_in_cache : 
+        return cached_result
+      return await async_compute_and_store(cache_key, args, kwargs)
+    @functools.wraps(function_to_decorate)
+    async def async_wrapper(*args, **kwargs) : 
+      try : 
+        cache_key = build_call_key(args, kwargs)
+      except (pickle.PicklingError, TypeError, AttributeError) : 
+        return await function_to_decorate(*args, **kwargs)
+      found_in_cache, cached_result, is_stale = lookup_logged(cache_key)
+      if found_in_cache : 
+        if is_stale : 
+          call_group.run_async_in_background(cache_key, lambda : async_compute_and_store_once(cache_key, args, kwargs))
+        return cached_result
+      if single_flight : 
+        return await call_group.run_async(cache_key, lambda : async_compute_and_store_once(cache_key, args, kwargs))
+      return await async_compute_and_store(cache_key, args, kwargs)
+    wrapper = async_wrapper
+  else : 
+    def compute_and_store_once(cache_key, args, kwargs) : 
+      found_in_cache, cached_result = cached_result_if_fresh(cache_key)
+      if found_in_cache : 
+        return cached_result
+      return results_cache.store(cache_key, function_to_decorate(*args, **kwargs))
+    @functools.wraps(function_to_decorate)
+    def wrapper(*args, **kwargs) : 
+      try : 
+        cache_key = build_call_key(args, kwargs)
+      except (pickle.PicklingError, TypeError, AttributeError) : 
+        return function_to_decorate(*args, **kwargs)
+      found_in_cache, cached_result, is_stale = lookup_logged(cache_key)
+      if found_in_cache : 
+        if is_stale : 
+          call_group.run_in_background(cache_key, lambda : compute_and_store_once(cache_key, args, kwargs))
+        return cached_result
+      if single_flight : 
+        return call_group.run(cache_key, lambda : compute_and_store_once(cache_key, args, kwargs))
+      return results_cache.store(cache_key, function_to_decorate(*args, **kwargs))
+  wrapper.call_group = call_group
+  wrapper.results_cache = results_cache
+  wrapper.cache_info = results_cache.cache_info
+  wrapper.cache_clear = results_cache.cache_clear
   return wrapper 
 
+'''
+  Cached results decorator function caches results for later usage 
+  Usable bare (@cached_results_decorator_function) or with cache limits (@cached_results_decorator_function(max_entries=100)). 
+  Results are kept in a bounded_results_cache holding up to max_entries results and, if set, max_total_size bytes 
+  Pass function_to_log_with (e.g. print) to log hits and misses 
+  Pass backend (a database path, see build_results_cache) to keep results in SQLite across restarts and processes 
+'''
+def cached_results_decorator_function(function_to_decorate=None, max_entries=1024, max_total_size=None, function_to_log_with=None, 
+                                      backend=None) : 
+  def decorator_function(function_to_decorate) : 
+    results_cache = build_results_cache(function_to_decorate, backend, max_entries, max_total_size)
+    return wrap_with_results_cache(function_to_decorate, results_cache, function_to_log_with)
+  if function_to_decorate is None : 
+    return decorator_function
+  return decorator_function(function_to_decorate)
+
 # Example Usage 
 '''
 @cached_results_decorator_function
@@ -123,23 +1049,28 @@ j = 2
 for i in range(1, 5) : 
   for j in range(2, 10) :
     calculate_product(i, j) 
+print(calculate_product.cache_info())
 '''
 
 '''
   Cached results decorator function with expiration time in seconds 
+  Results expire expiry_time_seconds after they were computed. Expired results are dropped when next looked up and by 
+  a sweep every sweep_interval_seconds (defaults to expiry_time_seconds), and at most max_entries results 
+  (and max_total_size bytes, if set) are kept, least recently used evicted first 
+    single_flight -> when a result expires, only one of the concurrent callers recomputes it and the rest wait for its 
+      result, instead of every caller running the expensive function at once 
+    stale_while_revalidate_seconds -> for this long after expiring, the old result is still returned immediately while 
+      a single background call computes the fresh one 
+    backend -> a database path keeps results in SQLite, so they outlive restarts and are shared by every worker 
+      process on the host (see sqlite_results_cache) 
 '''
-def cached_results_decorator_function_with_expiration_time(expiry_time_seconds=60) : 
+def cached_results_decorator_function_with_expiration_time(expiry_time_seconds=60, max_entries=1024, max_total_size=None, 
+                                                           sweep_interval_seconds=None, single_flight=False, 
+                                                           stale_while_revalidate_seconds=0, backend=None) : 
   def decorator_function(function_to_decorate) : 
-    results_cache = {} 
-    def wrapper_for_decoration_function(*args, **kwargs) : 
-      if (result_key := (*args, *kwargs.items())) in results_cache : 
-        cached_result, cached_timestamp = results_cache.get(result_key)
-        if time.time() - cached_timestamp < expiry_time_seconds : 
-          return cached_result 
-      current_result = function_to_decorate(*args, **kwargs)
-      results_cache[result_key] = (current_result, time.time())
-      return current_result
-    return wrapper_for_decoration_function
+    results_cache = build_results_cache(function_to_decorate, backend, max_entries, max_total_size, expiry_time_seconds, 
+                                        sweep_interval_seconds, stale_while_revalidate_seconds)
+    return wrap_with_results_cache(function_to_decorate, results_cache, single_flight=single_flight)
   return decorator_function
 
 # Example below 
@@ -152,17 +1083,17 @@ def cached_results_decorator_function_with_expiration_time(expiry_time_seconds=6
   pop in, query, and return the result. 
   We'll try this 3 times by the other function below to get the result. 
   We'll do this at the specified frequency, defaulted to one day in seconds 
-  We'll start one frequency cycle after the stated start time if any or simply when called. 
+  We'll start after start_delay_seconds, or straight away. 
 """
 
-@cached_results_decorator_function_with_expiration_time(expiry_time_seconds=900) 
+@cached_results_decorator_function_with_expiration_time(expiry_time_seconds=900, single_flight=True, stale_while_revalidate_seconds=60, 
+                                                        backend="query_cache.db") 
 def establish_database_connection(target_database, sql_to_execute) : 
-  connection=sqlite3.connect(target_database)
-  db_cursor = connection.cursor()
-  db_cursor.execute(sql_to_execute)
-  query_result = db_cursor.fetchall()
-  db_cursor.close()
-  connection.close()
+  with get_sqlite_connection_pool(target_database).connection() as connection : 
+    db_cursor = connection.cursor()
+    db_cursor.execute(sql_to_execute)
+    query_result = db_cursor.fetchall()
+    db_cursor.close()
   return query_result
 
 @retry_on_failure_function_decorator(max_attempts=3, retry_delay=10)
@@ -175,28 +1106,17 @@ def generate_query_results(target_database, sql_to_execute) :
   except Exception as error_message: 
     print(f"Failed{default_database_target_string}{default_sql_execution_string} resulting in {error_message}")
 
-def run_on_schedule_frequency(start_time = None, frequency=3600*24, target_database, sql_to_execute) : 
-  schedule_state = True
-  while schedule_state : 
-    if start_time is None : 
-      time.sleep(1)
-      try : 
-        result = generate_query_results(target_database, sql_to_execute)
-        yield result 
-        start_time = time.time() 
-      except Exception as error: 
-        print(f"Error processing request : {error_message}. Shutting down process.")
-        schedule_state = False
-    else : 
-      next_time = start_time + frequency
-      time.sleep(next_time)
-      try : 
-        result = generate_query_results(target_database, sql_to_execute) 
-        yield result
-        start_time = time.time()
-      except Exception as error : 
-        print(f"Error processing request : {error_message}. Shutting down process.")
-        schedule_state = False 
+"""
+  The periodic run goes through scheduled_job_runner, which keeps a fixed rate without drifting and runs many such 
+  jobs on a bounded pool of worker threads, rather than one sleeping thread per job 
+"""
+import scheduled_job_runner as sjr
+
+def run_on_schedule_frequency(target_database, sql_to_execute, frequency=3600*24, start_delay_seconds=0, job_runner=None) : 
+  job_runner = job_runner or sjr.scheduled_job_runner()
+  job_runner.schedule(generate_query_results, frequency, target_database, sql_to_execute, 
+                      first_run_delay_seconds=start_delay_seconds, max_consecutive_failures=3)
+  return job_runner.start()
 '''
 
 '''
@@ -204,14 +1124,22 @@ def run_on_schedule_frequency(start_time = None, frequency=3600*24, target_datab
 '''
 def check_input_numeric_values_follow_lambda_pattern_for_function_to_decorate(value) : 
   def argument_validation_wrapper(function_to_decorate) : 
-    def validate_and_calculate(*args, **kwargs) : 
-      if value(*args, **kwargs) : 
-        return function_to_decorate(*args, **kwargs) 
-      else : 
+    def validate(args, kwargs) : 
+      if not value(*args, **kwargs) : 
         start = "Invalid arguments in "
         components = f"{args} or {kwargs} passed to {function_to_decorate.__name__}. "
         validator = f"Failed on value check with {value}."
         raise ValueError(f"{start}{components}{validator}")
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_validate_and_calculate(*args, **kwargs) : 
+        validate(args, kwargs)
+        return await function_to_decorate(*args, **kwargs) 
+      return async_validate_and_calculate
+    @functools.wraps(function_to_decorate)
+    def validate_and_calculate(*args, **kwargs) : 
+      validate(args, kwargs)
+      return function_to_decorate(*args, **kwargs) 
     return validate_and_calculate
   return argument_validation_wrapper
 
@@ -230,19 +1158,33 @@ print(f"Using -2, the result of our compute third power function is {compute_thi
 '''
 def retry_on_failure_function_decorator(max_attempts=1, retry_delay=1) : 
   def function_to_retry(function_to_decorate): 
+    start_string = f' the function {function_to_decorate.__name__}'
+    '''Built only once a call fails, with arguments summarized, so successful calls format nothing'''
+    def build_combined_string(args, kwargs) : 
+      argument_string_form = f' function to decorate with arguments : ({summarize_call_arguments(args, {})})'
+      keyword_arguments_string_form = f' and keyword arguments : {{{summarize_call_arguments((), kwargs)}}} \n'
+      return start_string + argument_string_form + keyword_arguments_string_form
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_decoration_wrapper(*args, **kwargs) : 
+        for i in range(max_attempts) : 
+          try : 
+            return await function_to_decorate(*args, **kwargs)
+          except Exception as error : 
+            print(f"Error occurred while attempting{build_combined_string(args, kwargs)}. This is retry {i+1}")
+            await asyncio.sleep(retry_delay)
+        raise Exception(f"Maximum attempts exceeded while attempting{build_combined_string(args, kwargs)}. Failing {start_string}")
+      return async_decoration_wrapper
+    @functools.wraps(function_to_decorate)
     def decoration_wrapper(*args, **kwargs) : 
-      arugment_string_form = f' function to decorate with arguments : {args}'
-      keyword_arguments_string_form = f' and keyword arguments : {kwargs} \n'
-      start_string = f' the function {function_to_decorate.__name__}'
-      combined_string = start_string + argument_string_form + keyword_arguments_string_form
       for i in range(max_attempts) : 
         try : 
           result = function_to_decorate(*args, **kwargs)
           return result 
         except Exception as error : 
-          print(f"Error occurred while attempting{combined_string}. This is retry {i+1}")
+          print(f"Error occurred while attempting{build_combined_string(args, kwargs)}. This is retry {i+1}")
           time.sleep(retry_delay)
-      raise Exception(f"Maximum attempts exceeded while attempting{combined_string}. Failing {start_string}")
+      raise Exception(f"Maximum attempts exceeded while attempting{build_combined_string(args, kwargs)}. Failing {start_string}")
     return decoration_wrapper
   return function_to_retry
 
@@ -274,29 +1216,51 @@ except Exception as error_message:
 
 '''
   Exponential delay retry spaces out retries over time to help insure that run over is not occurring
+  For jitter, a time budget, exception filters or a circuit breaker use retry_with_backoff_decorator_function below 
 '''
 def exponential_delay_retry_on_failure_function_decorator(max_attempts=1, retry_delay_start=1, retry_delay_exponential_multiple=2) : 
   def function_to_retry(function_to_decorate) : 
-    def decoration_wrapper(*args, **kwargs) : 
-      arugment_string_form = f' function to decorate with arguments : {args}'
-      keyword_arguments_string_form = f' and keyword arguments : {kwargs} \n'
-      start_string = f' the function {function_to_decorate.__name__}'
-      combined_string = start_string + argument_string_form + keyword_arguments_string_form
-      retry_delay = retry_delay_start
+    start_string = f' the function {function_to_decorate.__name__}'
+    '''Built only once a call fails, with arguments summarized, so successful calls format nothing'''
+    def build_combined_string(args, kwargs) : 
+      argument_string_form = f' function to decorate with arguments : ({summarize_call_arguments(args, {})})'
+      keyword_arguments_string_form = f' and keyword arguments : {{{summarize_call_arguments((), kwargs)}}} \n'
+      return start_string + argument_string_form + keyword_arguments_string_form
+    def build_retry_message(args, kwargs, retry_count, retry_delay) : 
       message_components = [""]*3
-      message_components[0] = f"Error occurred while attempting {combined_string}."
+      message_components[0] = f"Error occurred while attempting {build_combined_string(args, kwargs)}."
+      message_components[1] = f" This is retry {retry_count + 1} of {max_attempts}."
+      message_components[2] = f" Delay until next retry is {retry_delay} in seconds."
+      return ''.join(message_components)
+    '''
+      Yields the retry count and the delay before each retry, for the sync and async wrappers to sleep on 
+    '''
+    def iterate_retry_delays() : 
+      retry_delay = retry_delay_start
       for retry_count in range(max_attempts) : 
-        next_retry_delay = retry_delay * retry_delay_exponential_multiple
-        message_components[1] = f" This is retry {retry_count + 1} of {max_attempts}."
-        message_components[2] = f" Delay until next retry is {next_retry_delay} in seconds."
-        retry_delay = next_retry_delay
+        retry_delay = retry_delay * retry_delay_exponential_multiple
+        yield retry_count, retry_delay
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_decoration_wrapper(*args, **kwargs) : 
+        for retry_count, retry_delay in iterate_retry_delays() : 
+          try : 
+            return await function_to_decorate(*args, **kwargs)
+          except Exception as error : 
+            print(build_retry_message(args, kwargs, retry_count, retry_delay))
+            await asyncio.sleep(retry_delay)
+        raise Exception(f"Maximum attempts {max_attempts} exceeded for {build_combined_string(args, kwargs)}. Failing {start_string}")
+      return async_decoration_wrapper
+    @functools.wraps(function_to_decorate)
+    def decoration_wrapper(*args, **kwargs) : 
+      for retry_count, retry_delay in iterate_retry_delays() : 
         try : 
           result = function_to_decorate(*args, **kwargs)
           return result 
         except Exception as error : 
-          print(''.join(message_components))
+          print(build_retry_message(args, kwargs, retry_count, retry_delay))
           time.sleep(retry_delay)
-      raise Exception("Maximum attempts {max_attempts} exceeded for {combined_string}. Failing {start_string}")
+      raise Exception(f"Maximum attempts {max_attempts} exceeded for {build_combined_string(args, kwargs)}. Failing {start_string}")
     return decoration_wrapper
   return function_to_retry
 
@@ -325,24 +1289,385 @@ except Exception as error_message:
   print(f"Failed{default_database_target_string}{default_sql_execution_string} resulting in {error_message}.")
 '''
 
+'''
+  Raised instead of calling the function while its circuit_breaker is open 
+'''
+class circuit_open_error(Exception) : 
+  pass 
+
+'''
+  Raised when a retry_policy gives up, from the last error, once the attempts or the time budget are used up 
+'''
+class retry_exhausted_error(Exception) : 
+  def __init__(self, message, attempts_made, elapsed_seconds) : 
+    super().__init__(message)
+    self.attempts_made = attempts_made
+    self.elapsed_seconds = elapsed_seconds
+
+'''
+  Circuit breaker shareable by every function calling one dependency 
+    closed -> calls go through; failure_threshold failures in a row open it 
+    open -> calls fail fast with circuit_open_error, for recovery_timeout_seconds 
+    half_open -> then up to half_open_max_calls trial calls go through. A success closes it, a failure opens it again 
+  Only failures the retry policy counts as retryable are recorded, an error in the call itself says nothing about the dependency 
+'''
+class circuit_breaker : 
+  def __init__(self, failure_threshold=5, recovery_timeout_seconds=30, half_open_max_calls=1, clock=time.monotonic) : 
+    if failure_threshold < 1 or half_open_max_calls < 1 : 
+      raise ValueError(f"failure_threshold and half_open_max_calls must be at least 1, got {failure_threshold} and {half_open_max_calls}")
+    self.failure_threshold = failure_threshold
+    self.recovery_timeout_seconds = recovery_timeout_seconds
+    self.half_open_max_calls = half_open_max_calls
+    self.clock = clock
+    self.breaker_lock = threading.Lock()
+    self.state = 'closed'
+    self.consecutive_failures = 0 
+    self.opened_time = None 
+    self.half_open_calls = 0 
+
+  '''
+    Takes permission for one call, raising circuit_open_error when the circuit is open or its trial calls are taken 
+  '''
+  def before_call(self) : 
+    with self.breaker_lock : 
+      if self.state == 'open' : 
+        if self.clock() - self.opened_time < self.recovery_timeout_seconds : 
+          raise circuit_open_error(f"Circuit open, retrying after {self.recovery_timeout_seconds - (self.clock() - self.opened_time):.3f} seconds")
+        self.state, self.half_open_calls = 'half_open', 0 
+      if self.state == 'half_open' : 
+        if self.half_open_calls >= self.half_open_max_calls : 
+          raise circuit_open_error("Circuit half open, trial call already in progress")
+        self.half_open_calls += 1 
+
+  def record_success(self) : 
+    with self.breaker_lock : 
+      self.state, self.consecutive_failures = 'closed', 0 
+
+  '''
+    Gives back the permission of a call that says nothing about the dependency (it raised a non retryable error), 
+    freeing its trial call slot while half open and leaving the state and failure count as they are 
+  '''
+  def release_call(self) : 
+    with self.breaker_lock : 
+      if self.state == 'half_open' and self.half_open_calls > 0 : 
+        self.half_open_calls -= 1 
+
+  def record_failure(self) : 
+    with self.breaker_lock : 
+      self.consecutive_failures += 1 
+      if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold : 
+        self.state, self.opened_time = 'open', self.clock()
+
+  def breaker_info(self) : 
+    with self.breaker_lock : 
+      return {'state' : self.state, 'consecutive_failures' : self.consecutive_failures, 'failure_threshold' : self.failure_threshold}
+
+'''
+  Retry policy, the engine behind retry_with_backoff_decorator_function 
+    max_attempts -> calls made at most, the first included 
+    base_delay_seconds, multiplier, max_delay_seconds -> the exponential backoff before retry n is 
+      base_delay_seconds * multiplier ** n, capped at max_delay_seconds 
+    jitter -> spreads retries out so clients that failed together do not retry in lockstep 
+      'none' -> the backoff as is 
+      'full' -> uniform between 0 and the backoff 
+      'equal' -> half the backoff plus uniform up to the other half 
+      'decorrelated' -> uniform between base_delay_seconds and three times the previous delay, capped 
+    deadline_seconds -> overall time budget from the first call; no retry starts whose delay would pass it 
+    retry_on -> exception types worth retrying; give_up_on -> exception types never retried even if they match retry_on. 
+      Any other error is raised straight away 
+    breaker -> an optional circuit_breaker shared with other callers of the same dependency 
+'''
+class retry_policy : 
+  jitter_modes = ('none', 'full', 'equal', 'decorrelated')
+
+  def __init__(self, max_attempts=3, base_delay_seconds=1, max_delay_seconds=60, multiplier=2, jitter='full', 
+               deadline_seconds=None, retry_on=(Exception,), give_up_on=(), breaker=None, 
+               function_to_log_with=None, random_source=None, clock=time.monotonic) : 
+    if max_attempts < 1 : 
+      raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+    if jitter not in self.jitter_modes : 
+      raise ValueError(f"jitter must be one of {self.jitter_modes}, got {jitter!r}")
+    self.max_attempts = max_attempts
+    self.base_delay_seconds = base_delay_seconds
+    self.max_delay_seconds = max_delay_seconds
+    self.multiplier = multiplier
+    self.jitter = jitter
+    self.deadline_seconds = deadline_seconds
+    self.retry_on = tuple(retry_on) if isinstance(retry_on, (list, set)) else retry_on
+    self.give_up_on = tuple(give_up_on) if isinstance(give_up_on, (list, set)) else give_up_on
+    self.breaker = breaker
+    self.function_to_log_with = function_to_log_with
+    self.random_source = random_source or random.Random()
+    self.clock = clock
+
+  def is_retryable(self, error) : 
+    return isinstance(error, self.retry_on) and not isinstance(error, self.give_up_on)
+
+  '''
+    Delay before retry number retry_index (0 for the first retry), given the delay before the previous one 
+  '''
+  def next_delay(self, retry_index, previous_delay) : 
+    backoff = min(self.max_delay_seconds, self.base_delay_seconds * self.multiplier ** retry_index)
+    if self.jitter == 'full' : 
+      return self.random_source.uniform(0, backoff)
+    if self.jitter == 'equal' : 
+      return backoff / 2 + self.random_source.uniform(0, backoff / 2)
+    if self.jitter == 'decorrelated' : 
+      return min(self.max_delay_seconds, self.random_source.uniform(self.base_delay_seconds, max(self.base_delay_seconds, previous_delay * 3)))
+    return backoff 
+
+  '''
+    Drives the attempts of one call. Yields None before each attempt and is sent back the attempt's error (None on 
+    success); yields the delay to sleep before a retry, or raises when giving up. Shared by the sync and async wrappers, 
+    which only differ in how they sleep 
+  '''
+  def attempt_schedule(self, function_name) : 
+    start_time = self.clock()
+    previous_delay = self.base_delay_seconds
+    for attempt_index in range(self.max_attempts) : 
+      if self.breaker is not None : 
+        self.breaker.before_call()
+      error = yield None 
+      if error is None : 
+        if self.breaker is not None : 
+          self.breaker.record_success()
+        return 
+      if not self.is_retryable(error) : 
+        if self.breaker is not None : 
+          self.breaker.release_call()
+        raise error 
+      if self.breaker is not None : 
+        self.breaker.record_failure()
+      elapsed_seconds = self.clock() - start_time
+      if attempt_index + 1 == self.max_attempts : 
+        raise retry_exhausted_error(f"{function_name} failed after {attempt_index + 1} attempts in {elapsed_seconds:.3f} seconds", 
+                                    attempt_index + 1, elapsed_seconds) from error 
+      retry_delay = previous_delay = self.next_delay(attempt_index, previous_delay)
+      if self.deadline_seconds is not None and elapsed_seconds + retry_delay > self.deadline_seconds : 
+        raise retry_exhausted_error(f"{function_name} failed after {attempt_index + 1} attempts, retrying would pass the " 
+                                    f"{self.deadline_seconds} second deadline", attempt_index + 1, elapsed_seconds) from error 
+      if self.function_to_log_with is not None : 
+        self.function_to_log_with(f"{function_name} attempt {attempt_index + 1} of {self.max_attempts} failed with "
+                                  f"{error!r}, retrying in {retry_delay:.3f} seconds")
+      yield retry_delay
+
+  def call(self, function_to_call, *args, **kwargs) : 
+    attempts = self.attempt_schedule(getattr(function_to_call, '__qualname__', repr(function_to_call)))
+    next(attempts)
+    while True : 
+      try : 
+        result = function_to_call(*args, **kwargs)
+      except Exception as error : 
+        time.sleep(attempts.send(error))
+        next(attempts)
+        continue 
+      try : 
+        attempts.send(None)
+      except StopIteration : 
+        pass 
+      return result 
+
+  async def call_async(self, function_to_call, *args, **kwargs) : 
+    attempts = self.attempt_schedule(getattr(function_to_call, '__qualname__', repr(function_to_call)))
+    next(attempts)
+    while True : 
+      try : 
+        result = await function_to_call(*args, **kwargs)
+      except Exception as error : 
+        await asyncio.sleep(attempts.send(error))
+        next(attempts)
+        continue 
+      try : 
+        attempts.send(None)
+      except StopIteration : 
+        pass 
+      return result 
+
+'''
+  Retries the function to decorate under a retry_policy, built from the keyword arguments (see retry_policy) unless 
+  one is passed as policy. Coroutine functions back off with asyncio.sleep, so no thread is held while waiting 
+  Gives up with retry_exhausted_error, raises non retryable errors as they are and circuit_open_error while a breaker is open 
+'''
+def retry_with_backoff_decorator_function(function_to_decorate=None, policy=None, **policy_arguments) : 
+  def decorate_retried_function(function_to_decorate) : 
+    retry_schedule = policy if policy is not None else retry_policy(**policy_arguments)
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_retried_wrapper(*args, **kwargs) : 
+        return await retry_schedule.call_async(function_to_decorate, *args, **kwargs)
+      async_retried_wrapper.retry_policy = retry_schedule
+      return async_retried_wrapper
+    @functools.wraps(function_to_decorate)
+    def retried_wrapper(*args, **kwargs) : 
+      return retry_schedule.call(function_to_decorate, *args, **kwargs)
+    retried_wrapper.retry_policy = retry_schedule
+    return retried_wrapper
+  if function_to_decorate is None : 
+    return decorate_retried_function
+  return decorate_retried_function(function_to_decorate)
+
+# Example below 
+'''
+database_breaker = circuit_breaker(failure_threshold=5, recovery_timeout_seconds=30)
+
+@retry_with_backoff_decorator_function(max_attempts=5, base_delay_seconds=0.5, max_delay_seconds=10, jitter='decorrelated', 
+                                       deadline_seconds=30, retry_on=(sqlite3.OperationalError,), breaker=database_breaker, 
+                                       function_to_log_with=print)
+def establish_database_connection(target_database, sql_to_execute) : 
+  with get_sqlite_connection_pool(target_database).connection() as connection : 
+    return connection.execute(sql_to_execute).fetchall()
+
+@retry_with_backoff_decorator_function(max_attempts=4, jitter='full', retry_on=(ConnectionError, TimeoutError))
+async def fetch_record(record_id) : 
+  ...
+
+try : 
+  print(establish_database_connection("example.db", "select * from users limit 10"))
+except retry_exhausted_error as error : 
+  print(f"Gave up after {error.attempts_made} attempts : {error.__cause__!r}")
+except circuit_open_error as error : 
+  print(f"Database circuit is open : {error}")
+'''
+
+'''
+  Rate limiters, shareable between any number of decorated functions (pass the same object as rate_limiter=) 
+  Each limits calls to max_allowed_calls per reset_period_seconds, separately for every key (None when not limiting per key). 
+  Per key state is kept for the max_tracked_keys most recently used keys; a key dropped past that starts afresh 
+    try_acquire(key) -> takes a call and returns 0, or returns the seconds until one is available 
+    acquire(key, block, timeout) -> takes a call, waiting for one when block is True (raising if timeout seconds would pass), 
+      raising straight away when block is False 
+    acquire_async(key, block, timeout) -> as acquire, waiting with asyncio.sleep 
+  Subclasses hold the engine specific part: new_key_state(current_time) and take_call(key_state, current_time) 
+'''
+class rate_limiter : 
+  def __init__(self, max_allowed_calls=10, reset_period_seconds=10, max_tracked_keys=10000, clock=time.monotonic) : 
+    if max_allowed_calls < 1 or reset_period_seconds <= 0 : 
+      raise ValueError(f"Rate limits need at least one call per positive period, got {max_allowed_calls} per {reset_period_seconds} seconds")
+    self.max_allowed_calls = max_allowed_calls
+    self.reset_period_seconds = reset_period_seconds
+    self.max_tracked_keys = max_tracked_keys
+    self.clock = clock
+    self.limiter_lock = threading.Lock()
+    self.key_states = collections.OrderedDict()
+
+  def try_acquire(self, key=None) : 
+    with self.limiter_lock : 
+      current_time = self.clock()
+      if key in self.key_states : 
+        self.key_states.move_to_end(key)
+      else : 
+        self.key_states[key] = self.new_key_state(current_time)
+        if len(self.key_states) > self.max_tracked_keys : 
+          self.key_states.popitem(last=False)
+      return self.take_call(self.key_states[key], current_time)
+
+  '''
+    Seconds to wait before the next try, or raises when the call may not wait that long 
+  '''
+  def seconds_until_retry(self, key, block, deadline) : 
+    wait_seconds = self.try_acquire(key)
+    if wait_seconds <= 0 : 
+      return 0 
+    key_string = f" for {key}" if key is not None else ""
+    if not block or (deadline is not None and self.clock() + wait_seconds > deadline) : 
+      raise Exception(f"Rate limit of {self.max_allowed_calls} calls per {self.reset_period_seconds} seconds exceeded{key_string}. Try again in {wait_seconds:.2f} seconds")
+    return wait_seconds
+
+  def acquire(self, key=None, block=True, timeout=None) : 
+    deadline = self.clock() + timeout if timeout is not None else None 
+    while (wait_seconds := self.seconds_until_retry(key, block, deadline)) > 0 : 
+      time.sleep(wait_seconds)
+    return True 
+
+  async def acquire_async(self, key=None, block=True, timeout=None) : 
+    deadline = self.clock() + timeout if timeout is not None else None 
+    while (wait_seconds := self.seconds_until_retry(key, block, deadline)) > 0 : 
+      await asyncio.sleep(wait_seconds)
+    return True 
+
+'''
+  Fixed window, the original rate_limit_function_decorator behaviour. The count resets all at once when the window 
+  ends, so up to twice max_allowed_calls can pass around a window edge 
+'''
+class fixed_window_rate_limiter(rate_limiter) : 
+  def new_key_state(self, current_time) : 
+    return {'window_start' : current_time, 'calls_count' : 0}
+
+  def take_call(self, key_state, current_time) : 
+    if current_time - key_state['window_start'] > self.reset_period_seconds : 
+      key_state['window_start'], key_state['calls_count'] = current_time, 0 
+    if key_state['calls_count'] >= self.max_allowed_calls : 
+      return max(key_state['window_start'] + self.reset_period_seconds - current_time, 1e-6)
+    key_state['calls_count'] += 1 
+    return 0 
+
+'''
+  Sliding window. Keeps the times of the last max_allowed_calls calls, so no reset_period_seconds span ever holds more 
+'''
+class sliding_window_rate_limiter(rate_limiter) : 
+  def new_key_state(self, current_time) : 
+    return collections.deque()
+
+  def take_call(self, call_times, current_time) : 
+    while len(call_times) and call_times[0] <= current_time - self.reset_period_seconds : 
+      call_times.popleft()
+    if len(call_times) >= self.max_allowed_calls : 
+      return max(call_times[0] + self.reset_period_seconds - current_time, 1e-6)
+    call_times.append(current_time)
+    return 0 
+
+'''
+  Token bucket. Tokens refill smoothly at max_allowed_calls per reset_period_seconds up to burst_size 
+  (defaults to max_allowed_calls) and each call takes one, giving an even rate with bounded bursts 
+'''
+class token_bucket_rate_limiter(rate_limiter) : 
+  def __init__(self, max_allowed_calls=10, reset_period_seconds=10, burst_size=None, max_tracked_keys=10000, clock=time.monotonic) : 
+    super().__init__(max_allowed_calls, reset_period_seconds, max_tracked_keys, clock)
+    self.burst_size = burst_size if burst_size is not None else max_allowed_calls
+    self.tokens_per_second = max_allowed_calls / reset_period_seconds
+
+  def new_key_state(self, current_time) : 
+    return {'tokens' : float(self.burst_size), 'last_refill' : current_time}
+
+  def take_call(self, key_state, current_time) : 
+    key_state['tokens'] = min(self.burst_size, key_state['tokens'] + (current_time - key_state['last_refill']) * self.tokens_per_second)
+    key_state['last_refill'] = current_time
+    if key_state['tokens'] < 1 : 
+      return (1 - key_state['tokens']) / self.tokens_per_second
+    key_state['tokens'] -= 1 
+    return 0 
+
+rate_limiter_engines = {'fixed_window' : fixed_window_rate_limiter, 'sliding_window' : sliding_window_rate_limiter, 
+                        'token_bucket' : token_bucket_rate_limiter}
+
 '''
   rate limiting decorator function allows for the function to have a certain number of 
   calls that can be made within a set reset period to prevent ddos spamming of api calls 
+    engine -> fixed_window (default), sliding_window or token_bucket, see the limiter classes above 
+    block -> wait for the limit to allow the call (asyncio.sleep for coroutine functions) instead of raising, 
+      giving up with an exception if timeout seconds would pass 
+    key_function -> called with the call's arguments, its result is the key limited separately (e.g. per endpoint) 
+    rate_limiter -> a limiter object to use instead of building one, so several functions can share one limit 
 '''
-def rate_limit_function_decorator(max_allowed_calls=10, reset_period_seconds=10) : 
+def rate_limit_function_decorator(max_allowed_calls=10, reset_period_seconds=10, engine='fixed_window', block=False, 
+                                  timeout=None, key_function=None, rate_limiter=None) : 
+  if rate_limiter is None : 
+    if engine not in rate_limiter_engines : 
+      raise ValueError(f"Unknown rate limiter engine {engine}, expected one of {tuple(rate_limiter_engines)}")
+    rate_limiter = rate_limiter_engines[engine](max_allowed_calls, reset_period_seconds)
   def decorate_rate_limited_function(function_to_decorate) : 
-    calls_count = 0
-    last_reset_time = time.time()
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_wrapper_for_rate_limiting(*args, **kwargs) : 
+        await rate_limiter.acquire_async(key_function(*args, **kwargs) if key_function is not None else None, block, timeout)
+        return await function_to_decorate(*args, **kwargs)
+      async_wrapper_for_rate_limiting.rate_limiter = rate_limiter
+      return async_wrapper_for_rate_limiting
+    @functools.wraps(function_to_decorate)
     def wrapper_for_rate_limiting(*args, **kwargs) : 
-      nonlocal calls_count, last_reset_time
-      elapsed_time = time.time() - last_reset_time
-      if elapsed_time > reset_period_seconds : 
-        calls_count = 0
-        last_reset_time = time.time() 
-      if calls_count >= max_allowed_calls : 
-        raise Exception(f"Rate limit of {max_allowed_calls} exceeded at call count of {calls_count}. Try again in {reset_period_seconds * 2} seconds")
-      calls_count += 1 
+      rate_limiter.acquire(key_function(*args, **kwargs) if key_function is not None else None, block, timeout)
       return function_to_decorate(*args, **kwargs)
+    wrapper_for_rate_limiting.rate_limiter = rate_limiter
     return wrapper_for_rate_limiting
   return decorate_rate_limited_function
 
@@ -362,11 +1687,43 @@ time.sleep(10)
 make_api_call()
 '''
 
+# Example below of a shared, blocking, per endpoint token bucket. Each endpoint gets 5 calls a second, bursting to 10 
+'''
+endpoint_limiter = token_bucket_rate_limiter(max_allowed_calls=5, reset_period_seconds=1, burst_size=10)
+
+@rate_limit_function_decorator(rate_limiter=endpoint_limiter, block=True, key_function=lambda endpoint, *args, **kwargs : endpoint)
+def get_from_api(endpoint, record_id) : 
+  print(f"GET {endpoint}/{record_id} at {time.monotonic():.2f}")
+
+@rate_limit_function_decorator(rate_limiter=endpoint_limiter, block=True, key_function=lambda endpoint, *args, **kwargs : endpoint)
+async def get_from_api_async(endpoint, record_id) : 
+  print(f"async GET {endpoint}/{record_id} at {time.monotonic():.2f}")
+
+for record_id in range(20) : 
+  get_from_api("users", record_id)
+
+async def get_many_orders() : 
+  await asyncio.gather(*(get_from_api_async("orders", record_id) for record_id in range(20)))
+asyncio.run(get_many_orders())
+'''
+
+# Concurrent callers of the limiter, the cache and the async retries are checked in tests/test_decorator_concurrency.py 
+
 '''
   Exception handler with useful defaulting error message 
 '''
 def handle_exceptions(default_response_message="Please address the above error before retrying.") : 
   def exception_handler_decorator(function_to_decorate) : 
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_decorated_function_wrapper(*args, **kwargs) : 
+        try : 
+          return await function_to_decorate(*args, **kwargs) 
+        except Exception as error: 
+          print(f"An error occurred while processing your request : {error}")
+          return default_response_message
+      return async_decorated_function_wrapper
+    @functools.wraps(function_to_decorate)
     def decorated_function_wrapper(*args, **kwargs) : 
       try : 
         return function_to_decorate(*args, **kwargs) 
@@ -385,6 +1742,216 @@ def divide_numbers_safely(dividend, divisor) :
 result = divide_numbers_safely(7, 0)
 print(f"Result produced is {result}")
 '''
+
+'''
+  Bounded pool of sqlite3 connections to one database, so calls reuse open connections instead of connecting every time 
+    max_connections -> at most this many connections are open at once. Checkouts past that wait up to 
+      checkout_timeout_seconds for one to be returned 
+    journal_mode -> set on each new connection. WAL (the default) lets readers run alongside a writer 
+    health_check_sql -> run on every checkout. A connection that fails it is closed and replaced by a new one 
+  Use it as pool.connection() in a with block. The transaction commits on success and rolls back on an error, and after 
+  an error the connection is health checked and discarded if broken, so a retry_on_failure_function_decorator retry 
+  gets a working connection. Connections are opened with check_same_thread=False since they move between threads, 
+  but only one caller uses a connection at a time 
+'''
+class sqlite_connection_pool : 
+  def __init__(self, database_path, max_connections=4, checkout_timeout_seconds=30, journal_mode='WAL', 
+               health_check_sql='select 1', **connect_arguments) : 
+    if max_connections < 1 : 
+      raise ValueError(f"max_connections must be at least 1, got {max_connections}")
+    self.database_path = database_path
+    self.max_connections = max_connections
+    self.checkout_timeout_seconds = checkout_timeout_seconds
+    self.journal_mode = journal_mode
+    self.health_check_sql = health_check_sql
+    self.connect_arguments = connect_arguments
+    self.pool_condition = threading.Condition()
+    self.idle_connections = collections.deque()
+    self.open_connection_count = 0 
+    self.discarded_connection_count = 0 
+    self.pool_closed = False 
+    self.owner_process_id = os.getpid()
+
+  def open_connection(self) : 
+    connection = sqlite3.connect(self.database_path, check_same_thread=False, **self.connect_arguments)
+    if self.journal_mode is not None : 
+      connection.execute(f"pragma journal_mode={self.journal_mode}")
+    return connection
+
+  def connection_is_healthy(self, connection) : 
+    try : 
+      connection.execute(self.health_check_sql).fetchall()
+      return True 
+    except sqlite3.Error : 
+      return False 
+
+  '''
+    Closes a connection without letting a failure to close hide the error being handled 
+  '''
+  def close_quietly(self, connection) : 
+    try : 
+      connection.close()
+    except sqlite3.Error : 
+      pass 
+
+  '''
+    Takes an idle connection (health checked) or opens a new one while under max_connections, otherwise waits for a checkin 
+  '''
+  def checkout(self) : 
+    deadline = time.monotonic() + self.checkout_timeout_seconds
+    with self.pool_condition : 
+      if self.owner_process_id != os.getpid() : 
+        self.forget_parent_connections()
+      while True : 
+        if self.pool_closed : 
+          raise Exception(f"Connection pool for {self.database_path} is closed")
+        if len(self.idle_connections) : 
+          connection = self.idle_connections.pop()
+          break 
+        if self.open_connection_count < self.max_connections : 
+          '''Reserve the slot now and open the connection outside the lock'''
+          self.open_connection_count += 1 
+          connection = None 
+          break 
+        if (remaining_seconds := deadline - time.monotonic()) <= 0 : 
+          raise Exception(f"No connection to {self.database_path} was free within {self.checkout_timeout_seconds} seconds")
+        self.pool_condition.wait(remaining_seconds)
+    if connection is not None : 
+      if self.connection_is_healthy(connection) : 
+        return connection 
+      self.close_quietly(connection)
+      self.discarded_connection_count += 1 
+    try : 
+      return self.open_connection()
+    except : 
+      with self.pool_condition : 
+        self.open_connection_count -= 1 
+        self.pool_condition.notify()
+      raise 
+
+  '''
+    In a forked child the inherited connections belong to the parent's sqlite handles and must not be used or closed 
+    here, so the child just lets go of them and opens its own 
+  '''
+  def forget_parent_connections(self) : 
+    self.idle_connections = collections.deque()
+    self.open_connection_count = 0 
+    self.owner_process_id = os.getpid()
+
+  '''
+    Returns a connection to the pool, or closes it when discard is True, it fails its health check or the pool is closed 
+  '''
+  def checkin(self, connection, discard=False, check_health=False) : 
+    if not discard and check_health : 
+      discard = not self.connection_is_healthy(connection)
+    with self.pool_condition : 
+      if discard or self.pool_closed : 
+        self.open_connection_count -= 1 
+        self.discarded_connection_count += int(discard)
+      else : 
+        self.idle_connections.append(connection)
+        connection = None 
+      self.pool_condition.notify()
+    if connection is not None : 
+      self.close_quietly(connection)
+
+  @contextlib.contextmanager
+  def connection(self) : 
+    connection = self.checkout()
+    try : 
+      yield connection
+    except BaseException : 
+      try : 
+        connection.rollback()
+      except sqlite3.Error : 
+        pass 
+      self.checkin(connection, check_health=True)
+      raise 
+    try : 
+      connection.commit()
+    except BaseException : 
+      self.checkin(connection, check_health=True)
+      raise 
+    self.checkin(connection)
+
+  '''
+    Open, idle and discarded connection counts 
+  '''
+  def pool_info(self) : 
+    with self.pool_condition : 
+      return {'database_path' : self.database_path, 'open_connections' : self.open_connection_count, 
+              'idle_connections' : len(self.idle_connections), 'max_connections' : self.max_connections, 
+              'discarded_connections' : self.discarded_connection_count}
+
+  '''
+    Closes idle connections and stops new checkouts. Connections still checked out close when returned 
+  '''
+  def close(self) : 
+    with self.pool_condition : 
+      self.pool_closed = True 
+      idle_connections, self.idle_connections = list(self.idle_connections), collections.deque()
+      self.open_connection_count -= len(idle_connections)
+      self.pool_condition.notify_all()
+    for connection in idle_connections : 
+      self.close_quietly(connection)
+
+sqlite_connection_pools = {} 
+sqlite_connection_pools_lock = threading.Lock()
+
+'''
+  The shared pool for a database path, created with pool_arguments on first use 
+'''
+def get_sqlite_connection_pool(database_path, **pool_arguments) : 
+  with sqlite_connection_pools_lock : 
+    if database_path not in sqlite_connection_pools or sqlite_connection_pools[database_path].pool_closed : 
+      sqlite_connection_pools[database_path] = sqlite_connection_pool(database_path, **pool_arguments)
+    return sqlite_connection_pools[database_path]
+
+'''
+  Pooled sqlite connection decorator passes a pooled connection to database_path as the first argument of the function 
+  to decorate, committing on success. Coroutine functions check out in a worker thread so a full pool never blocks 
+  the event loop. Put retry decorators outside it so every attempt checks out again 
+'''
+def pooled_sqlite_connection_decorator(database_path, **pool_arguments) : 
+  def decorate_with_pooled_connection(function_to_decorate) : 
+    connection_pool = get_sqlite_connection_pool(database_path, **pool_arguments)
+    if inspect.iscoroutinefunction(function_to_decorate) : 
+      @functools.wraps(function_to_decorate)
+      async def async_wrapper_with_connection(*args, **kwargs) : 
+        pooled_connection = connection_pool.connection()
+        connection = await asyncio.to_thread(pooled_connection.__enter__)
+        try : 
+          result = await function_to_decorate(connection, *args, **kwargs)
+        except BaseException : 
+          if not pooled_connection.__exit__(*sys.exc_info()) : 
+            raise 
+        else : 
+          pooled_connection.__exit__(None, None, None)
+          return result 
+      async_wrapper_with_connection.connection_pool = connection_pool
+      return async_wrapper_with_connection
+    @functools.wraps(function_to_decorate)
+    def wrapper_with_connection(*args, **kwargs) : 
+      with connection_pool.connection() as connection : 
+        return function_to_decorate(connection, *args, **kwargs)
+    wrapper_with_connection.connection_pool = connection_pool
+    return wrapper_with_connection
+  return decorate_with_pooled_connection
+
+# Example below 
+'''
+@retry_on_failure_function_decorator(max_attempts=3, retry_delay=1)
+@pooled_sqlite_connection_decorator("example.db", max_connections=4)
+def query_database(connection, sql_to_execute) : 
+  return connection.execute(sql_to_execute).fetchall()
+
+print(query_database("select * from users limit 10"))
+print(query_database.connection_pool.pool_info())
+
+users_pool = get_sqlite_connection_pool("example.db")
+with users_pool.connection() as connection : 
+  connection.execute("insert into users (name) values (?)", ("Margeret",))
+'''
           
 if __name__ == "__main__" : 
   print("Can't do this that way") 
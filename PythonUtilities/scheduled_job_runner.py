@@ -0,0 +1,287 @@
+'''
+  In process scheduler for many periodic jobs, such as the query extracts run_on_schedule_frequency used to drive
+  One dispatcher thread keeps every job in a heap ordered by next run time and sleeps only until the earliest is due,
+  then hands it to a bounded worker pool, so hundreds of jobs share max_workers threads instead of holding one each
+    fixed_rate -> runs are due at first run time + n * interval, worked out from the schedule rather than from when a
+      run finished, so nothing drifts. Slots missed while far behind are skipped (counted as missed_runs), not run in a burst
+    fixed_delay -> each run is due interval seconds after the previous one finished
+  A fixed rate run coming due while the previous run is still going is handled by the job's overlap policy
+    skip -> the run is dropped and counted in skipped_runs
+    queue -> one run is kept pending and starts as soon as the running one finishes
+    allow -> runs start alongside each other, within the worker pool
+  Each job keeps latency (run duration) and lag (start time past its due time, including waiting for a free worker)
+  in decorator_designs latency histograms, reported by job_metrics()
+'''
+import time
+import heapq
+import functools
+import itertools
+import threading
+import concurrent.futures
+import decorator_designs as dd
+
+'''
+  One periodic job and its run statistics, as returned by scheduled_job_runner.schedule
+'''
+class scheduled_job :
+  def __init__(self, name, job_function, args, kwargs, interval_seconds, mode, overlap, max_consecutive_failures) :
+    self.name = name
+    self.job_function = job_function
+    self.args = args
+    self.kwargs = kwargs
+    self.interval_seconds = interval_seconds
+    self.mode = mode
+    self.overlap = overlap
+    self.max_consecutive_failures = max_consecutive_failures
+    self.next_run_time = None
+    self.running_count = 0
+    self.run_pending = False
+    self.pending_due_time = None
+    self.cancelled = False
+    self.runs = self.failures = self.consecutive_failures = self.skipped_runs = self.missed_runs = 0
+    self.last_error = None
+    self.latency = dd.latency_histogram(f"{name} latency")
+    self.lag = dd.latency_histogram(f"{name} lag")
+
+  '''
+    Run counts and latency and lag percentiles in seconds
+  '''
+  def metrics(self, current_time) :
+    def in_seconds(statistics) :
+      return {statistic_name : statistics[f"{statistic_name}_ns"] / 1e9 if statistics[f"{statistic_name}_ns"] is not None else None
+              for statistic_name in ('mean', 'p50', 'p95', 'p99', 'max')}
+    return {'name' : self.name, 'mode' : self.mode, 'interval_seconds' : self.interval_seconds, 'runs' : self.runs,
+            'failures' : self.failures, 'skipped_runs' : self.skipped_runs, 'missed_runs' : self.missed_runs,
+            'running' : self.running_count, 'cancelled' : self.cancelled,
+            'next_run_in_seconds' : self.next_run_time - current_time if self.next_run_time is not None else None,
+            'last_error' : repr(self.last_error) if self.last_error is not None else None,
+            'latency_seconds' : in_seconds(self.latency.statistics()), 'lag_seconds' : in_seconds(self.lag.statistics())}
+
+'''
+  Heap based scheduler running periodic jobs on a pool of max_workers threads
+    schedule(job_function, interval_seconds, *args, ...) -> adds a job, returning its scheduled_job
+    every(interval_seconds, ...) -> the same as a decorator
+    cancel(job), start(), stop(wait), job_metrics()
+  Errors raised by a job are counted and logged with function_to_log_with (None to stay quiet) and the job carries on,
+  unless it fails max_consecutive_failures times in a row, which cancels it
+'''
+class scheduled_job_runner :
+  schedule_modes = ('fixed_rate', 'fixed_delay')
+  overlap_policies = ('skip', 'queue', 'allow')
+
+  def __init__(self, max_workers=8, function_to_log_with=dd.default_print_line, clock=time.monotonic) :
+    if max_workers < 1 :
+      raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+    self.max_workers = max_workers
+    self.function_to_log_with = function_to_log_with
+    self.clock = clock
+    self.schedule_condition = threading.Condition()
+    self.timer_heap = []
+    self.heap_sequence = itertools.count()
+    self.jobs = []
+    self.worker_pool = None
+    self.dispatcher_thread = None
+    self.stopping = False
+
+  def __enter__(self) :
+    return self.start()
+
+  def __exit__(self, *exception_details) :
+    self.stop()
+
+  '''
+    Adds job_function(*args, **kwargs) to run every interval_seconds, first after first_run_delay_seconds
+  '''
+  def schedule(self, job_function, interval_seconds, *args, name=None, mode='fixed_rate', overlap='skip',
+               first_run_delay_seconds=0, max_consecutive_failures=None, **kwargs) :
+    if interval_seconds <= 0 :
+      raise ValueError(f"interval_seconds must be positive, got {interval_seconds}")
+    if mode not in self.schedule_modes :
+      raise ValueError(f"mode must be one of {self.schedule_modes}, got {mode!r}")
+    if overlap not in self.overlap_policies :
+      raise ValueError(f"overlap must be one of {self.overlap_policies}, got {overlap!r}")
+    job = scheduled_job(name or getattr(job_function, '__qualname__', repr(job_function)), job_function, args, kwargs,
+                        interval_seconds, mode, overlap, max_consecutive_failures)
+    with self.schedule_condition :
+      self.jobs.append(job)
+      self.push_job(job, self.clock() + first_run_delay_seconds)
+    return job
+
+  '''
+    Decorator form of schedule, leaving the function itself unchanged
+  '''
+  def every(self, interval_seconds, *args, **schedule_arguments) :
+    def schedule_decorated_function(job_function) :
+      job_function.scheduled_job = self.schedule(job_function, interval_seconds, *args, **schedule_arguments)
+      return job_function
+    return schedule_decorated_function
+
+  '''
+    Stops future runs of the job; a run already going finishes
+  '''
+  def cancel(self, job) :
+    with self.schedule_condition :
+      job.cancelled = True
+      job.next_run_time = None
+      self.schedule_condition.notify()
+
+  '''
+    Queues the job to run at run_time. Called holding schedule_condition
+  '''
+  def push_job(self, job, run_time) :
+    job.next_run_time = run_time
+    heapq.heappush(self.timer_heap, (run_time, next(self.heap_sequence), job))
+    self.schedule_condition.notify()
+
+  '''
+    Starts dispatching, again after a stop too. Jobs left off the heap by the stop (a fixed delay run that was going,
+    or cancelled before it started) are due straight away
+  '''
+  def start(self) :
+    with self.schedule_condition :
+      if self.dispatcher_thread is None :
+        self.stopping = False
+        self.worker_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scheduled_job')
+        for job in self.jobs :
+          if not job.cancelled and job.next_run_time is None and job.running_count == 0 :
+            self.push_job(job, self.clock())
+        self.dispatcher_thread = threading.Thread(target=self.dispatch_due_jobs, name='scheduled_job_dispatcher', daemon=True)
+        self.dispatcher_thread.start()
+    return self
+
+  '''
+    Stops dispatching and cancels runs not yet started. wait=True also waits for running jobs to finish
+  '''
+  def stop(self, wait=True) :
+    with self.schedule_condition :
+      if self.dispatcher_thread is None :
+        return
+      self.stopping = True
+      self.schedule_condition.notify()
+      dispatcher_thread, self.dispatcher_thread = self.dispatcher_thread, None
+    dispatcher_thread.join()
+    self.worker_pool.shutdown(wait=wait, cancel_futures=True)
+
+  '''
+    Dispatcher loop, sleeping until the earliest job is due (or a schedule or cancel wakes it)
+  '''
+  def dispatch_due_jobs(self) :
+    with self.schedule_condition :
+      while not self.stopping :
+        if len(self.timer_heap) == 0 :
+          self.schedule_condition.wait()
+          continue
+        run_time, _sequence, job = self.timer_heap[0]
+        if job.cancelled or job.next_run_time != run_time :
+          heapq.heappop(self.timer_heap)
+          continue
+        current_time = self.clock()
+        if run_time > current_time :
+          self.schedule_condition.wait(run_time - current_time)
+          continue
+        heapq.heappop(self.timer_heap)
+        job.next_run_time = None
+        if job.mode == 'fixed_rate' :
+          '''Next slot from the schedule itself, skipping any already missed, so there is no drift'''
+          missed_slots = int((current_time - run_time) // job.interval_seconds)
+          job.missed_runs += missed_slots
+          self.push_job(job, run_time + (missed_slots + 1) * job.interval_seconds)
+          if job.running_count and job.overlap == 'skip' :
+            job.skipped_runs += 1
+            continue
+          if job.running_count and job.overlap == 'queue' :
+            '''Lag of the queued run is still measured from its own slot'''
+            if not job.run_pending :
+              job.run_pending, job.pending_due_time = True, run_time
+            continue
+        self.submit_run(job, run_time)
+
+  '''
+    Hands one run to the worker pool. Called holding schedule_condition
+  '''
+  def submit_run(self, job, due_time) :
+    job.running_count += 1
+    try :
+      run_future = self.worker_pool.submit(self.run_job, job, due_time)
+    except RuntimeError :
+      '''The pool is shutting down'''
+      job.running_count -= 1
+      return
+    run_future.add_done_callback(functools.partial(self.release_cancelled_run, job))
+
+  '''
+    Done callback of every run. A run cancelled by stop() never reached run_job, so it stops counting as running here
+  '''
+  def release_cancelled_run(self, job, run_future) :
+    if run_future.cancelled() :
+      with self.schedule_condition :
+        job.running_count -= 1
+        job.run_pending = False
+
+  '''
+    Runs the job once in a worker, recording its lag and latency, then schedules what follows it
+  '''
+  def run_job(self, job, due_time) :
+    start_time = self.clock()
+    job.lag.record(max(0, int((start_time - due_time) * 1e9)))
+    start_ns = time.perf_counter_ns()
+    run_error = None
+    try :
+      job.job_function(*job.args, **job.kwargs)
+    except Exception as error :
+      run_error = error
+    job.latency.record(time.perf_counter_ns() - start_ns)
+    with self.schedule_condition :
+      job.running_count -= 1
+      job.runs += 1
+      if run_error is None :
+        job.consecutive_failures = 0
+      else :
+        job.failures += 1
+        job.consecutive_failures += 1
+        job.last_error = run_error
+        if job.max_consecutive_failures is not None and job.consecutive_failures >= job.max_consecutive_failures :
+          job.cancelled = True
+          job.next_run_time = None
+      if job.cancelled or self.stopping :
+        pass
+      elif job.mode == 'fixed_delay' :
+        self.push_job(job, self.clock() + job.interval_seconds)
+      elif job.run_pending :
+        job.run_pending = False
+        self.submit_run(job, job.pending_due_time)
+    if run_error is not None and self.function_to_log_with is not None :
+      self.function_to_log_with(f"Scheduled job {job.name} failed with {run_error!r}" +
+                                (f", cancelled after {job.consecutive_failures} failures in a row" if job.cancelled else ""))
+
+  '''
+    Metrics of every job scheduled, cancelled ones included
+  '''
+  def job_metrics(self) :
+    with self.schedule_condition :
+      current_time = self.clock()
+      return [job.metrics(current_time) for job in self.jobs]
+
+# Example below
+'''
+import scheduled_job_runner as sjr
+
+extract_runner = sjr.scheduled_job_runner(max_workers=16)
+
+def run_extract(target_database, sql_to_execute) :
+  with dd.get_sqlite_connection_pool(target_database).connection() as connection :
+    return connection.execute(sql_to_execute).fetchall()
+
+for extract_number in range(300) :
+  extract_runner.schedule(run_extract, 3600, "example.db", f"select * from users where user_id % 300 = {extract_number}",
+                          name=f"extract {extract_number}", first_run_delay_seconds=extract_number, overlap='skip')
+
+@extract_runner.every(60, mode='fixed_delay')
+def refresh_summary() :
+  ...
+
+with extract_runner :
+  time.sleep(7200)
+  for job_metrics in extract_runner.job_metrics() :
+    print(job_metrics['name'], job_metrics['runs'], job_metrics['lag_seconds']['p99'], job_metrics['latency_seconds']['p99'])
+'''
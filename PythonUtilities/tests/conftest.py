@@ -0,0 +1,7 @@
+import os
+import sys
+
+'''
+  The utilities import each other as top level modules (import text_cleaning_functions as cf), so the tests do too
+'''
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,52 @@
+'''
+  Columnar output of text_cleaner : parquet, arrow and feather files hold the same fields as the text output of the same
+  settings, less the string notation quotes, with the column names and types asked for
+'''
+import pytest
+import TextCleaner
+from test_text_cleaner_engines import demo_settings, mixed_input, text_input, clean_to_bytes
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.parquet
+import pyarrow.feather
+
+def clean_to_table(tmp_path, input_text, output_format, **settings) :
+  (tmp_path / 'input.csv').write_text(input_text, encoding='utf-8')
+  output_path = tmp_path / f"output.{output_format}"
+  TextCleaner.text_cleaner(str(tmp_path / 'input.csv'), str(output_path),
+                           **dict(demo_settings, output_format=output_format, **settings)).clean_dataframe_to_text_file()
+  assert not (tmp_path / f"output.{output_format}.partial").exists()
+  if output_format == 'parquet' :
+    return pyarrow.parquet.read_table(output_path)
+  return pyarrow.feather.read_table(output_path)
+
+'''
+  The text output's rows with one quote stripped from each end of every field (the inputs hold no delimiter in a field)
+'''
+def unquoted_text_rows(tmp_path, input_text, **settings) :
+  text_lines = clean_to_bytes(tmp_path, input_text, **settings).decode('utf-8').split('\n')
+  return [[cleaned_field[1:-1] for cleaned_field in text_line.split(';')] for text_line in text_lines]
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow', 'feather'])
+@pytest.mark.parametrize('input_text, settings', [(mixed_input, dict()), (mixed_input, dict(chunk_size_in_rows=2)),
+                                                  (mixed_input, dict(chunk_size_in_rows=2, workers=2)),
+                                                  (text_input, dict(cleaning_engine='csv', chunk_size_in_rows=2))],
+                         ids=['row_loop', 'chunked', 'workers', 'csv'])
+def test_columnar_fields_match_the_text_output(tmp_path, output_format, input_text, settings) :
+  output_table = clean_to_table(tmp_path, input_text, output_format, **settings)
+  assert output_table.column_names == [str(column_position) for column_position in range(output_table.num_columns)]
+  assert [list(row.values()) for row in output_table.to_pylist()] == unquoted_text_rows(tmp_path, input_text, **settings)
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_named_and_typed_columns(tmp_path, output_format) :
+  output_table = clean_to_table(tmp_path, mixed_input, output_format, output_column_names=['id', 'amount', 'text', 'flag'],
+                                output_column_types={'amount' : 'float64'}, output_compression='zstd')
+  assert output_table.schema.field('amount').type == pyarrow.float64()
+  assert output_table.column('amount').to_pylist() == [5.0, None, 7.0, 8.5, 9.0, 10.0]
+  assert output_table.column('text').to_pylist()[:2] == ['bold text', 'He said "hi']
+
+def test_columnar_output_cannot_be_resumed(tmp_path) :
+  with pytest.raises(ValueError, match='resume_partial_output') :
+    TextCleaner.text_cleaner('', '', output_format='parquet', resume_partial_output=True)
+  with pytest.raises(ValueError, match='Unknown output format') :
+    TextCleaner.text_cleaner('', '', output_format='orc')
@@ -0,0 +1,78 @@
+'''
+  Concurrent callers of the thread safe and async decorators in decorator_designs : no cache lookup is lost, no limiter
+  lets a call past its limit, and async retries wait with asyncio.sleep rather than blocking the event loop
+'''
+import time
+import asyncio
+import concurrent.futures
+import pytest
+import decorator_designs as dd
+
+number_of_threads = 16
+
+def test_cache_counts_every_call_from_many_threads() :
+  @dd.cached_results_decorator_function(max_entries=100)
+  def square_number(x) :
+    return x * x
+  calls = [number % 150 for number in range(50000)]
+  with concurrent.futures.ThreadPoolExecutor(max_workers=number_of_threads) as executor :
+    results = list(executor.map(square_number, calls))
+  assert results == [number * number for number in calls]
+  cache_info = square_number.cache_info()
+  assert cache_info.hits + cache_info.misses == len(calls)
+  assert cache_info.current_entries <= 100
+
+@pytest.mark.parametrize('engine', sorted(dd.rate_limiter_engines))
+def test_rate_limiter_never_admits_more_than_its_limit(engine) :
+  '''A period long enough that no token bucket refill lands during the test'''
+  @dd.rate_limit_function_decorator(max_allowed_calls=1000, reset_period_seconds=10**7, engine=engine)
+  def count_api_call() :
+    return 1
+  def call_until_limited(_thread_number) :
+    allowed_calls = 0
+    for _call_number in range(500) :
+      try :
+        allowed_calls += count_api_call()
+      except Exception :
+        pass
+    return allowed_calls
+  with concurrent.futures.ThreadPoolExecutor(max_workers=number_of_threads) as executor :
+    allowed_calls = sum(executor.map(call_until_limited, range(number_of_threads)))
+  assert allowed_calls == 1000
+
+'''
+  Runs 50 calls that each fail once, and are retried by decorate, alongside a ticker. Returns the results, the seconds taken
+  and the ticks counted. Blocking retries would take 50 retry delays and starve the ticker
+'''
+def run_failing_once_calls_with_ticker(decorate) :
+  failed_once = set()
+  @decorate
+  async def fetch_remote_value(value) :
+    await asyncio.sleep(0.01)
+    if value not in failed_once :
+      failed_once.add(value)
+      raise ConnectionError(f"dropped {value}")
+    return value
+  async def fetch_with_ticker() :
+    ticks = 0
+    async def tick() :
+      nonlocal ticks
+      while True :
+        await asyncio.sleep(0.01)
+        ticks += 1
+    ticker = asyncio.ensure_future(tick())
+    start_timestamp = time.perf_counter()
+    results = await asyncio.gather(*(fetch_remote_value(value) for value in range(50)))
+    elapsed_seconds = time.perf_counter() - start_timestamp
+    ticker.cancel()
+    return results, elapsed_seconds, ticks
+  return asyncio.run(fetch_with_ticker())
+
+@pytest.mark.parametrize('decorate', [dd.retry_on_failure_function_decorator(max_attempts=3, retry_delay=0.2),
+                                      dd.retry_with_backoff_decorator_function(max_attempts=3, base_delay_seconds=0.2, jitter='none')],
+                         ids=['retry_on_failure', 'retry_with_backoff'])
+def test_async_retries_do_not_block_the_event_loop(decorate) :
+  results, elapsed_seconds, ticks = run_failing_once_calls_with_ticker(decorate)
+  assert results == list(range(50))
+  assert elapsed_seconds < 2
+  assert ticks >= 10
@@ -0,0 +1,75 @@
+'''
+  Logging decorators in decorator_designs : records handed to start_queue_logging are written by the listener thread, by
+  the handlers the logger would have reached, at the levels it would have kept
+'''
+import logging
+import threading
+import pytest
+import decorator_designs as dd
+
+class thread_recording_handler(logging.Handler) :
+  def __init__(self) :
+    super().__init__()
+    self.handled = []
+  def emit(self, record) :
+    self.handled.append((record.getMessage(), record.levelname, threading.current_thread().name))
+
+def test_queue_logging_writes_on_the_listener_thread_with_ancestor_handlers() :
+  parent_logger = logging.getLogger('queue_logging_test')
+  child_logger = logging.getLogger('queue_logging_test.child')
+  recording_handler = thread_recording_handler()
+  parent_logger.addHandler(recording_handler)
+  child_logger.setLevel(logging.INFO)
+  try :
+    listener = dd.start_queue_logging(child_logger)
+    assert dd.start_queue_logging(child_logger) is listener
+    assert child_logger.propagate is False
+    child_logger.info('kept at info')
+    child_logger.debug('dropped at debug')
+    dd.stop_queue_logging(child_logger)
+    assert [(message, level) for message, level, _thread_name in recording_handler.handled] == [('kept at info', 'INFO')]
+    assert recording_handler.handled[0][2] != threading.current_thread().name
+    assert child_logger.handlers == [] and child_logger.propagate is True
+    child_logger.info('after stopping')
+    assert recording_handler.handled[-1] == ('after stopping', 'INFO', threading.current_thread().name)
+  finally :
+    parent_logger.removeHandler(recording_handler)
+    child_logger.setLevel(logging.NOTSET)
+
+def test_structured_log_records_carry_call_attributes() :
+  structured_logger = logging.getLogger('structured_logging_test')
+  structured_logger.setLevel(logging.INFO)
+  records = []
+  structured_logger.addFilter(records.append)
+  @dd.structured_log_decorator_function(logger=structured_logger)
+  def add_numbers(x, y) :
+    return x + y
+  assert add_numbers(2, 3) == 5
+  assert [(record.function_name, record.outcome, str(record.call_arguments)) for record in records] == [(add_numbers.__qualname__, 'returned', '2, 3')]
+
+class repr_counting_argument :
+  repr_calls = 0
+  def __repr__(self) :
+    repr_counting_argument.repr_calls += 1
+    return 'argument'
+
+def test_nothing_is_formatted_for_a_disabled_level() :
+  quiet_logger = logging.getLogger('structured_logging_quiet_test')
+  quiet_logger.setLevel(logging.WARNING)
+  @dd.structured_log_decorator_function(logger=quiet_logger)
+  def identity(value) :
+    return value
+  argument = repr_counting_argument()
+  assert identity(argument) is argument
+  assert repr_counting_argument.repr_calls == 0
+
+def test_errors_are_logged_with_their_traceback() :
+  structured_logger = logging.getLogger('structured_logging_error_test')
+  records = []
+  structured_logger.addFilter(records.append)
+  @dd.structured_log_decorator_function(logger=structured_logger)
+  def divide(x, y) :
+    return x / y
+  with pytest.raises(ZeroDivisionError) :
+    divide(1, 0)
+  assert [(record.levelname, record.outcome, record.exc_info[0]) for record in records] == [('ERROR', 'raised', ZeroDivisionError)]
@@ -0,0 +1,41 @@
+'''
+  Deduplication in text_cleaner : the field memo never changes the output, only how often a field is cleaned, and
+  drop_duplicate_rows leaves out repeated rows on every path, across chunk and worker boundaries
+'''
+import pytest
+import TextCleaner
+from test_text_cleaner_engines import demo_settings, mixed_input, clean_to_bytes
+
+memo_paths = [dict(), dict(cleaning_engine='vectorized'), dict(cleaning_engine='csv'), dict(chunk_size_in_rows=2),
+              dict(chunk_size_in_rows=2, workers=2)]
+repeated_rows_input = '"a";"<b>x</b>"\n"b";"y   y"\n"a";"<b>x</b>"\n"c";"z"\n"b";"y   y"\n"a";"<b>x</b>"\n'
+
+def clean_with_report(tmp_path, input_text, **settings) :
+  (tmp_path / 'input.csv').write_text(input_text, encoding='utf-8')
+  cleaner = TextCleaner.text_cleaner(str(tmp_path / 'input.csv'), str(tmp_path / 'output.txt'), **dict(demo_settings, **settings))
+  cleaner.clean_dataframe_to_text_file()
+  return (tmp_path / 'output.txt').read_bytes(), cleaner.deduplication_report()
+
+@pytest.mark.parametrize('settings', memo_paths, ids=repr)
+def test_field_memo_keeps_the_output_and_counts_repeats(tmp_path, settings) :
+  output_bytes, report = clean_with_report(tmp_path, mixed_input * 2, field_memo_max_entries=64, **settings)
+  assert output_bytes == clean_to_bytes(tmp_path, mixed_input * 2, **settings)
+  assert report['field_memo']['hits'] > 0 and report['field_memo']['hits'] + report['field_memo']['misses'] == 48
+  assert report['duplicate_rows'] is None
+
+@pytest.mark.parametrize('settings', memo_paths + [dict(cleaning_engine='csv', chunk_size_in_rows=1, workers=2)], ids=repr)
+def test_duplicate_rows_are_dropped_on_every_path(tmp_path, settings) :
+  output_bytes, report = clean_with_report(tmp_path, repeated_rows_input, drop_duplicate_rows=True, **settings)
+  assert output_bytes == b'"a";"x"\n"b";"y y"\n"c";"z"'
+  assert (report['duplicate_rows']['rows_checked'], report['duplicate_rows']['duplicates_dropped']) == (6, 3)
+  assert report['field_memo'] is None
+
+def test_duplicates_further_back_than_the_tracked_hashes_are_kept(tmp_path) :
+  output_bytes, report = clean_with_report(tmp_path, '"a"\n"a"\n"b"\n"c"\n"a"\n', drop_duplicate_rows=True, max_tracked_row_hashes=2,
+                                           cleaning_engine='csv')
+  assert output_bytes == b'"a"\n"b"\n"c"\n"a"'
+  assert report['duplicate_rows']['tracked_row_hashes'] <= 2
+
+def test_dropping_duplicates_cannot_be_resumed() :
+  with pytest.raises(ValueError, match='resume_partial_output') :
+    TextCleaner.text_cleaner('', '', drop_duplicate_rows=True, resume_partial_output=True)
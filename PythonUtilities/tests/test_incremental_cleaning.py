@@ -0,0 +1,125 @@
+'''
+  Incremental cleaning must write the same bytes a full clean of the input would, whether it skips an unchanged input,
+  appends the cleaned tail of a grown one or cleans it all again
+'''
+import json
+import pytest
+import TextCleaner
+from test_text_cleaner_engines import demo_settings
+
+def clean_incrementally(input_path, output_path, **settings) :
+  cleaner = TextCleaner.text_cleaner(str(input_path), str(output_path), **dict(demo_settings, incremental_cleaning=True, **settings))
+  cleaner.clean_dataframe_to_text_file()
+  return cleaner.last_incremental_action
+
+def clean_in_full(tmp_path, input_text, **settings) :
+  (tmp_path / 'full_input.csv').write_text(input_text, encoding='utf-8')
+  TextCleaner.text_cleaner(str(tmp_path / 'full_input.csv'), str(tmp_path / 'full_output.txt'),
+                           **dict(demo_settings, **settings)).clean_dataframe_to_text_file()
+  return (tmp_path / 'full_output.txt').read_bytes()
+
+@pytest.mark.parametrize('settings', [dict(cleaning_engine='csv'), dict(cleaning_engine='csv', chunk_size_in_rows=1)], ids=repr)
+def test_appended_short_row_is_padded_to_the_input_field_count(tmp_path, settings) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text('"a";"1";"x"\n', encoding='utf-8')
+  assert clean_incrementally(input_path, output_path, **settings) == 'cleaned'
+  with open(input_path, 'a', encoding='utf-8') as input_file :
+    input_file.write('"b";"2"\n"c";"3";"z"\n')
+  assert clean_incrementally(input_path, output_path, **settings) == 'appended'
+  assert output_path.read_bytes() == clean_in_full(tmp_path, input_path.read_text(encoding='utf-8'), **settings)
+  assert output_path.read_bytes() == b'"a";"1";"x"\n"b";"2";""\n"c";"3";"z"'
+
+def test_index_without_field_count_cleans_in_full(tmp_path) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text('"a";"1";"x"\n', encoding='utf-8')
+  clean_incrementally(input_path, output_path, cleaning_engine='csv')
+  index_path = tmp_path / 'output.txt.clean_index.json'
+  clean_index = json.loads(index_path.read_text(encoding='utf-8'))
+  del clean_index['input_field_count']
+  index_path.write_text(json.dumps(clean_index), encoding='utf-8')
+  with open(input_path, 'a', encoding='utf-8') as input_file :
+    input_file.write('"b";"2"\n')
+  assert clean_incrementally(input_path, output_path, cleaning_engine='csv') == 'cleaned'
+  assert output_path.read_bytes() == b'"a";"1";"x"\n"b";"2";""'
+
+incremental_paths = [dict(), dict(cleaning_engine='vectorized'), dict(chunk_size_in_rows=2), dict(cleaning_engine='csv')]
+first_rows = '"a";"5";"<b>bold</b>   text"\n"b";"6";"x"\n'
+appended_rows = '"c";"7";"multi\nline"\n"d";"8";"y"\n'
+
+def append_to(input_path, appended_text) :
+  with open(input_path, 'a', encoding='utf-8', newline='') as input_file :
+    input_file.write(appended_text)
+
+@pytest.mark.parametrize('settings', incremental_paths, ids=repr)
+def test_unchanged_input_is_skipped(tmp_path, settings) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text(first_rows, encoding='utf-8')
+  assert clean_incrementally(input_path, output_path, **settings) == 'cleaned'
+  output_mtime_ns = output_path.stat().st_mtime_ns
+  assert clean_incrementally(input_path, output_path, **settings) == 'skipped'
+  '''Touched but not changed'''
+  input_path.write_text(first_rows, encoding='utf-8')
+  assert clean_incrementally(input_path, output_path, **settings) == 'skipped'
+  assert output_path.stat().st_mtime_ns == output_mtime_ns
+
+@pytest.mark.parametrize('settings', incremental_paths, ids=repr)
+def test_grown_input_has_its_tail_appended(tmp_path, settings) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text(first_rows, encoding='utf-8')
+  clean_incrementally(input_path, output_path, **settings)
+  append_to(input_path, appended_rows)
+  assert clean_incrementally(input_path, output_path, **settings) == 'appended'
+  assert output_path.read_bytes() == clean_in_full(tmp_path, first_rows + appended_rows, **settings)
+  append_to(input_path, '"e";"9";"z"\n')
+  assert clean_incrementally(input_path, output_path, **settings) == 'appended'
+  assert output_path.read_bytes() == clean_in_full(tmp_path, first_rows + appended_rows + '"e";"9";"z"\n', **settings)
+
+@pytest.mark.parametrize('settings', [dict(), dict(chunk_size_in_rows=2), dict(cleaning_engine='csv')], ids=repr)
+def test_appended_overlong_row_is_skipped_as_a_full_clean_would(tmp_path, settings) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text(first_rows, encoding='utf-8')
+  clean_incrementally(input_path, output_path, on_bad_lines='skip', **settings)
+  append_to(input_path, '"c";"7";"x";"extra"\n"d";"8";"y"\n')
+  assert clean_incrementally(input_path, output_path, on_bad_lines='skip', **settings) == 'appended'
+  assert output_path.read_bytes() == clean_in_full(tmp_path, input_path.read_text(encoding='utf-8'), on_bad_lines='skip', **settings)
+
+'''
+  Each change makes the next incremental run clean the whole input again
+'''
+def change_content(input_path, output_path) :
+  input_path.write_text(first_rows.replace('"b"', '"B"') + appended_rows, encoding='utf-8')
+def change_output(input_path, output_path) :
+  append_to(output_path, '\n"tampered"')
+def remove_output(input_path, output_path) :
+  output_path.unlink()
+def change_column_type(input_path, output_path) :
+  append_to(input_path, '"c";"not a number";"x"\n')
+
+@pytest.mark.parametrize('make_change', [change_content, change_output, remove_output, change_column_type],
+                         ids=lambda make_change : make_change.__name__)
+def test_changes_other_than_appending_clean_in_full(tmp_path, make_change) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text(first_rows, encoding='utf-8')
+  clean_incrementally(input_path, output_path)
+  make_change(input_path, output_path)
+  assert clean_incrementally(input_path, output_path) == 'cleaned'
+  assert output_path.read_bytes() == clean_in_full(tmp_path, input_path.read_text(encoding='utf-8'))
+
+def test_tail_not_starting_on_a_new_line_cleans_in_full(tmp_path) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text(first_rows.rstrip('\n'), encoding='utf-8')
+  clean_incrementally(input_path, output_path)
+  append_to(input_path, '\n' + appended_rows)
+  assert clean_incrementally(input_path, output_path) == 'cleaned'
+  assert output_path.read_bytes() == clean_in_full(tmp_path, first_rows + appended_rows)
+
+@pytest.mark.parametrize('changed_settings', [dict(output_file_delimiter='|'), dict(drop_duplicate_rows=True), dict(chunk_size_in_rows=1)], ids=repr)
+def test_other_settings_clean_in_full(tmp_path, changed_settings) :
+  input_path, output_path = tmp_path / 'input.csv', tmp_path / 'output.txt'
+  input_path.write_text(first_rows, encoding='utf-8')
+  clean_incrementally(input_path, output_path)
+  assert clean_incrementally(input_path, output_path, **changed_settings) == 'cleaned'
+  if changed_settings.get('drop_duplicate_rows') :
+    '''Earlier rows are not tracked, so a grown input is cleaned in full too'''
+    append_to(input_path, appended_rows)
+    assert clean_incrementally(input_path, output_path, **changed_settings) == 'cleaned'
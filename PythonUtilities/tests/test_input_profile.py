@@ -0,0 +1,66 @@
+'''
+  Input profiling in text_cleaner : distinct counts stay within the HyperLogLog error and merge exactly across processes,
+  and a profile counts records, blank, padded and bad lines, null tokens, empty fields and metatags as read, the same
+  whether taken on its own, while cleaning or across worker processes
+'''
+import warnings
+import pytest
+import TextCleaner
+from test_text_cleaner_engines import demo_settings
+
+@pytest.mark.parametrize('distinct_count', [1, 10, 1000, 100000])
+def test_distinct_count_estimates_stay_within_the_expected_error(distinct_count) :
+  distinct_counter = TextCleaner.approximate_distinct_counter(precision=12)
+  distinct_counter.add_all(f"value {number}" for number in range(distinct_count))
+  '''Adding them again changes nothing'''
+  distinct_counter.add_all(f"value {number}" for number in range(distinct_count))
+  assert distinct_counter.estimate() == pytest.approx(distinct_count, rel=0.05, abs=1)
+
+def test_merged_counters_equal_one_counter_of_everything() :
+  first_half, second_half, everything = (TextCleaner.approximate_distinct_counter(precision=10) for _counter in range(3))
+  first_half.add_all(str(number) for number in range(0, 5000))
+  second_half.add_all(str(number) for number in range(2500, 10000))
+  everything.add_all(str(number) for number in range(10000))
+  first_half.merge(bytes(second_half.registers))
+  assert first_half.registers == everything.registers
+  with pytest.raises(ValueError) :
+    TextCleaner.approximate_distinct_counter(precision=17)
+
+profiled_input = '"a";"<b>x</b>";"NULL"\n\n"b";"";"y"\n"c";"z"\n"d";"1";"2";"3"\n"a";"<i>q</i><p>";"null"\n'
+
+def build_cleaner(tmp_path, **settings) :
+  (tmp_path / 'input.csv').write_text(profiled_input, encoding='utf-8')
+  return TextCleaner.text_cleaner(str(tmp_path / 'input.csv'), str(tmp_path / 'output.txt'), **dict(demo_settings, **settings))
+
+def without_input_path(report) :
+  return dict(report, input_path=None)
+
+def test_profile_counts_what_the_csv_reader_read(tmp_path) :
+  with pytest.warns(UserWarning, match='Skipping line 5') :
+    report = build_cleaner(tmp_path, cleaning_engine='csv').profile_input_file()
+  assert (report['records'], report['blank_lines'], report['padded_records'], report['bad_lines']) == (4, 1, 1, 1)
+  assert report['field_count_counts'] == {2 : 1, 3 : 3}
+  id_column, text_column, flag_column = report['columns']
+  assert (id_column['fields'], id_column['approximate_distinct_values']) == (4, 3)
+  assert (text_column['empty_fields'], text_column['fields_with_metatags'], text_column['metatags'], text_column['max_field_length']) == (1, 2, 5, 11)
+  assert text_column['length_histogram'] == {'0' : 1, '1' : 1, '8-15' : 2}
+  assert flag_column['null_token_counts'] == {'NULL' : 1, 'null' : 1}
+
+@pytest.mark.parametrize('settings', [dict(cleaning_engine='csv'), dict(cleaning_engine='csv', chunk_size_in_rows=1, workers=2),
+                                      dict(cleaning_engine='csv', input_reader='mmap', chunk_size_in_rows=2, workers=2)], ids=repr)
+def test_profile_while_cleaning_matches_the_profile_on_its_own(tmp_path, settings) :
+  with warnings.catch_warnings() :
+    warnings.simplefilter('ignore')
+    profile_on_its_own = build_cleaner(tmp_path, cleaning_engine='csv').profile_input_file()
+    cleaner = build_cleaner(tmp_path, profile_input=True, **settings)
+    cleaner.clean_dataframe_to_text_file()
+  assert without_input_path(cleaner.input_profile_report()) == without_input_path(profile_on_its_own)
+
+def test_dataframe_engines_profile_what_pandas_read(tmp_path) :
+  with warnings.catch_warnings() :
+    warnings.simplefilter('ignore')
+    cleaner = build_cleaner(tmp_path, profile_input=True)
+    cleaner.clean_dataframe_to_text_file()
+  report = cleaner.input_profile_report()
+  assert (report['input_parsers'], report['records'], report['bad_lines']) == (['pandas'], 4, 0)
+  assert report['columns'][2]['null_token_counts'] == {'nan' : 2}
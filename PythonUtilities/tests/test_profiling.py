@@ -0,0 +1,54 @@
+'''
+  Hot path profiling in decorator_designs : every duration lands in the histogram bucket whose bounds hold it, percentiles
+  come out within a bucket's width of the exact ones, and the decorator samples, names and resets through its registry
+'''
+import json
+import asyncio
+import pytest
+import decorator_designs as dd
+
+def test_each_duration_lands_in_the_bucket_holding_it() :
+  for duration_ns in list(range(0, 300)) + [2**power + offset for power in range(9, 62) for offset in (-1, 0, 1)] :
+    histogram = dd.latency_histogram('bucket_check')
+    histogram.record(duration_ns)
+    bucket_index = histogram.bucket_counts.index(1)
+    lower_bound, upper_bound = histogram.bucket_bounds(bucket_index)
+    assert lower_bound <= duration_ns < upper_bound
+    assert upper_bound - lower_bound <= max(1, lower_bound // 4)
+
+def test_statistics_summarize_the_recorded_durations() :
+  histogram = dd.latency_histogram('statistics_check')
+  for duration_ns in range(1, 10001) :
+    histogram.record(duration_ns)
+  statistics = histogram.statistics()
+  assert (statistics['count'], statistics['total_ns'], statistics['min_ns'], statistics['max_ns']) == (10000, 50005000, 1, 10000)
+  assert statistics['mean_ns'] == pytest.approx(5000.5)
+  for percentile_name, exact_ns in (('p50_ns', 5000), ('p95_ns', 9500), ('p99_ns', 9900)) :
+    assert statistics[percentile_name] == pytest.approx(exact_ns, rel=0.25)
+  histogram.reset()
+  assert histogram.statistics()['count'] == 0 and histogram.statistics()['p50_ns'] is None
+
+def test_decorator_samples_into_its_registry(tmp_path) :
+  registry = dd.profiling_registry()
+  @dd.profile_hot_path_decorator_function(registry=registry, sample_every_n_calls=3)
+  def add_numbers(x, y) :
+    return x + y
+  @dd.profile_hot_path_decorator_function(registry=registry, name='fetch')
+  async def fetch_value(value) :
+    await asyncio.sleep(0)
+    return value
+  assert [add_numbers(number, 1) for number in range(9)] == list(range(1, 10))
+  assert asyncio.run(fetch_value(5)) == 5
+  statistics_by_name = {statistics['name'] : statistics for statistics in registry.snapshot()}
+  add_statistics = statistics_by_name[f"{add_numbers.__module__}.{add_numbers.__qualname__}"]
+  assert (add_statistics['count'], add_statistics['estimated_calls']) == (3, 9)
+  assert statistics_by_name['fetch']['count'] == 1
+  logged_lines = []
+  registry.dump(logged_lines.append)
+  assert len(logged_lines) == 2
+  registry.export_json(str(tmp_path / 'profile.json'))
+  assert len(json.loads((tmp_path / 'profile.json').read_text(encoding='utf-8'))) == 2
+  registry.reset()
+  for _call_number in range(3) :
+    add_numbers(1, 1)
+  assert add_numbers.latency_histogram.statistics()['count'] == 1
@@ -0,0 +1,68 @@
+'''
+  Rate limiter engines of decorator_designs, on a manual clock : the fixed window resets all at once, the sliding window
+  never holds more than its limit in any span of the period, the token bucket refills smoothly up to its burst size,
+  and every key is limited on its own
+'''
+import asyncio
+import pytest
+import decorator_designs as dd
+
+class manual_clock :
+  def __init__(self) :
+    self.current_time = 0.0
+  def __call__(self) :
+    return self.current_time
+
+def take_calls(limiter, number_of_calls, key=None) :
+  return [limiter.try_acquire(key) == 0 for _call_number in range(number_of_calls)]
+
+def test_fixed_window_resets_when_the_window_ends() :
+  clock = manual_clock()
+  limiter = dd.fixed_window_rate_limiter(max_allowed_calls=2, reset_period_seconds=10, clock=clock)
+  assert take_calls(limiter, 3) == [True, True, False]
+  clock.current_time = 4
+  assert limiter.try_acquire() == pytest.approx(6)
+  clock.current_time = 10.5
+  assert take_calls(limiter, 3) == [True, True, False]
+
+def test_sliding_window_frees_each_call_one_period_after_it() :
+  clock = manual_clock()
+  limiter = dd.sliding_window_rate_limiter(max_allowed_calls=2, reset_period_seconds=10, clock=clock)
+  assert take_calls(limiter, 1) == [True]
+  clock.current_time = 6
+  assert take_calls(limiter, 2) == [True, False]
+  clock.current_time = 10
+  assert take_calls(limiter, 2) == [True, False]
+  assert limiter.try_acquire() == pytest.approx(6)
+
+def test_token_bucket_refills_smoothly_up_to_its_burst_size() :
+  clock = manual_clock()
+  limiter = dd.token_bucket_rate_limiter(max_allowed_calls=2, reset_period_seconds=1, burst_size=4, clock=clock)
+  assert take_calls(limiter, 5) == [True, True, True, True, False]
+  clock.current_time = 0.5
+  assert take_calls(limiter, 2) == [True, False]
+  assert limiter.try_acquire() == pytest.approx(0.5)
+  clock.current_time = 100
+  assert take_calls(limiter, 5) == [True, True, True, True, False]
+
+@pytest.mark.parametrize('engine', sorted(dd.rate_limiter_engines))
+def test_keys_are_limited_separately(engine) :
+  limiter = dd.rate_limiter_engines[engine](max_allowed_calls=1, reset_period_seconds=10, clock=manual_clock())
+  assert take_calls(limiter, 2, 'orders') == [True, False]
+  assert take_calls(limiter, 2, 'customers') == [True, False]
+
+def test_non_blocking_decorator_raises_past_the_limit() :
+  @dd.rate_limit_function_decorator(max_allowed_calls=2, reset_period_seconds=10**7, key_function=lambda endpoint : endpoint)
+  def call_api(endpoint) :
+    return endpoint
+  assert [call_api('orders'), call_api('orders'), call_api('customers')] == ['orders', 'orders', 'customers']
+  with pytest.raises(Exception, match='Rate limit of 2 calls per') :
+    call_api('orders')
+
+@pytest.mark.parametrize('engine', sorted(dd.rate_limiter_engines))
+def test_blocking_acquire_waits_for_the_next_call(engine) :
+  limiter = dd.rate_limiter_engines[engine](max_allowed_calls=1, reset_period_seconds=0.2)
+  assert limiter.acquire() and limiter.acquire()
+  assert asyncio.run(limiter.acquire_async())
+  with pytest.raises(Exception, match='Rate limit') :
+    limiter.acquire(timeout=0.001)
@@ -0,0 +1,111 @@
+'''
+  bounded_results_cache of decorator_designs, on a manual clock : least recently used entries go first past max_entries
+  or max_total_size, entries expire after their time to live (on lookup or by the sweep) and are served as stale for the
+  grace period. With single flight, concurrent misses of one key compute it once
+'''
+import time
+import asyncio
+import threading
+import concurrent.futures
+import pytest
+import decorator_designs as dd
+
+class manual_clock :
+  def __init__(self) :
+    self.current_time = 0.0
+  def __call__(self) :
+    return self.current_time
+
+def test_least_recently_used_entry_is_evicted_past_max_entries() :
+  results_cache = dd.bounded_results_cache(max_entries=2)
+  results_cache.store('a', 1)
+  results_cache.store('b', 2)
+  assert results_cache.lookup('a') == (True, 1)
+  results_cache.store('c', 3)
+  assert results_cache.lookup('b') == (False, None)
+  assert results_cache.lookup('a') == (True, 1) and results_cache.lookup('c') == (True, 3)
+  cache_info = results_cache.cache_info()
+  assert (cache_info.hits, cache_info.misses, cache_info.evictions, cache_info.current_entries) == (3, 1, 1, 2)
+
+def test_entries_are_evicted_past_max_total_size() :
+  results_cache = dd.bounded_results_cache(max_entries=None, max_total_size=10, size_of_value=len)
+  results_cache.store('a', 'x' * 4)
+  results_cache.store('b', 'x' * 4)
+  results_cache.store('c', 'x' * 4)
+  assert [results_cache.lookup(key)[0] for key in 'abc'] == [False, True, True]
+  assert results_cache.cache_info().current_size == 8
+  results_cache.store('d', 'x' * 11)
+  assert results_cache.lookup('d') == (False, None)
+  assert results_cache.cache_info().current_size == 8
+
+def test_entries_expire_on_lookup_and_by_the_sweep() :
+  clock = manual_clock()
+  results_cache = dd.bounded_results_cache(time_to_live_seconds=10, sweep_interval_seconds=5, clock=clock)
+  results_cache.store('looked_up', 1)
+  results_cache.store('swept', 2)
+  clock.current_time = 10
+  assert results_cache.lookup('looked_up') == (False, None)
+  assert results_cache.cache_info().expirations == 2
+  assert len(results_cache) == 0
+
+def test_stale_entries_are_served_for_the_grace_period() :
+  clock = manual_clock()
+  results_cache = dd.bounded_results_cache(time_to_live_seconds=10, stale_grace_seconds=5, clock=clock)
+  results_cache.store('a', 1)
+  clock.current_time = 12
+  assert results_cache.lookup_entry('a') == (True, 1, True)
+  assert results_cache.lookup('a') == (False, None)
+  clock.current_time = 15
+  assert results_cache.lookup_entry('a') == (False, None, False)
+  cache_info = results_cache.cache_info()
+  assert (cache_info.stale_hits, cache_info.expirations) == (2, 1)
+
+@pytest.mark.parametrize('limits', [dict(max_entries=0), dict(time_to_live_seconds=0)], ids=repr)
+def test_invalid_limits_are_rejected(limits) :
+  with pytest.raises(ValueError) :
+    dd.bounded_results_cache(**limits)
+
+def test_concurrent_misses_compute_once_with_single_flight() :
+  release_computation = threading.Event()
+  computations = []
+  @dd.cached_results_decorator_function_with_expiration_time(expiry_time_seconds=60, single_flight=True)
+  def expensive_square(x) :
+    computations.append(x)
+    release_computation.wait(5)
+    return x * x
+  with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor :
+    pending_results = [executor.submit(expensive_square, 7) for _call_number in range(16)]
+    time.sleep(0.1)
+    release_computation.set()
+    assert [pending_result.result() for pending_result in pending_results] == [49] * 16
+  assert computations == [7]
+
+def test_concurrent_async_misses_compute_once_with_single_flight() :
+  computations = []
+  @dd.cached_results_decorator_function_with_expiration_time(expiry_time_seconds=60, single_flight=True)
+  async def expensive_square(x) :
+    computations.append(x)
+    await asyncio.sleep(0.05)
+    return x * x
+  async def call_concurrently() :
+    return await asyncio.gather(*(expensive_square(7) for _call_number in range(16)))
+  assert asyncio.run(call_concurrently()) == [49] * 16
+  assert computations == [7]
+
+def test_stale_result_is_served_while_one_background_call_refreshes_it() :
+  clock = manual_clock()
+  results_cache = dd.bounded_results_cache(time_to_live_seconds=10, stale_grace_seconds=5, clock=clock)
+  computations = []
+  def read_version() :
+    computations.append(len(computations))
+    return len(computations)
+  cached_read_version = dd.wrap_with_results_cache(read_version, results_cache, single_flight=True)
+  assert cached_read_version() == 1
+  clock.current_time = 12
+  assert cached_read_version() == 1
+  for _poll_number in range(100) :
+    if results_cache.lookup(()) == (True, 2) :
+      break
+    time.sleep(0.01)
+  assert cached_read_version() == 2
+  assert computations == [0, 1]
@@ -0,0 +1,76 @@
+'''
+  retry_policy and circuit_breaker of decorator_designs, on a manual clock : delays follow the jitter mode within its
+  bounds, and the breaker opens, half opens and closes on the calls that say something about the dependency
+'''
+import random
+import pytest
+import decorator_designs as dd
+
+class manual_clock :
+  def __init__(self) :
+    self.current_time = 0.0
+  def __call__(self) :
+    return self.current_time
+
+def test_non_retryable_error_frees_the_trial_call_without_closing() :
+  clock = manual_clock()
+  breaker = dd.circuit_breaker(failure_threshold=1, recovery_timeout_seconds=10, clock=clock)
+  policy = dd.retry_policy(max_attempts=1, retry_on=(ConnectionError,), breaker=breaker, clock=clock)
+  def call_raising(error) :
+    raise error
+  with pytest.raises(dd.retry_exhausted_error) :
+    policy.call(call_raising, ConnectionError('down'))
+  assert breaker.breaker_info()['state'] == 'open'
+  clock.current_time = 10
+  with pytest.raises(ValueError) :
+    policy.call(call_raising, ValueError('bad argument'))
+  assert breaker.breaker_info() == {'state' : 'half_open', 'consecutive_failures' : 1, 'failure_threshold' : 1}
+  assert policy.call(lambda : 'recovered') == 'recovered'
+  assert breaker.breaker_info()['state'] == 'closed'
+
+@pytest.mark.parametrize('jitter', dd.retry_policy.jitter_modes)
+def test_delays_stay_within_the_bounds_of_their_jitter_mode(jitter) :
+  policy = dd.retry_policy(base_delay_seconds=1, max_delay_seconds=20, multiplier=2, jitter=jitter, random_source=random.Random(7))
+  previous_delay = 1
+  for draw_number in range(2000) :
+    retry_index = draw_number % 8
+    backoff = min(20, 2 ** retry_index)
+    delay = policy.next_delay(retry_index, previous_delay)
+    lower_bound, upper_bound = {'none' : (backoff, backoff), 'full' : (0, backoff), 'equal' : (backoff / 2, backoff),
+                                'decorrelated' : (1, min(20, max(1, previous_delay * 3)))}[jitter]
+    assert lower_bound <= delay <= upper_bound
+    previous_delay = delay
+
+def test_retries_stop_before_passing_the_deadline() :
+  clock = manual_clock()
+  sleeps = []
+  policy = dd.retry_policy(max_attempts=10, base_delay_seconds=1, multiplier=2, jitter='none', deadline_seconds=10, clock=clock)
+  attempts = policy.attempt_schedule('always_failing')
+  next(attempts)
+  with pytest.raises(dd.retry_exhausted_error) as raised :
+    while True :
+      retry_delay = attempts.send(ConnectionError('down'))
+      sleeps.append(retry_delay)
+      clock.current_time += retry_delay
+      next(attempts)
+  assert sleeps == [1, 2, 4]
+  assert raised.value.attempts_made == 4 and isinstance(raised.value.__cause__, ConnectionError)
+
+def test_breaker_opens_fails_fast_and_reopens_on_a_failed_trial() :
+  clock = manual_clock()
+  breaker = dd.circuit_breaker(failure_threshold=2, recovery_timeout_seconds=10, clock=clock)
+  for _failure_number in range(2) :
+    breaker.before_call()
+    breaker.record_failure()
+  with pytest.raises(dd.circuit_open_error) :
+    breaker.before_call()
+  clock.current_time = 10
+  breaker.before_call()
+  with pytest.raises(dd.circuit_open_error, match='trial call') :
+    breaker.before_call()
+  breaker.record_failure()
+  assert breaker.breaker_info()['state'] == 'open'
+  clock.current_time = 20
+  breaker.before_call()
+  breaker.record_success()
+  assert breaker.breaker_info() == {'state' : 'closed', 'consecutive_failures' : 0, 'failure_threshold' : 2}
@@ -0,0 +1,104 @@
+'''
+  scheduled_job_runner on real time with short intervals : fixed rate runs keep to their schedule without drifting, the
+  overlap policies skip, queue or allow a run coming due during the last one, fixed delay runs wait out the interval
+  after each run, and slots passed while far behind are counted as missed rather than run
+'''
+import time
+import threading
+import pytest
+import scheduled_job_runner as sjr
+
+'''
+  Job function recording the clock at each start and the most runs seen going at once
+'''
+class recording_job :
+  def __init__(self, run_seconds=0) :
+    self.run_seconds = run_seconds
+    self.job_lock = threading.Lock()
+    self.start_times = []
+    self.end_times = []
+    self.running = self.max_running = 0
+
+  def __call__(self) :
+    with self.job_lock :
+      self.start_times.append(time.monotonic())
+      self.running += 1
+      self.max_running = max(self.max_running, self.running)
+    time.sleep(self.run_seconds)
+    with self.job_lock :
+      self.running -= 1
+      self.end_times.append(time.monotonic())
+
+def run_for(job_runner, seconds) :
+  with job_runner :
+    time.sleep(seconds)
+  return {job_metrics['name'] : job_metrics for job_metrics in job_runner.job_metrics()}
+
+def test_fixed_rate_runs_do_not_drift() :
+  job_runner = sjr.scheduled_job_runner(function_to_log_with=None)
+  fast_job = recording_job(run_seconds=0.01)
+  job_runner.schedule(fast_job, 0.05, name='fast')
+  job_metrics = run_for(job_runner, 0.52)['fast']
+  assert 9 <= job_metrics['runs'] <= 11
+  first_start = fast_job.start_times[0]
+  for run_number, start_time in enumerate(fast_job.start_times) :
+    assert start_time - first_start == pytest.approx(run_number * 0.05, abs=0.03)
+  assert job_metrics['skipped_runs'] == job_metrics['missed_runs'] == 0
+
+@pytest.mark.parametrize('overlap, max_running', [('skip', 1), ('queue', 1), ('allow', 3)])
+def test_overlap_policies(overlap, max_running) :
+  job_runner = sjr.scheduled_job_runner(max_workers=4, function_to_log_with=None)
+  slow_job = recording_job(run_seconds=0.25)
+  job_runner.schedule(slow_job, 0.1, name='slow', overlap=overlap)
+  job_metrics = run_for(job_runner, 0.55)['slow']
+  assert slow_job.max_running == max_running
+  if overlap == 'skip' :
+    assert job_metrics['skipped_runs'] >= 2
+    assert len(slow_job.start_times) == 2
+  elif overlap == 'queue' :
+    '''Each queued run starts as the one before finishes'''
+    assert len(slow_job.start_times) == 3
+    for end_time, next_start_time in zip(slow_job.end_times, slow_job.start_times[1:]) :
+      assert next_start_time - end_time == pytest.approx(0, abs=0.03)
+  else :
+    assert len(slow_job.start_times) >= 5
+    assert job_metrics['skipped_runs'] == 0
+
+def test_fixed_delay_waits_the_interval_after_each_run() :
+  job_runner = sjr.scheduled_job_runner(function_to_log_with=None)
+  delayed_job = recording_job(run_seconds=0.05)
+  job_runner.schedule(delayed_job, 0.05, name='delayed', mode='fixed_delay')
+  run_for(job_runner, 0.45)
+  assert 3 <= len(delayed_job.start_times) <= 5
+  for end_time, next_start_time in zip(delayed_job.end_times, delayed_job.start_times[1:]) :
+    assert next_start_time - end_time >= 0.045
+
+def test_slots_passed_while_behind_are_missed_not_run() :
+  clock_offset = [0.0]
+  job_runner = sjr.scheduled_job_runner(function_to_log_with=None, clock=lambda : time.monotonic() + clock_offset[0])
+  job = recording_job()
+  job_runner.schedule(job, 0.1, name='behind', first_run_delay_seconds=0.05)
+  with job_runner :
+    time.sleep(0.02)
+    clock_offset[0] = 1.025
+    time.sleep(0.1)
+  job_metrics = {job_metrics['name'] : job_metrics for job_metrics in job_runner.job_metrics()}['behind']
+  assert job_metrics['missed_runs'] == 10
+  assert job_metrics['runs'] == len(job.start_times) <= 2
+
+def test_job_is_cancelled_after_max_consecutive_failures() :
+  logged_lines = []
+  job_runner = sjr.scheduled_job_runner(function_to_log_with=logged_lines.append)
+  def failing_job() :
+    raise ConnectionError('down')
+  job = job_runner.schedule(failing_job, 0.02, max_consecutive_failures=3)
+  job_metrics = run_for(job_runner, 0.2)[job.name]
+  assert (job_metrics['runs'], job_metrics['failures'], job_metrics['cancelled']) == (3, 3, True)
+  assert job_metrics['last_error'] == "ConnectionError('down')"
+  assert logged_lines[-1].endswith('cancelled after 3 failures in a row')
+
+@pytest.mark.parametrize('schedule_arguments', [dict(interval_seconds=0), dict(interval_seconds=1, mode='cron'),
+                                                dict(interval_seconds=1, overlap='replace')], ids=repr)
+def test_invalid_schedules_are_rejected(schedule_arguments) :
+  with pytest.raises(ValueError) :
+    sjr.scheduled_job_runner().schedule(lambda : None, **schedule_arguments)
@@ -0,0 +1,67 @@
+'''
+  sqlite_connection_pool of decorator_designs : connections are reused, never more than max_connections are open, an
+  error rolls back and a broken connection is replaced, and pools are shared per database path
+'''
+import sqlite3
+import threading
+import pytest
+import decorator_designs as dd
+
+def test_connections_are_reused_and_commit_on_success(tmp_path) :
+  connection_pool = dd.sqlite_connection_pool(str(tmp_path / 'pool.db'))
+  with connection_pool.connection() as connection :
+    connection.execute("create table numbers (number integer)")
+    connection.execute("insert into numbers values (1)")
+  with connection_pool.connection() as same_connection :
+    assert same_connection is connection
+    assert same_connection.execute("select number from numbers").fetchall() == [(1,)]
+  assert connection_pool.pool_info()['open_connections'] == connection_pool.pool_info()['idle_connections'] == 1
+  connection_pool.close()
+
+def test_an_error_rolls_back_and_a_broken_connection_is_replaced(tmp_path) :
+  connection_pool = dd.sqlite_connection_pool(str(tmp_path / 'pool.db'))
+  with connection_pool.connection() as connection :
+    connection.execute("create table numbers (number integer)")
+  with pytest.raises(ZeroDivisionError) :
+    with connection_pool.connection() as connection :
+      connection.execute("insert into numbers values (1)")
+      1 / 0
+  with connection_pool.connection() as connection :
+    assert connection.execute("select count(*) from numbers").fetchone() == (0,)
+  '''Broken while idle in the pool'''
+  connection.close()
+  with connection_pool.connection() as new_connection :
+    assert new_connection is not connection
+    assert new_connection.execute("select count(*) from numbers").fetchone() == (0,)
+  assert connection_pool.pool_info()['discarded_connections'] == 1
+  connection_pool.close()
+
+def test_checkouts_past_max_connections_wait_for_a_checkin(tmp_path) :
+  connection_pool = dd.sqlite_connection_pool(str(tmp_path / 'pool.db'), max_connections=1, checkout_timeout_seconds=0.05)
+  connection = connection_pool.checkout()
+  with pytest.raises(Exception, match='was free within') :
+    connection_pool.checkout()
+  threading.Timer(0.02, connection_pool.checkin, (connection,)).start()
+  connection_pool.checkout_timeout_seconds = 5
+  assert connection_pool.checkout() is connection
+  connection_pool.checkin(connection)
+  connection_pool.close()
+  with pytest.raises(Exception, match='is closed') :
+    connection_pool.checkout()
+
+def test_decorated_functions_share_the_pool_of_their_database(tmp_path) :
+  database_path = str(tmp_path / 'shared.db')
+  @dd.pooled_sqlite_connection_decorator(database_path, max_connections=2)
+  def create_table(connection) :
+    connection.execute("create table numbers (number integer)")
+  @dd.pooled_sqlite_connection_decorator(database_path)
+  def insert_number(connection, number) :
+    connection.execute("insert into numbers values (?)", (number,))
+    return number
+  create_table()
+  assert [insert_number(number) for number in range(3)] == [0, 1, 2]
+  connection_pool = dd.get_sqlite_connection_pool(database_path)
+  with connection_pool.connection() as connection :
+    assert connection.execute("select count(*) from numbers").fetchone() == (3,)
+  assert connection_pool.pool_info()['max_connections'] == 2
+  connection_pool.close()
@@ -0,0 +1,66 @@
+'''
+  The SQLite results cache backend of decorator_designs : results outlive the decorated function, expire on the wall clock
+  given, stay within max_entries, and calls the cache cannot key on run uncached rather than fail
+'''
+import threading
+import pytest
+import decorator_designs as dd
+
+@pytest.mark.parametrize('unpicklable_arguments', [((threading.Lock(),), {}), ((), {'transform' : lambda value : value})],
+                         ids=['lock', 'lambda'])
+def test_unpicklable_arguments_run_uncached(tmp_path, unpicklable_arguments) :
+  args, kwargs = unpicklable_arguments
+  calls = []
+  @dd.cached_results_decorator_function(backend=str(tmp_path / 'cache.db'))
+  def count_call(*args, **kwargs) :
+    calls.append(len(calls))
+    return 'computed'
+  assert count_call(*args, **kwargs) == count_call(*args, **kwargs) == 'computed'
+  assert calls == [0, 1]
+  cache_info = count_call.cache_info()
+  assert (cache_info.hits, cache_info.misses, cache_info.current_entries) == (0, 0, 0)
+  assert count_call(1) == count_call(1) == 'computed'
+  assert count_call.cache_info().hits == 1
+
+class manual_clock :
+  def __init__(self) :
+    self.current_time = 1000.0
+  def __call__(self) :
+    return self.current_time
+
+def test_results_outlive_the_decorated_function(tmp_path) :
+  database_path = str(tmp_path / 'cache.db')
+  calls = []
+  def build_square_function() :
+    def square_number(x) :
+      calls.append(x)
+      return {'square' : x * x, 'padding' : 'x' * 10000}
+    return dd.cached_results_decorator_function(square_number, backend=database_path)
+  assert build_square_function()(4)['square'] == 16
+  restarted_square_number = build_square_function()
+  assert restarted_square_number(4)['square'] == 16
+  assert calls == [4]
+  assert restarted_square_number.cache_info().hits == 1
+
+def test_entries_expire_and_are_trimmed_to_max_entries(tmp_path) :
+  clock = manual_clock()
+  results_cache = dd.sqlite_results_cache(str(tmp_path / 'cache.db'), 'namespace', max_entries=2, time_to_live_seconds=10,
+                                          stale_grace_seconds=5, clock=clock)
+  for key_number in range(3) :
+    clock.current_time += 1
+    results_cache.store(results_cache.build_stored_key(key_number), key_number)
+  assert [results_cache.lookup(results_cache.build_stored_key(key_number)) for key_number in range(3)] == [(False, None), (True, 1), (True, 2)]
+  clock.current_time += 10
+  assert results_cache.lookup_entry(results_cache.build_stored_key(2)) == (True, 2, True)
+  clock.current_time += 5
+  assert results_cache.lookup_entry(results_cache.build_stored_key(2)) == (False, None, False)
+  cache_info = results_cache.cache_info()
+  assert (cache_info.evictions, cache_info.expirations, cache_info.stale_hits) == (1, 1, 1)
+
+def test_namespaces_are_kept_apart(tmp_path) :
+  first_cache = dd.sqlite_results_cache(str(tmp_path / 'cache.db'), 'first')
+  second_cache = dd.sqlite_results_cache(str(tmp_path / 'cache.db'), 'second')
+  first_cache.store(first_cache.build_stored_key('key'), 'first value')
+  assert second_cache.lookup(second_cache.build_stored_key('key')) == (False, None)
+  first_cache.cache_clear()
+  assert first_cache.cache_info().current_entries == 0
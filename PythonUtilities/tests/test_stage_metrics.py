@@ -0,0 +1,43 @@
+'''
+  Stage metrics of text_cleaner : every cleaning path (worker processes included) counts the rows it cleaned and wrote,
+  the bytes read and written and the time spent in each pipeline stage, and progress_callback hears about it
+'''
+import pytest
+import TextCleaner
+from test_text_cleaner_engines import demo_settings, mixed_input
+
+pipeline_stages = {'read_input', 'clean_batch', 'field_replacements', 'metatag_removal', 'string_notation', 'whitespace_collapse', 'write_output'}
+
+def build_cleaner(tmp_path, **settings) :
+  (tmp_path / 'input.csv').write_text(mixed_input, encoding='utf-8')
+  return TextCleaner.text_cleaner(str(tmp_path / 'input.csv'), str(tmp_path / 'output.txt'), **dict(demo_settings, **settings))
+
+@pytest.mark.parametrize('settings', [dict(), dict(cleaning_engine='vectorized'), dict(cleaning_engine='csv'),
+                                      dict(chunk_size_in_rows=2), dict(chunk_size_in_rows=2, workers=2),
+                                      dict(cleaning_engine='csv', chunk_size_in_rows=2, workers=2)], ids=repr)
+def test_every_path_reports_rows_bytes_and_stages(tmp_path, settings) :
+  cleaner = build_cleaner(tmp_path, collect_stage_metrics=True, **settings)
+  cleaner.clean_dataframe_to_text_file()
+  report = cleaner.stage_metrics_report()
+  assert (report['rows_cleaned'], report['rows_written']) == (6, 6)
+  assert report['input_bytes'] == (tmp_path / 'input.csv').stat().st_size
+  assert report['output_bytes_written'] == (tmp_path / 'output.txt').stat().st_size
+  assert pipeline_stages <= set(report['stages'])
+  assert all(stage['calls'] >= 1 and stage['seconds'] >= 0 for stage in report['stages'].values())
+  assert report['peak_memory_bytes'] > 0
+
+def test_progress_callback_collects_metrics_and_hears_the_finish(tmp_path) :
+  reports = []
+  cleaner = build_cleaner(tmp_path, progress_callback=reports.append, progress_interval_seconds=0, chunk_size_in_rows=1)
+  cleaner.clean_dataframe_to_text_file()
+  assert [report['event'] for report in reports][-1] == 'finished'
+  assert {report['event'] for report in reports[:-1]} <= {'progress'}
+  assert reports[-1]['rows_written'] == 6
+
+def test_metrics_are_off_by_default_and_start_over_on_reset(tmp_path) :
+  assert build_cleaner(tmp_path).stage_metrics_report() is None
+  cleaner = build_cleaner(tmp_path, collect_stage_metrics=True)
+  cleaner.clean_dataframe_to_text_file()
+  cleaner.reset_stage_metrics()
+  report = cleaner.stage_metrics_report()
+  assert (report['rows_cleaned'], report['stages']) == (0, {})
@@ -0,0 +1,101 @@
+'''
+  Every cleaning path of text_cleaner must write the same bytes. The row loop engine on the whole file is the reference
+  the vectorized engine, chunked reads, worker processes and (on text only inputs, where no type inference happens)
+  the csv engine are compared against
+'''
+import contextlib
+import pytest
+import TextCleaner
+
+null_map = {'""' : '""', "''" : "''"}
+# The demo settings of TextCleaner.py
+demo_settings = dict(input_file_delimiter=';', output_file_delimiter=';', na_values=["NULL", "null"], keep_default_na=False,
+                     empty_string_map=null_map, not_null_map=null_map, additional_field_map={"\\N" : '""'})
+
+# NULLs in a numeric column (read as floats by pandas), a short row, quotes, metatags, a multi line field and whitespace runs
+mixed_input = ('"a";"5";"<b>bold</b>   text";"x"\n'
+               '"b";"NULL";"He said ""hi""";"y"\n'
+               '"c";"7";"multi\nline\tvalue";"\\N"\n'
+               '"d";"8.5";"<p>para</p><br>";"z"\n'
+               '"e";"9"\n'
+               '"f";"10";"  spaced   out  ";"w"\n')
+
+# As above with no numeric column, so the csv engine (which keeps text as written) must match the dataframe engines too
+text_input = ('"id a";"<b>bold</b>   text";"x"\n'
+              '"id b";"NULL";"He said ""hi"""\n'
+              '"id c";"multi\nline\tvalue";"\\N"\n'
+              '"id d";"";"<a<b>>nested"\n'
+              '"id e";"tail"\n'
+              '"id f";"  spaced   out  ";"null"\n')
+
+def clean_to_bytes(tmp_path, input_text, **settings) :
+  input_path = tmp_path / 'input.csv'
+  output_path = tmp_path / 'output.txt'
+  input_path.write_text(input_text, encoding='utf-8')
+  if output_path.exists() :
+    output_path.unlink()
+  TextCleaner.text_cleaner(str(input_path), str(output_path), **dict(demo_settings, **settings)).clean_dataframe_to_text_file()
+  return output_path.read_bytes()
+
+dataframe_paths = [dict(cleaning_engine='vectorized'),
+                   dict(chunk_size_in_rows=1),
+                   dict(chunk_size_in_rows=2),
+                   dict(chunk_size_in_rows=1, cleaning_engine='vectorized'),
+                   dict(chunk_size_in_rows=2, workers=2),
+                   dict(cleaning_engine='vectorized', workers=2)]
+
+csv_paths = [dict(cleaning_engine='csv'),
+             dict(cleaning_engine='csv', chunk_size_in_rows=1),
+             dict(cleaning_engine='csv', input_reader='mmap', chunk_size_in_rows=2),
+             dict(cleaning_engine='csv', input_reader='mmap', chunk_size_in_rows=2, workers=2)]
+
+@pytest.mark.parametrize('settings', dataframe_paths, ids=repr)
+def test_dataframe_paths_match_row_loop(tmp_path, settings) :
+  assert clean_to_bytes(tmp_path, mixed_input, **settings) == clean_to_bytes(tmp_path, mixed_input)
+
+@pytest.mark.parametrize('settings', dataframe_paths + csv_paths, ids=repr)
+@pytest.mark.parametrize('keep_default_na', [False, True])
+def test_text_input_paths_match_row_loop(tmp_path, settings, keep_default_na) :
+  assert (clean_to_bytes(tmp_path, text_input, keep_default_na=keep_default_na, **settings) ==
+          clean_to_bytes(tmp_path, text_input, keep_default_na=keep_default_na))
+
+def test_chunks_format_numbers_as_the_whole_file_does(tmp_path) :
+  nulls_input = '"a";"5";"x"\n"b";"NULL";"y"\n"c";"7";"z"\n'
+  whole_file_output = clean_to_bytes(tmp_path, nulls_input)
+  assert whole_file_output == b'"a";"5.0";"x"\n"b";"nan";"y"\n"c";"7.0";"z"'
+  assert clean_to_bytes(tmp_path, nulls_input, chunk_size_in_rows=1) == whole_file_output
+
+def test_short_rows_are_padded_with_empty_fields(tmp_path) :
+  short_row_input = '"1";"2";"3"\n"5";"6"\n'
+  assert clean_to_bytes(tmp_path, short_row_input, cleaning_engine='csv') == b'"1";"2";"3"\n"5";"6";""'
+  assert clean_to_bytes(tmp_path, short_row_input, cleaning_engine='csv', keep_default_na=True) == b'"1";"2";"3"\n"5";"6";"nan"'
+
+def test_files_cleaned_in_a_batch_share_no_state(tmp_path) :
+  input_text = '"a";"x"\n"b";"y"\n"a";"x"\n'
+  input_output_pairs = []
+  for file_number in range(2) :
+    (tmp_path / f"input{file_number}.csv").write_text(input_text, encoding='utf-8')
+    input_output_pairs.append((str(tmp_path / f"input{file_number}.csv"), str(tmp_path / f"output{file_number}.txt")))
+  batch_cleaner = TextCleaner.text_cleaner('', '', **dict(demo_settings, drop_duplicate_rows=True, field_memo_max_entries=10,
+                                                           collect_stage_metrics=True, cleaning_engine='csv'))
+  file_results = batch_cleaner.clean_files_in_batch(input_output_pairs, max_concurrent_files=1)
+  assert [file_result['rows'] for file_result in file_results] == [2, 2]
+  assert (tmp_path / 'output0.txt').read_bytes() == (tmp_path / 'output1.txt').read_bytes() == b'"a";"x"\n"b";"y"'
+  assert batch_cleaner.deduplication_report()['duplicate_rows']['rows_checked'] == 0
+  assert batch_cleaner.stage_metrics.rows_cleaned == 0
+
+overlong_row_input = '"a";"1"\n"b";"2"\n"c";"3";"bad"\n"d";"4"\n'
+
+@pytest.mark.parametrize('settings', [dict(chunk_size_in_rows=1), dict(chunk_size_in_rows=2), dict(chunk_size_in_rows=2, workers=2)], ids=repr)
+@pytest.mark.parametrize('on_bad_lines', ['skip', 'warn'])
+def test_chunks_skip_overlong_rows_as_the_whole_file_does(tmp_path, settings, on_bad_lines) :
+  with pytest.warns() if on_bad_lines == 'warn' else contextlib.nullcontext() :
+    whole_file_output = clean_to_bytes(tmp_path, overlong_row_input, on_bad_lines=on_bad_lines)
+  assert whole_file_output == b'"a";"1"\n"b";"2"\n"d";"4"'
+  with pytest.warns(UserWarning, match='Skipping line 3') if on_bad_lines == 'warn' else contextlib.nullcontext() :
+    assert clean_to_bytes(tmp_path, overlong_row_input, on_bad_lines=on_bad_lines, **settings) == whole_file_output
+
+@pytest.mark.parametrize('settings', [dict(), dict(chunk_size_in_rows=1), dict(chunk_size_in_rows=2, workers=2)], ids=repr)
+def test_overlong_rows_raise_when_on_bad_lines_is_error(tmp_path, settings) :
+  with pytest.raises(Exception, match='Error loading') :
+    clean_to_bytes(tmp_path, overlong_row_input, on_bad_lines='error', **settings)
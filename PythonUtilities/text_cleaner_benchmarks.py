@@ -0,0 +1,300 @@
+'''
+  Benchmarks for text_cleaner and the text_cleaning_functions helpers
+  Synthetic inputs are modeled on comparisonvalues.csv (semicolon delimited, quoted,
+  report fields with HTML like tags and line breaks, \\N and empty markers)
+  Run from the command line, for example
+    python text_cleaner_benchmarks.py --rows 10000 100000 --engines row_loop vectorized csv --output run.json
+    python text_cleaner_benchmarks.py --rows 10000 --compare run.json
+  Each case cleans in its own subprocess so its peak RSS is measured alone. Results report rows/s, MB/s of input and
+  peak RSS, and are saved as JSON so two runs can be compared case by case
+'''
+import os
+import sys
+import json
+import time
+import timeit
+import random
+import argparse
+import platform
+import itertools
+import subprocess
+import tempfile
+import TextCleaner
+import text_cleaning_functions as cf
+
+default_null_map = {'""' : '""', "''" : "''"}
+
+'''
+  Cleaner arguments matching the comparisonvalues.csv demo
+'''
+def build_demo_cleaner_arguments(**overrides) :
+  cleaner_arguments = {'input_file_delimiter' : ';', 'output_file_delimiter' : ';',
+                       'na_values' : ["NULL", "null"], 'keep_default_na' : False,
+                       'empty_string_map' : default_null_map, 'not_null_map' : default_null_map,
+                       'additional_field_map' : {"\\N" : '""'}}
+  cleaner_arguments.update(overrides)
+  return cleaner_arguments
+
+'''
+  Writes a synthetic comparisonvalues.csv style file with the given number of rows
+'''
+def write_synthetic_comparison_values_csv(full_output_path, number_of_rows, seed=0) :
+  random_generator = random.Random(seed)
+  report_lines = ["The considered chat showed that ", "Bacterial Level Counts were within range expected at 73.25.",
+                  "The upper reference range of 90.00 was not breached. ", "- Monitoring of viral load "]
+  with open(full_output_path, 'w', encoding='utf-8') as output_file :
+    for row_number in range(number_of_rows) :
+      report = '\n'.join(random_generator.sample(report_lines, 3))
+      report = report + '<p>' + report.replace('\n', '</li><li>') + '</p>'
+      fields = ["Margeret", "Chat", f"ABC{row_number:07d}", f"{random_generator.uniform(40, 95):.2f}", "45.00 - 90.00",
+                random_generator.choice(["\\\\N", "mg/L", ""]), "BKAT", "Bacterial Kinesis Analytic Test",
+                str(random_generator.randint(1, 9)), report, "", "\\\\N", "26012024"]
+      output_file.write(';'.join(f'"{field}"' for field in fields) + '\n')
+  return full_output_path
+
+'''
+  The synthetic code values written into fields, which an additional_field_map of map_size entries replaces
+'''
+def build_synthetic_field_codes(map_size) :
+  return [f"CODE{code_number:04d}" for code_number in range(max(map_size - 1, 0))]
+
+'''
+  Demo cleaner arguments with an additional_field_map of map_size entries (\\N plus map_size - 1 synthetic codes)
+'''
+def build_sized_map_cleaner_arguments(map_size=1, **overrides) :
+  additional_field_map = {"\\N" : '""'}
+  additional_field_map.update({field_code : f"C{field_code[4:]}" for field_code in build_synthetic_field_codes(map_size)})
+  return build_demo_cleaner_arguments(additional_field_map=additional_field_map, **overrides)
+
+'''
+  Writes a synthetic csv in the comparisonvalues.csv format with every cost driver adjustable
+    number_of_columns -> fields per row. The first three are identifier style fields, the rest free text
+    field_length_in_words -> words in each free text field
+    metatag_density -> chance of an HTML like tag before each word
+    multi_line_fraction -> share of free text fields that hold line breaks (so quoted records span lines)
+    map_size -> size of the additional_field_map the file is cleaned with, whose codes are sprinkled into the text
+  Fields never clean down to nothing, which text_cleaner rejects
+'''
+def write_synthetic_csv(full_output_path, number_of_rows, number_of_columns=13, field_length_in_words=12,
+                        metatag_density=0.2, multi_line_fraction=0.3, map_size=1, seed=0) :
+  random_generator = random.Random(seed)
+  words = ["Bacterial", "Level", "Counts", "were", "within", "range", "expected", "at", "73.25", "upper", "reference",
+           "breached", "Monitoring", "of", "viral", "load", "mg/L", "45.00", "-", "90.00"]
+  tags = ['<p>', '</p>', '<li>', '</li>', '<br/>', '<span class="note">', '</span>']
+  field_codes = build_synthetic_field_codes(map_size) + ["\\N"]
+  with open(full_output_path, 'w', encoding='utf-8') as output_file :
+    for row_number in range(number_of_rows) :
+      fields = [f"ABC{row_number:07d}", f"{random_generator.uniform(40, 95):.2f}", random_generator.choice(field_codes)]
+      while len(fields) < number_of_columns :
+        separator = '\n' if random_generator.random() < multi_line_fraction else ' '
+        pieces = []
+        for _ in range(field_length_in_words) :
+          if random_generator.random() < metatag_density :
+            pieces.append(random_generator.choice(tags))
+          pieces.append(random_generator.choice(words) + separator)
+        if random_generator.random() < 0.1 :
+          pieces.append(random_generator.choice(field_codes))
+        fields.append(''.join(pieces).rstrip() or random_generator.choice(words))
+      output_file.write(';'.join(f'"{field}"' for field in fields[:number_of_columns]) + '\n')
+  return full_output_path
+
+'''
+  Times one full clean of the input with the given cleaner arguments, returning seconds taken
+'''
+def time_text_cleaner_run(full_input_path, full_output_path, **cleaner_arguments) :
+  cleaner = TextCleaner.text_cleaner(full_input_path, full_output_path, **cleaner_arguments)
+  start_timestamp = time.perf_counter()
+  cleaner.clean_dataframe_to_text_file()
+  return time.perf_counter() - start_timestamp
+
+'''
+  Runs the same clean at each worker count and reports the speedup against a single worker
+'''
+def benchmark_worker_scaling(full_input_path, worker_counts=(1, 2, 4, 8), **cleaner_arguments) :
+  results = []
+  with tempfile.TemporaryDirectory() as output_directory :
+    for worker_count in worker_counts :
+      full_output_path = os.path.join(output_directory, f'clean_{worker_count}.csv')
+      duration_seconds = time_text_cleaner_run(full_input_path, full_output_path, workers=worker_count, **cleaner_arguments)
+      results.append({'workers' : worker_count, 'seconds' : duration_seconds, 'speedup' : results[0]['seconds'] / duration_seconds if results else 1.0})
+  return results
+
+'''
+  Runs one benchmark case in this process and returns its measurements. Meant to be called in a fresh subprocess
+  (see run_benchmark_case_in_subprocess), so the peak RSS belongs to this case alone
+'''
+def run_benchmark_case(benchmark_case) :
+  cleaner_arguments = build_sized_map_cleaner_arguments(benchmark_case['map_size'], cleaning_engine=benchmark_case['engine'],
+                                                        input_reader=benchmark_case['input_reader'], workers=benchmark_case['workers'],
+                                                        chunk_size_in_rows=benchmark_case['chunk_size_in_rows'])
+  input_size_in_bytes = os.path.getsize(benchmark_case['input_path'])
+  with tempfile.TemporaryDirectory() as output_directory :
+    full_output_path = os.path.join(output_directory, 'clean.csv')
+    durations_in_seconds = [time_text_cleaner_run(benchmark_case['input_path'], full_output_path, **cleaner_arguments)
+                            for _ in range(benchmark_case['repeats'])]
+  peak_rss_in_bytes, peak_worker_rss_in_bytes = TextCleaner.cleaning_stage_metrics.peak_memory_bytes()
+  best_seconds = min(durations_in_seconds)
+  return {'seconds' : best_seconds, 'all_seconds' : durations_in_seconds,
+          'rows_per_second' : benchmark_case['rows'] / best_seconds,
+          'megabytes_per_second' : input_size_in_bytes / best_seconds / 1e6,
+          'input_bytes' : input_size_in_bytes, 'peak_rss_bytes' : peak_rss_in_bytes,
+          'peak_worker_rss_bytes' : peak_worker_rss_in_bytes}
+
+'''
+  Runs one benchmark case in a fresh Python process and returns the case with its measurements (or its error) added
+'''
+def run_benchmark_case_in_subprocess(benchmark_case) :
+  completed_process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(benchmark_case)],
+                                     capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+  benchmark_result = dict(benchmark_case)
+  if completed_process.returncode != 0 :
+    error_lines = completed_process.stderr.strip().splitlines()
+    benchmark_result['error'] = error_lines[-1] if len(error_lines) else f"exit code {completed_process.returncode}"
+  else :
+    benchmark_result.update(json.loads(completed_process.stdout.strip().splitlines()[-1]))
+  return benchmark_result
+
+'''
+  The fields two runs' cases are matched on when comparing them
+'''
+def benchmark_case_key(benchmark_result) :
+  return tuple(benchmark_result.get(key_name) for key_name in ('rows', 'columns', 'field_length', 'metatag_density', 'multi_line_fraction',
+                                                               'map_size', 'engine', 'input_reader', 'workers', 'chunk_size_in_rows'))
+
+'''
+  Builds every case from the command line options: each synthetic dataset shape crossed with each engine, reader and worker count
+'''
+def build_benchmark_cases(arguments, dataset_paths) :
+  benchmark_cases = []
+  for dataset_shape, input_path in dataset_paths.items() :
+    rows, columns, field_length, metatag_density, multi_line_fraction, map_size = dataset_shape
+    for engine, input_reader, workers in itertools.product(arguments.engines, arguments.input_readers, arguments.workers) :
+      benchmark_cases.append({'rows' : rows, 'columns' : columns, 'field_length' : field_length, 'metatag_density' : metatag_density,
+                              'multi_line_fraction' : multi_line_fraction, 'map_size' : map_size, 'engine' : engine,
+                              'input_reader' : input_reader, 'workers' : workers,
+                              'chunk_size_in_rows' : arguments.chunk_size_in_rows or (max(rows // (workers * 4), 1) if workers > 1 else None),
+                              'repeats' : arguments.repeats, 'input_path' : input_path})
+  return benchmark_cases
+
+'''
+  Prints each result, with the throughput change against a previous run when it has the same case
+'''
+def print_benchmark_results(benchmark_results, previous_results=None) :
+  previous_by_key = {benchmark_case_key(previous_result) : previous_result for previous_result in previous_results or []}
+  for benchmark_result in benchmark_results :
+    case_description = (f"{benchmark_result['rows']:>8} rows x {benchmark_result['columns']:>2} cols, tags {benchmark_result['metatag_density']:.2f}, "
+                        f"lines {benchmark_result['multi_line_fraction']:.2f}, map {benchmark_result['map_size']:>3} | "
+                        f"{benchmark_result['engine']:>10} {benchmark_result['input_reader']:>6} workers {benchmark_result['workers']:>2}")
+    if 'error' in benchmark_result :
+      print(f"{case_description} : failed, {benchmark_result['error']}")
+      continue
+    peak_rss_in_megabytes = benchmark_result['peak_rss_bytes'] / 1e6 if benchmark_result['peak_rss_bytes'] is not None else float('nan')
+    measurement = (f"{benchmark_result['rows_per_second']:>10.0f} rows/s {benchmark_result['megabytes_per_second']:>7.2f} MB/s "
+                   f"peak RSS {peak_rss_in_megabytes:>7.1f} MB")
+    previous_result = previous_by_key.get(benchmark_case_key(benchmark_result))
+    if previous_result is not None and 'error' not in previous_result :
+      measurement += f", {benchmark_result['rows_per_second'] / previous_result['rows_per_second']:.2f}x previous throughput"
+    print(f"{case_description} : {measurement}")
+
+'''
+  Report style fields for the primitive micro-benchmarks, with tags_per_field HTML like tags and line breaks in each
+'''
+def build_synthetic_report_fields(number_of_fields, tags_per_field=20, seed=0) :
+  random_generator = random.Random(seed)
+  words = ["Bacterial", "Level", "Counts", "were", "within", "range", "expected", "at", "73.25.", "\\N", "Monitoring"]
+  tags = ['<p>', '</p>', '<li>', '</li>', '<br/>', '<span class="note">', '</span>']
+  fields = []
+  for _ in range(number_of_fields) :
+    pieces = []
+    for _ in range(tags_per_field) :
+      pieces.append(random_generator.choice(tags))
+      pieces.append(random_generator.choice([' ', '  ', '\n', '\r\n', '\t']).join(random_generator.sample(words, 4)))
+    fields.append(''.join(pieces))
+  return fields
+
+'''
+  Times the legacy text_cleaning_functions primitives against their single pass versions on the same fields, 
+  returning seconds per call for each and the speedup of the new one 
+'''
+def benchmark_cleaning_primitives(fields, repeats=5) :
+  compiled_replacements = cf.compile_sequential_replacements([*default_null_map.items(), ("\\N", '""')])
+  def legacy_clean_field(string_to_clean) :
+    string_to_clean = cf.apply_sequential_replacements(string_to_clean, [*default_null_map.items(), ("\\N", '""')])
+    string_to_clean = cf.remove_metatags_from_string(string_to_clean)
+    string_to_clean = cf.mutate_multi_lines_and_spacings_to_single_line_set_spaces(string_to_clean)
+    return cf.append_string_if_missing(cf.prepend_string_if_missing(string_to_clean))
+  primitive_pairs = {
+    'remove_metatags' : (cf.remove_metatags_from_string, cf.remove_metatags_from_string_single_pass),
+    'single_line_spacing' : (cf.mutate_multi_lines_and_spacings_to_single_line_set_spaces, cf.collapse_whitespace_to_single_line),
+    'field_replacements' : (lambda string_to_clean : cf.apply_sequential_replacements(string_to_clean, [*default_null_map.items(), ("\\N", '""')]),
+                            lambda string_to_clean : cf.apply_compiled_replacements(string_to_clean, compiled_replacements)),
+    'clean_field' : (legacy_clean_field, lambda string_to_clean : cf.clean_field(string_to_clean, compiled_replacements)),
+  }
+  results = []
+  for primitive_name, (legacy_function, single_pass_function) in primitive_pairs.items() :
+    if [legacy_function(field) for field in fields] != [single_pass_function(field) for field in fields] :
+      raise Exception(f"{primitive_name} single pass version does not match the legacy version")
+    legacy_seconds = min(timeit.repeat(lambda : [legacy_function(field) for field in fields], number=1, repeat=repeats)) / len(fields)
+    single_pass_seconds = min(timeit.repeat(lambda : [single_pass_function(field) for field in fields], number=1, repeat=repeats)) / len(fields)
+    results.append({'primitive' : primitive_name, 'legacy_seconds' : legacy_seconds, 'single_pass_seconds' : single_pass_seconds, 
+                    'speedup' : legacy_seconds / single_pass_seconds})
+  return results
+
+'''
+  Command line options for the suite. Every dataset option takes several values, and every combination is generated
+'''
+def build_argument_parser() :
+  argument_parser = argparse.ArgumentParser(description='Benchmark text_cleaner engines and modes on synthetic comparisonvalues.csv style data')
+  argument_parser.add_argument('--rows', type=int, nargs='+', default=[10000], help='row counts to generate')
+  argument_parser.add_argument('--columns', type=int, nargs='+', default=[13], help='columns per row')
+  argument_parser.add_argument('--field-length', type=int, nargs='+', default=[12], help='words per free text field')
+  argument_parser.add_argument('--metatag-density', type=float, nargs='+', default=[0.2], help='chance of a tag before each word')
+  argument_parser.add_argument('--multi-line-fraction', type=float, nargs='+', default=[0.3], help='share of free text fields with line breaks')
+  argument_parser.add_argument('--map-size', type=int, nargs='+', default=[1], help='additional_field_map entries')
+  argument_parser.add_argument('--engines', nargs='+', default=list(TextCleaner.cleaning_engines), choices=TextCleaner.cleaning_engines)
+  argument_parser.add_argument('--input-readers', nargs='+', default=['stream'], choices=TextCleaner.input_readers)
+  argument_parser.add_argument('--workers', type=int, nargs='+', default=[1], help='worker process counts')
+  argument_parser.add_argument('--chunk-size-in-rows', type=int, default=None, help='defaults to the whole file, or four chunks per worker')
+  argument_parser.add_argument('--repeats', type=int, default=3, help='cleans per case, the fastest is reported')
+  argument_parser.add_argument('--output', default=None, help='JSON file to save the results to')
+  argument_parser.add_argument('--compare', default=None, help='JSON results of an earlier run to compare against')
+  argument_parser.add_argument('--primitives', action='store_true', help='also micro-benchmark the text_cleaning_functions primitives')
+  argument_parser.add_argument('--worker-scaling', action='store_true', help='only report worker scaling on a comparisonvalues.csv style file')
+  argument_parser.add_argument('--run-case', default=None, help=argparse.SUPPRESS)
+  return argument_parser
+
+if __name__ == "__main__" :
+  arguments = build_argument_parser().parse_args()
+  if arguments.run_case is not None :
+    print(json.dumps(run_benchmark_case(json.loads(arguments.run_case))))
+    sys.exit(0)
+  if arguments.worker_scaling :
+    with tempfile.TemporaryDirectory() as input_directory :
+      synthetic_input_path = write_synthetic_comparison_values_csv(os.path.join(input_directory, 'synthetic.csv'), max(arguments.rows))
+      for result in benchmark_worker_scaling(synthetic_input_path, worker_counts=sorted({1, 2, 4, os.cpu_count() or 1}), **build_demo_cleaner_arguments()) :
+        print(f"workers {result['workers']:>3} : {result['seconds']:.2f} seconds, speedup {result['speedup']:.2f}x")
+    sys.exit(0)
+  benchmark_run = {'started' : time.strftime('%Y-%m-%dT%H:%M:%S'), 'python' : platform.python_version(), 'platform' : platform.platform(),
+                   'cpu_count' : os.cpu_count(), 'arguments' : {key : value for key, value in vars(arguments).items() if key != 'run_case'}}
+  if arguments.primitives :
+    benchmark_run['primitives'] = []
+    for tags_per_field in (2, 20, 200) :
+      for result in benchmark_cleaning_primitives(build_synthetic_report_fields(2000, tags_per_field)) :
+        benchmark_run['primitives'].append(dict(result, tags_per_field=tags_per_field))
+        print(f"{tags_per_field:>3} tags {result['primitive']:>20} : {result['legacy_seconds'] * 1e6:8.2f} us -> {result['single_pass_seconds'] * 1e6:8.2f} us, speedup {result['speedup']:.2f}x")
+  with tempfile.TemporaryDirectory() as input_directory :
+    dataset_paths = {}
+    for dataset_shape in itertools.product(arguments.rows, arguments.columns, arguments.field_length, arguments.metatag_density,
+                                           arguments.multi_line_fraction, arguments.map_size) :
+      dataset_paths[dataset_shape] = write_synthetic_csv(os.path.join(input_directory, f'synthetic_{len(dataset_paths)}.csv'), *dataset_shape)
+    benchmark_run['results'] = [run_benchmark_case_in_subprocess(benchmark_case) for benchmark_case in build_benchmark_cases(arguments, dataset_paths)]
+  for benchmark_result in benchmark_run['results'] :
+    del benchmark_result['input_path']
+  previous_results = None
+  if arguments.compare is not None :
+    with open(arguments.compare, 'r', encoding='utf-8') as previous_run_file :
+      previous_results = json.load(previous_run_file).get('results', [])
+  print_benchmark_results(benchmark_run['results'], previous_results)
+  if arguments.output is not None :
+    with open(arguments.output, 'w', encoding='utf-8') as output_file :
+      json.dump(benchmark_run, output_file, indent=2)
@@ -1,5 +1,13 @@
 import re
 contains_metatag = re.compile('<.*?>')
+# A tag opener followed by another opener before the tag closes, e.g. <a<b>. Only there can one regex pass differ from tag by tag replacement 
+contains_nested_metatag = re.compile('<[^>\n]*<')
+# Runs of whitespace as str.split() sees them 
+whitespace_run = re.compile(r'\s+')
+# Below this many pairs a compiled stage is slower than replacing its keys one by one with str.replace 
+minimum_pairs_per_compiled_stage = 4
+# Characters that make a metatag replacement unsafe to apply in one pass (it could form or hide tags) 
+metatag_delimiters = frozenset('<>')
 
 def remove_metatags_from_string(string_to_clean, replace_target='') : 
   if len(metatags_contained := contains_metatag.findall(string_to_clean)) : 
@@ -19,6 +27,70 @@ def replace_source_string_with_target_string(string_to_clean, target_to_replace=
     string_to_clean = string_to_clean.replace(target_to_replace, replace_target)
     return string_to_clean
 
+def apply_sequential_replacements(string_to_clean, replacement_pairs) : 
+  for target_to_replace, replace_target in replacement_pairs : 
+    string_to_clean = replace_source_string_with_target_string(string_to_clean, target_to_replace, replace_target)
+  return string_to_clean
+
+'''
+  True when some non empty suffix of left_string is a prefix of right_string 
+'''
+def strings_overlap(left_string, right_string) : 
+  return any(left_string.endswith(right_string[:length]) for length in range(1, min(len(left_string), len(right_string)) + 1))
+
+'''
+  True when applying the earlier pair could change where the later pair matches, so they cannot share one regex pass. 
+  Either the keys can overlap in text, or the earlier replacement can form the later key with its neighbours 
+'''
+def replacements_interact(earlier_pair, later_pair) : 
+  (earlier_source, earlier_target), (later_source, _later_target) = earlier_pair, later_pair
+  if (earlier_source in later_source or later_source in earlier_source or 
+      strings_overlap(earlier_source, later_source) or strings_overlap(later_source, earlier_source)) : 
+    return True 
+  if len(earlier_target) == 0 : 
+    '''Removing text joins its neighbours, which can only form keys longer than one character'''
+    return len(later_source) > 1
+  return (later_source in earlier_target or earlier_target in later_source or 
+          strings_overlap(earlier_target, later_source) or strings_overlap(later_source, earlier_target))
+
+'''
+  Compiles ordered (source, target) pairs once into stages for apply_compiled_replacements. 
+  Consecutive pairs that do not interact share one alternation regex, so a stage replaces all of its keys in a 
+  single pass with exactly the result of replacing them one after another. Each stage is (pairs, pattern, lookup), 
+  pattern being None for single pair stages (stages too small to gain from a regex are split into single pairs) 
+'''
+def compile_sequential_replacements(replacement_pairs) : 
+  stages = [] 
+  for replacement_pair in replacement_pairs : 
+    if (len(stages) and len(replacement_pair[0]) and len(stages[-1][0][0]) and 
+        not any(replacements_interact(stage_pair, replacement_pair) for stage_pair in stages[-1])) : 
+      stages[-1].append(replacement_pair)
+    else : 
+      stages.append([replacement_pair])
+  compiled_stages = [] 
+  for stage_pairs in stages : 
+    if len(stage_pairs) < minimum_pairs_per_compiled_stage : 
+      '''A few str.replace calls beat a regex pass, and replayed one by one they give the same result'''
+      compiled_stages.extend(([stage_pair], None, None) for stage_pair in stage_pairs)
+    else : 
+      stage_lookup = dict(stage_pairs)
+      stage_pattern = re.compile('|'.join(re.escape(source) for source in sorted(stage_lookup, key=len, reverse=True)))
+      compiled_stages.append((stage_pairs, stage_pattern, stage_lookup))
+  return compiled_stages
+
+'''
+  Applies stages from compile_sequential_replacements. A stage that starts from or ends at an empty string is 
+  replayed pair by pair, since replace_source_string_with_target_string swaps an empty string for the next target 
+'''
+def apply_compiled_replacements(string_to_clean, compiled_stages) : 
+  for stage_pairs, stage_pattern, stage_lookup in compiled_stages : 
+    if stage_pattern is None or len(string_to_clean) == 0 : 
+      string_to_clean = apply_sequential_replacements(string_to_clean, stage_pairs)
+    else : 
+      replaced_string = stage_pattern.sub(lambda match : stage_lookup[match.group(0)], string_to_clean)
+      string_to_clean = replaced_string if len(replaced_string) else apply_sequential_replacements(string_to_clean, stage_pairs)
+  return string_to_clean
+
 def prepend_string_if_missing(string_to_clean, prepend_character='"') : 
   if string_to_clean[0] != prepend_character :
     string_to_clean = prepend_character + string_to_clean
@@ -37,3 +109,41 @@ def mutate_multi_lines_and_spacings_to_single_line_set_spaces(string_to_clean, n
   space_joiner = ' ' * number_of_spaces if number_of_spaces != 0 else ''
   string_to_clean = space_joiner.join(string_to_clean_array)
   return string_to_clean
+
+'''
+  Single pass version of remove_metatags_from_string. One re.sub removes every tag instead of a findall followed by 
+  a full str.replace per tag. Gives the same result except for tags nested inside tags (<a<b>>) or a replacement 
+  that itself holds < or >, which are handed to remove_metatags_from_string 
+'''
+def remove_metatags_from_string_single_pass(string_to_clean, replace_target='') : 
+  if '<' not in string_to_clean : 
+    return string_to_clean
+  if not metatag_delimiters.isdisjoint(replace_target) or contains_nested_metatag.search(string_to_clean) : 
+    return remove_metatags_from_string(string_to_clean, replace_target)
+  return contains_metatag.sub(replace_target.replace('\\', '\\\\'), string_to_clean)
+
+'''
+  Single pass version of mutate_multi_lines_and_spacings_to_single_line_set_spaces. str.split() already breaks on 
+  new lines, carriage returns and tabs, so the three replace passes before it change nothing and are skipped 
+'''
+def collapse_whitespace_to_single_line(string_to_clean, number_of_spaces=1) : 
+  return (' ' * number_of_spaces).join(string_to_clean.split())
+
+'''
+  Every field cleaning step of text_cleaner fused into one call: empty string mapping, compiled not null and additional 
+  field replacements (from compile_sequential_replacements), metatag removal, whitespace collapsing and string notation. 
+  Like the separate steps, a field that cleans down to nothing raises IndexError 
+'''
+def clean_field(string_to_clean, compiled_replacements=(), remove_metatags=True, metatag_replacement='', 
+                number_of_spaces=1, string_notation_char='"', empty_string_target='""') : 
+  if len(string_to_clean) == 0 : 
+    return empty_string_target
+  string_to_clean = apply_compiled_replacements(string_to_clean, compiled_replacements)
+  if remove_metatags is True : 
+    string_to_clean = remove_metatags_from_string_single_pass(string_to_clean, metatag_replacement)
+  string_to_clean = (' ' * number_of_spaces).join(string_to_clean.split())
+  if string_to_clean[0] != string_notation_char : 
+    string_to_clean = string_notation_char + string_to_clean
+  if string_to_clean[-1] != string_notation_char : 
+    string_to_clean = string_to_clean + string_notation_char
+  return string_to_clean